@@ -0,0 +1,198 @@
+import asyncio
+import time
+
+import aiohttp
+
+from scrape import (
+    normalize_url, prepare_request, finish_request, reduce_page, scheduler,
+    HEADERS, FETCH_TIMEOUT, POOL_PER_HOST,
+)
+from corpus import combine_chunks
+from inference import astream_completion, complete
+from pipeline import PagePipeline
+
+# asyncio alternative to the thread pool in main.py (python main.py --engine async)
+# pages are tasks, not threads, so hundreds can wait on streaming responses at once
+ASYNC_MAX_PAGES = 200 # pages in flight; the provider's rate limit is the real ceiling
+ASYNC_MAX_CONNECTIONS = 100 # total open http connections across hosts
+
+def open_session():
+    connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS, limit_per_host=POOL_PER_HOST)
+    timeout = aiohttp.ClientTimeout(sock_connect=FETCH_TIMEOUT[0], sock_read=FETCH_TIMEOUT[1])
+    return aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout)
+
+class AsyncCrawler(PagePipeline):
+    # the per-page decisions are pipeline.PagePipeline's, same as the thread engine's
+    def __init__(self, source_language, target_languages, dictionary, writer, state, completion_cache, **settings):
+        super().__init__(source_language, target_languages, dictionary, writer, state, completion_cache, **settings)
+        self.visited = set(state.urls())
+
+    async def run(self, start_url, pending=(), http=None, pages=None):
+        # crawls on one loop (main.py --jobs) pass the same session and page semaphore, so connections
+        # and the pages in flight are shared between them
+        if http is None:
+            async with open_session() as http:
+                return await self.run(start_url, pending, http, pages)
+        self.http = http
+        self.pages = pages or asyncio.Semaphore(ASYNC_MAX_PAGES)
+        # the group outlives every page task, cancelling run() cancels all of them
+        async with asyncio.TaskGroup() as tasks:
+            self.tasks = tasks
+            self.enqueue(start_url)
+            for url in pending: # left over from an interrupted run
+                tasks.create_task(self.process_page(url))
+        return self.dictionary
+
+    def enqueue(self, url):
+        # same normalization/visited semantics as main.Crawler.enqueue, no locks needed on one loop
+        url = normalize_url(url)
+        if not url or url in self.visited:
+            return False
+        self.visited.add(url)
+        self.tasks.create_task(self.process_page(url, new=True))
+        return True
+
+    def requeue(self, url):
+        self.tasks.create_task(self.process_page(url))
+
+    async def fetch(self, url):
+        meta, cached_text, headers = prepare_request(url)
+        netloc = await scheduler.acquire_async(url)
+        status, retry_after, started = None, None, time.monotonic()
+        try:
+            async with self.http.get(url, headers=headers) as response:
+                body = await response.read()
+                status, retry_after = response.status, response.headers.get("Retry-After")
+                try:
+                    encoding = response.get_encoding()
+                except RuntimeError:
+                    encoding = "utf-8"
+                text = body.decode(encoding, errors="replace")
+        finally:
+            scheduler.release(netloc, status, time.monotonic() - started, retry_after)
+        return finish_request(
+            url, meta, cached_text, response.status, response.headers,
+            len(body), text, str(response.url),
+        )
+
+    async def scrape(self, url, trace):
+        with trace.stage("fetch"):
+            raw, final_url = await self.fetch(url)
+        # parsing/reduction is cpu work, keep it off the loop
+        with trace.stage("reduce"):
+            return await asyncio.to_thread(reduce_page, url, raw, final_url, self.reduce, self.scope)
+
+    async def extract_page(self, url, content, on_next_page=None, on_entry=None, mode="full", learn_site=True,
+                           trace=None):
+        # streaming llm call (or cached replay), corpus entries go to on_entry as they close
+        # returns (entries, next_page)
+        extraction = self.extraction(url, content, on_next_page, on_entry, mode, learn_site, trace)
+        while extraction.content is not None:
+            await asyncio.to_thread(extraction.lookup)
+            stream, usage = None, {} # usage: real token counts, if the backend reports them before we stop reading
+            try:
+                if extraction.cached is not None:
+                    extraction.feed(extraction.cached)
+                else:
+                    stream = astream_completion(extraction.content, usage=usage)
+                    async for chunk in stream:
+                        if extraction.feed(chunk):
+                            break
+            except Exception as exception:
+                extraction.broke(exception)
+            finally:
+                if stream is not None:
+                    await stream.aclose() # ends the http response when we stopped early
+                extraction.record(usage)
+            await asyncio.to_thread(extraction.closed) # caches the completion, saves what the site taught
+        return extraction.result()
+
+    async def extract_packed(self, url, prompt, html, mode, attempt, on_next_page, on_entry, trace):
+        # the pack is sent from the packer's thread, the page task awaits it; False -> extract the page alone
+        key = await asyncio.to_thread(self.pack_key, url, prompt, html, attempt)
+        if key is None:
+            return False
+        with trace.stage("generate"):
+            packed = await asyncio.wrap_future(self.packer.submit(url, prompt, html, mode, self.scope))
+        await asyncio.to_thread(self.cache_packed, packed, key)
+        return self.use_packed(packed, mode, on_next_page, on_entry, trace)
+
+    async def extract_chunk(self, url, prompt, chunk, index, total, on_next_page, on_entry, mode="full", trace=None):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await self.extract_page(
+                    f"{url} [chunk {index}/{total}]", self.chunk_content(prompt, chunk, index, total),
+                    on_next_page, on_entry, mode, index == total, trace,
+                )
+            except Exception as exception:
+                delay = self.chunk_failed(url, index, total, exception, attempt, trace)
+                if delay is None:
+                    return 0, None
+                await asyncio.sleep(delay)
+
+    async def extract_chunked(self, url, prompt, chunks, enqueue, on_entry, mode="full", trace=None):
+        total = len(chunks)
+        print(f"Splitting {url} into {total} chunks")
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(self.extract_chunk(
+                    url, prompt, chunk, i, total,
+                    enqueue if i == total else None,  # last chunk decides <next_page>
+                    on_entry, mode, trace,
+                ))
+                for i, chunk in enumerate(chunks, start=1)
+            ]
+        return combine_chunks([task.result() for task in tasks])
+
+    async def process_page(self, url, new=False):
+        # crawl state writes are sqlite commits, they run in a thread like every other disk access
+        page = self.page(url)
+        if new:
+            await asyncio.to_thread(self.state.add, url)
+        async with self.pages:
+            await asyncio.to_thread(self.state.start, url)
+            await self.extract_with_retries(page)
+        if page.finish(await asyncio.to_thread(page.record)):
+            # probing ahead blocks on fetches, keep it off the loop
+            for predicted_url in await asyncio.to_thread(page.observe):
+                self.enqueue(predicted_url)
+        page.done()
+
+    async def extract_with_retries(self, page):
+        # entries merge on the loop (the writer thread does the i/o), so no other task sees a half-merged corpus
+        url = page.url
+        for attempt in range(1, self.max_attempts + 1):
+            stage = "fetch"
+            page.attempt(attempt)
+            try:
+                if page.html is None:
+                    html = await self.scrape(url, page.trace)
+                    await asyncio.to_thread(page.fetched, html)
+                stage = "llm"
+                if page.skip_duplicate():
+                    return
+                replayed = await asyncio.to_thread(page.match_rules)
+                if replayed is not None:
+                    page.use_rules(replayed)
+                    return
+
+                mode, prompt, chunks = page.prompt(attempt)
+                if len(chunks) > 1:
+                    _, next_page = await self.extract_chunked(
+                        url, prompt, chunks, page.on_next_page, page.on_entry, mode, page.trace,
+                    )
+                    page.chunked(next_page)
+                elif not await self.extract_packed(
+                    url, prompt, page.html, mode, attempt, page.on_next_page, page.on_entry, page.trace,
+                ):
+                    await self.extract_page(url, page.content(prompt), page.on_next_page, page.on_entry, mode, True, page.trace)
+                if page.should_induce():
+                    # one blocking call per template, not worth an async variant of the rulebook
+                    await asyncio.to_thread(page.induce, complete)
+                return
+            except Exception as exception:
+                # Exception only: CancelledError must reach the task group
+                delay = page.failed(exception, attempt, stage)
+                if delay is None:
+                    return
+                await asyncio.sleep(delay)
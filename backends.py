@@ -0,0 +1,332 @@
+import abc
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import inference # module, not names: inference creates its backend lazily from this one
+
+# llm backends behind inference.stream_completion / astream_completion
+# every backend yields text deltas; concurrency caps its requests in flight (None = no cap)
+# subclasses implement _stream and _astream, the generators behind stream() and astream()
+class Backend(abc.ABC):
+    name = "backend"
+
+    def __init__(self, model, concurrency=None):
+        self.model = model
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+        self.async_slots = None # created on the engine's loop, first astream()
+
+    # usage: dict the backend fills with the call's real prompt_tokens/completion_tokens, if it gets them
+    def stream(self, content, temperature, usage=None):
+        if self.slots:
+            self.slots.acquire()
+        try:
+            yield from self._stream(content, temperature, usage)
+        finally:
+            if self.slots:
+                self.slots.release()
+
+    async def astream(self, content, temperature, usage=None):
+        if self.concurrency and self.async_slots is None:
+            self.async_slots = asyncio.Semaphore(self.concurrency)
+        if self.async_slots:
+            await self.async_slots.acquire()
+        try:
+            async for delta in self._astream(content, temperature, usage):
+                yield delta
+        finally:
+            if self.async_slots:
+                self.async_slots.release()
+
+    @abc.abstractmethod
+    def _stream(self, content, temperature, usage=None):
+        pass
+
+    @abc.abstractmethod
+    async def _astream(self, content, temperature, usage=None):
+        pass
+
+    def describe(self):
+        return f"{self.name} ({self.model}, concurrency {self.concurrency or 'unlimited'})"
+
+def _retry_after(exception):
+    response = getattr(exception, "response", None)
+    return response.headers.get("retry-after") if response is not None else None
+
+def _report_usage(usage, received):
+    # real counts from the endpoint's last event, for the caller's telemetry
+    if usage is not None and received is not None and received.prompt_tokens is not None:
+        usage["prompt_tokens"] = received.prompt_tokens
+        usage["completion_tokens"] = received.completion_tokens or 0
+
+def _used_tokens(usage, content, produced):
+    if usage is not None and usage.total_tokens:
+        return usage.total_tokens
+    return inference.estimate_tokens(content) + inference.estimate_tokens(produced)
+
+# any openai-compatible chat endpoint, streamed; with a limiter every call draws from the shared budget
+class OpenAIBackend(Backend):
+    name = "openai"
+
+    def __init__(self, base_url, api_key, model, concurrency=None, limiter=None):
+        from openai import OpenAI, AsyncOpenAI # only the http backends need the sdk
+        super().__init__(model, concurrency)
+        self.base_url = base_url
+        self.limiter = limiter
+        self.client = OpenAI(base_url=base_url, api_key=api_key)
+        self.async_client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+
+    def _request(self, content, temperature):
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": content}],
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}, # last event carries the real token counts
+        )
+
+    def _stream(self, content, temperature, usage=None):
+        from openai import RateLimitError
+        received = [None]
+        if self.limiter is None:
+            try:
+                events = self.client.chat.completions.create(**self._request(content, temperature))
+                yield from self._deltas(events, received)
+            finally:
+                _report_usage(usage, received[0])
+            return
+
+        estimate = inference.estimate_request_tokens(content)
+        for attempt in range(1, inference.RATE_LIMIT_RETRIES + 1):
+            self.limiter.acquire(estimate)
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(**self._request(content, temperature))
+                break
+            except RateLimitError as exception:
+                self.limiter.settle(estimate, 0)
+                self.limiter.penalize(_retry_after(exception))
+                if attempt == inference.RATE_LIMIT_RETRIES:
+                    raise
+            except BaseException:
+                # connection error, 5xx, timeout, cancellation: nothing was generated, give the reservation back
+                self.limiter.settle(estimate, 0)
+                raise
+        self.limiter.update_from_headers(raw.headers)
+
+        produced = []
+        try:
+            for delta in self._deltas(raw.parse(), received):
+                produced.append(delta)
+                yield delta
+        finally:
+            # also runs when the consumer stops early or the stream breaks
+            self.limiter.settle(estimate, _used_tokens(received[0], content, "".join(produced)))
+            _report_usage(usage, received[0])
+
+    async def _astream(self, content, temperature, usage=None):
+        from openai import RateLimitError
+        received = [None]
+        if self.limiter is None:
+            completion = await self.async_client.chat.completions.create(**self._request(content, temperature))
+            try:
+                async for delta in self._adeltas(completion, received):
+                    yield delta
+            finally:
+                _report_usage(usage, received[0])
+            return
+
+        estimate = inference.estimate_request_tokens(content)
+        for attempt in range(1, inference.RATE_LIMIT_RETRIES + 1):
+            await self.limiter.acquire_async(estimate)
+            try:
+                raw = await self.async_client.chat.completions.with_raw_response.create(
+                    **self._request(content, temperature)
+                )
+                break
+            except RateLimitError as exception:
+                self.limiter.settle(estimate, 0)
+                self.limiter.penalize(_retry_after(exception))
+                if attempt == inference.RATE_LIMIT_RETRIES:
+                    raise
+            except BaseException:
+                # connection error, 5xx, timeout, cancellation: nothing was generated, give the reservation back
+                self.limiter.settle(estimate, 0)
+                raise
+        self.limiter.update_from_headers(raw.headers)
+
+        produced = []
+        try:
+            async for delta in self._adeltas(raw.parse(), received):
+                produced.append(delta)
+                yield delta
+        finally:
+            self.limiter.settle(estimate, _used_tokens(received[0], content, "".join(produced)))
+            _report_usage(usage, received[0])
+
+    @staticmethod
+    def _deltas(events, usage=None):
+        try:
+            for event in events:
+                if usage is not None and getattr(event, "usage", None):
+                    usage[0] = event.usage
+                if event.choices:
+                    yield event.choices[0].delta.content or ""
+        finally:
+            events.close() # the caller may stop reading early, don't leave the response open
+
+    @staticmethod
+    async def _adeltas(events, usage=None):
+        try:
+            async for event in events:
+                if usage is not None and getattr(event, "usage", None):
+                    usage[0] = event.usage
+                if event.choices:
+                    yield event.choices[0].delta.content or ""
+        finally:
+            await events.close()
+
+# client side continuous batching: requests queue up and leave in batches of up to batch_size as soon
+# as one of `concurrency` batch slots frees up, so a new batch never waits for a slow one to finish
+class BatchQueue:
+    def __init__(self, send, batch_size, window, concurrency):
+        self.send = send # (prompts, temperature) -> texts, in order
+        self.batch_size = batch_size
+        self.window = window
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {"batches": 0, "requests": 0}
+        self.thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, content, temperature):
+        future = Future()
+        self.queue.put((content, temperature, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # wait for a free slot first, requests that arrive meanwhile join this batch
+            self.slots.acquire()
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            threading.Thread(target=self._send, args=(batch,), name="llm-batch", daemon=True).start()
+
+    def _send(self, batch):
+        try:
+            by_temperature = {}
+            for request in batch:
+                by_temperature.setdefault(request[1], []).append(request)
+            for temperature, requests in by_temperature.items():
+                try:
+                    texts = self.send([content for content, _, _ in requests], temperature)
+                    for (_, _, future), text in zip(requests, texts):
+                        future.set_result(text)
+                except Exception as exception:
+                    for _, _, future in requests:
+                        future.set_exception(exception)
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["requests"] += len(batch)
+        finally:
+            self.slots.release()
+
+# local openai-compatible server (llama.cpp server, vllm serve): no account budget, concurrency = server slots
+# batch_size > 1 sends pages together through /v1/completions (one prompt per page) instead of streaming chat
+class LocalBackend(OpenAIBackend):
+    name = "local"
+
+    def __init__(self, base_url, model, concurrency=4, batch_size=1, batch_window=0.05,
+                 prompt_template="{content}", max_tokens=None):
+        super().__init__(base_url, "local", model, None if batch_size > 1 else concurrency)
+        self.concurrency = concurrency
+        self.prompt_template = prompt_template # the model's chat template, completions get raw text
+        self.max_tokens = max_tokens or inference.LOCAL_MAX_TOKENS # the server default (16) cuts every page off
+        self.batcher = BatchQueue(self._complete_batch, batch_size, batch_window, concurrency) if batch_size > 1 else None
+
+    def _complete_batch(self, contents, temperature):
+        response = self.client.completions.create(
+            model=self.model,
+            prompt=[self.prompt_template.format(content=content) for content in contents],
+            temperature=temperature,
+            max_tokens=self.max_tokens,
+        )
+        texts = [""] * len(contents)
+        for choice in response.choices:
+            texts[choice.index] = choice.text
+        return texts
+
+    def _stream(self, content, temperature, usage=None):
+        # a batch's usage covers all of its pages, batched calls leave usage to the estimate
+        if self.batcher is None:
+            yield from super()._stream(content, temperature, usage)
+            return
+        yield self.batcher.submit(content, temperature).result()
+
+    async def _astream(self, content, temperature, usage=None):
+        if self.batcher is None:
+            async for delta in super()._astream(content, temperature, usage):
+                yield delta
+            return
+        yield await asyncio.wrap_future(self.batcher.submit(content, temperature))
+
+    def describe(self):
+        batching = f", batches of {self.batcher.batch_size}" if self.batcher else ""
+        return f"{self.name} ({self.model} at {self.base_url}, concurrency {self.concurrency}{batching})"
+
+def empty_response(content):
+    return "<next_page>null</next_page><json>{\"corpus\": {}}</json>"
+
+# in-process fake for tests and benchmarks: responder(content) -> full response text, streamed in pieces
+class FakeBackend(Backend):
+    name = "fake"
+
+    def __init__(self, responder=empty_response, model="fake", concurrency=None, delta_chars=64, delay=0.0):
+        super().__init__(model, concurrency)
+        self.responder = responder
+        self.delta_chars = delta_chars
+        self.delay = delay # seconds per delta, to look like generation
+        self.calls = 0
+
+    def _pieces(self, content):
+        self.calls += 1
+        text = self.responder(content)
+        return [text[i:i + self.delta_chars] for i in range(0, len(text), self.delta_chars)]
+
+    def _stream(self, content, temperature, usage=None):
+        for piece in self._pieces(content):
+            if self.delay:
+                time.sleep(self.delay)
+            yield piece
+
+    async def _astream(self, content, temperature, usage=None):
+        for piece in self._pieces(content):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield piece
+
+def create_backend(name, base_url=None, model=None):
+    if name == "openrouter":
+        return OpenAIBackend(
+            base_url or inference.OPENROUTER_BASE_URL, inference.OPENROUTER_API_KEY, model or inference.MODEL,
+            inference.OPENROUTER_CONCURRENCY, limiter=inference.limiter,
+        )
+    if name == "local":
+        return LocalBackend(
+            base_url or inference.LOCAL_BASE_URL, model or inference.LOCAL_MODEL, inference.LOCAL_CONCURRENCY,
+            inference.LOCAL_BATCH_SIZE, inference.LOCAL_BATCH_WINDOW, inference.LOCAL_PROMPT_TEMPLATE,
+            inference.LOCAL_MAX_TOKENS,
+        )
+    if name == "fake":
+        return FakeBackend(model=model or "fake")
+    raise ValueError(f"unknown llm backend: {name}")
+
+BACKENDS = ("openrouter", "local", "fake")
@@ -0,0 +1,176 @@
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import fixtures
+
+CHARS_PER_TOKEN = 3.5 # same estimate as inference.py
+TOKENS_PER_DELTA = 4 # tokens per streamed event, about what hosted models send
+
+# openai-compatible server that replays the recorded completion of whichever fixture page the
+# prompt contains: /v1/chat/completions (streamed or not) and /v1/completions (batched prompts)
+# ttft and tokens_per_second shape every response like a real model's, per request
+class FakeLLMServer:
+    def __init__(self, site, site_url, host="127.0.0.1", port=0, ttft=0.5, tokens_per_second=50.0):
+        self.site = site
+        self.site_url = site_url # fixture server the recorded next_page urls point at
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.lock = threading.Lock()
+        self.reset()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        self.thread = None
+
+    def reset(self):
+        with self.lock:
+            self.stats = {"requests": 0, "unmatched": 0, "cancelled": 0, "input_tokens": 0, "output_tokens": 0,
+                          "active": 0, "peak": 0}
+
+    def respond(self, prompt):
+        text = self.site.respond(prompt, self.site_url)
+        with self.lock:
+            self.stats["requests"] += 1
+            if text is None:
+                self.stats["unmatched"] += 1
+                text = "<next_page>null</next_page><json>{\"corpus\": {}}</json>" # chunks without the heading
+            self.stats["input_tokens"] += tokens(prompt)
+            self.stats["output_tokens"] += tokens(text)
+        return text
+
+    def _busy(self, delta):
+        with self.lock:
+            self.stats["active"] += delta
+            self.stats["peak"] = max(self.stats["peak"], self.stats["active"])
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client went away: a stream it stopped reading, a pooled connection it closed
+                    self.close_connection = True
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server._busy(1)
+                try:
+                    if self.path.endswith("/chat/completions"):
+                        self._chat(request)
+                    elif self.path.endswith("/completions"):
+                        self._completions(request)
+                    else:
+                        self._json(404, {"error": {"message": f"no route {self.path}"}})
+                finally:
+                    server._busy(-1)
+
+            def _chat(self, request):
+                prompt = "".join(message.get("content") or "" for message in request["messages"])
+                text = server.respond(prompt)
+                chunk_id, model = f"chatcmpl-{uuid.uuid4().hex}", request.get("model", "fake")
+                if not request.get("stream"):
+                    time.sleep(server.ttft + tokens(text) / server.tokens_per_second)
+                    return self._json(200, {
+                        "id": chunk_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": usage(prompt, text),
+                    })
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                event = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+                started = time.monotonic() + server.ttft
+                step = max(1, int(TOKENS_PER_DELTA * CHARS_PER_TOKEN))
+                try:
+                    for produced in range(0, len(text), step):
+                        # paced against the start, not per event, so sleep overhead does not add up
+                        delay = started + tokens(text[:produced]) / server.tokens_per_second - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        self._event(dict(event, choices=[{"index": 0, "delta": {"content": text[produced:produced + step]},
+                                                          "finish_reason": None}]))
+                    self._event(dict(event, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                    if (request.get("stream_options") or {}).get("include_usage"):
+                        self._event(dict(event, choices=[], usage=usage(prompt, text)))
+                    self._write(b"data: [DONE]\n\n")
+                    self._write(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stopped reading (it had what it needed), like cancelling a generation
+                    with server.lock:
+                        server.stats["cancelled"] += 1
+                    self.close_connection = True
+
+            def _completions(self, request):
+                # one batch is one forward pass: the slowest prompt sets the time for all of them
+                prompts = request["prompt"] if isinstance(request["prompt"], list) else [request["prompt"]]
+                texts = [server.respond(prompt) for prompt in prompts]
+                time.sleep(server.ttft + max(tokens(text) for text in texts) / server.tokens_per_second)
+                self._json(200, {
+                    "id": f"cmpl-{uuid.uuid4().hex}", "object": "text_completion", "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{"index": i, "text": text, "finish_reason": "stop"} for i, text in enumerate(texts)],
+                    "usage": usage("".join(prompts), "".join(texts)),
+                })
+
+            def _event(self, payload):
+                self._write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+            def _write(self, data):
+                # one http chunk, empty data ends the body
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def usage(prompt, text):
+    return {"prompt_tokens": tokens(prompt), "completion_tokens": tokens(text),
+            "total_tokens": tokens(prompt) + tokens(text)}
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Replay recorded completions for a fixture site")
+    argparser.add_argument("site", choices=sorted(fixtures.SITES))
+    argparser.add_argument("--site-url", default="http://127.0.0.1:8900", help="Where fixture_server.py serves the site")
+    argparser.add_argument("--port", type=int, default=8901)
+    argparser.add_argument("--max-pages", type=int, help="Same cut as the fixture server's")
+    argparser.add_argument("--ttft", type=float, default=0.5, help="Seconds to the first token")
+    argparser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed per request")
+    args = argparser.parse_args()
+
+    server = FakeLLMServer(fixtures.build(args.site, args.max_pages), args.site_url, port=args.port,
+                           ttft=args.ttft, tokens_per_second=args.tokens_per_second)
+    print(f"Replaying {args.site} completions at {server.url}")
+    server.httpd.serve_forever()
@@ -0,0 +1,84 @@
+import argparse
+import hashlib
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import fixtures
+
+# serves recorded sites over http, with ETags so the page cache can revalidate
+# unknown paths (robots.txt, pages past the end of a series) are 404s, like the live sites
+class FixtureServer:
+    def __init__(self, site, host="127.0.0.1", port=0, latency=0.0):
+        self.site = site
+        self.latency = latency # seconds before each response, a far away host
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, the crawler pools its connections
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client went away: a stream it stopped reading, a pooled connection it closed
+                    self.close_connection = True
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                page = server.site.page(self.path)
+                if page is None:
+                    return self._send(404, b"not found", "text/plain")
+                body = page.encode("utf-8")
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", None, etag)
+                self._send(200, body, "text/html; charset=utf-8", etag)
+
+            def _send(self, status, body, content_type, etag=None):
+                self.send_response(status)
+                if content_type:
+                    self.send_header("Content-Type", content_type)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Serve a recorded site for offline crawls")
+    argparser.add_argument("site", choices=sorted(fixtures.SITES))
+    argparser.add_argument("--port", type=int, default=8900)
+    argparser.add_argument("--max-pages", type=int, help="Cut the site's page chain after this many pages")
+    argparser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    args = argparser.parse_args()
+
+    site = fixtures.build(args.site, args.max_pages)
+    server = FixtureServer(site, port=args.port, latency=args.latency)
+    print(f"Serving {len(site.pages)} pages of {site.name} at {server.url}{site.start_path}")
+    server.httpd.serve_forever()
@@ -0,0 +1,266 @@
+import html
+import json
+import re
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl, urlencode, quote
+
+# recorded sites for the offline benchmark, rebuilt from the crawls kept in eval/llm/
+# every page comes with the completion the model gave for it (full and fast prompt), so the
+# fake llm server can replay it and the crawl walks the same chain of pages as the live run
+EVAL_DIR = Path(__file__).resolve().parent.parent / "eval" / "llm"
+ENTRIES_PER_PAGE = 20 # webonary browse pages
+LEMMAS_PER_PAGE = 200 # wiktionary category pages
+VERSES_PER_CHAPTER = 30 # bible.is chapter pages
+
+TITLE = re.compile(r"<h1[^>]*>(.*?)</h1>", re.DOTALL) # pages are told apart by their heading
+NEXT_LINK = re.compile(r'<a class="next"[^>]*>.*?</a>')
+RULES_PROMPT = "wrapped in a <rules></rules> tag" # see inference.get_rule_induction_prompt
+FAST_PROMPT = "Do NOT explain your reasoning" # see inference.get_fast_prompt
+PACK_PROMPT = 'each wrapped in a <page id="n"' # see inference.get_pack_note
+PACKED_PAGE = re.compile(r'<page id="(\d+)"[^>]*>(.*?)</page>', re.DOTALL)
+
+# shared by every page of a site, what boilerplate.py learns to strip
+LAYOUT = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title} | {site}</title>
+<link rel="stylesheet" href="/static/site.css">
+<script src="/static/analytics.js"></script>
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}}</script>
+</head>
+<body>
+<header class="site-header">
+<a class="logo" href="/">{site}</a>
+<nav class="main-menu"><ul>
+<li><a href="/">Home</a></li><li><a href="/about/">About this project</a></li>
+<li><a href="/help/">How to use the {site}</a></li><li><a href="/contact/">Contact the editors</a></li>
+</ul></nav>
+<form class="search" action="/search/"><input name="q" placeholder="Search the {site}"><button>Search</button></form>
+</header>
+<div class="layout">
+<aside class="sidebar">
+<h3>About</h3>
+<p>The {site} is maintained by volunteers together with the speech community. Corrections and
+additions are welcome, please write to the editors through the contact page.</p>
+{sidebar}
+</aside>
+<main class="content">
+<h1 class="page-title">{title}</h1>
+{body}
+</main>
+</div>
+<footer class="site-footer">
+<p>Content is available under the Creative Commons Attribution-ShareAlike License unless otherwise
+noted. Privacy policy, terms of use and accessibility statement of the {site}.</p>
+</footer>
+</body>
+</html>
+"""
+
+class Site:
+    def __init__(self, name, title, source_language, target_languages, reasoning, summary, rules):
+        self.name = name
+        self.title = title
+        self.source_language = source_language
+        self.target_languages = target_languages # None -> raw content crawl
+        self.reasoning = reasoning # recorded chain of thought, the same on every full-prompt page
+        self.summary = summary
+        self.rules = rules # what the model answers to the rule induction prompt
+        self.pages = {} # path?query -> html
+        self.corpora = {} # page heading -> (corpus, next_path)
+        self.order = [] # paths in crawl order
+        self.start_path = None
+
+    def add(self, path, title, body, sidebar, corpus):
+        self.pages[path] = LAYOUT.format(site=self.title, title=html.escape(title), body=body, sidebar=sidebar)
+        self.corpora[title] = [corpus, None]
+        if self.order:
+            self.corpora[self._title(self.order[-1])][1] = path
+        self.order.append(path)
+        self.start_path = self.start_path or path
+
+    def _title(self, path):
+        return html.unescape(TITLE.search(self.pages[path]).group(1))
+
+    def truncate(self, max_pages):
+        # keep the first max_pages of the chain, the last one kept leads nowhere
+        for path in self.order[max_pages:]:
+            del self.corpora[self._title(path)]
+            del self.pages[path]
+        self.order = self.order[:max_pages]
+        if self.order:
+            last = self.order[-1]
+            self.corpora[self._title(last)][1] = None
+            self.pages[last] = NEXT_LINK.sub("", self.pages[last])
+
+    def entries(self):
+        return sum(len(corpus) for corpus, _ in self.corpora.values())
+
+    def page(self, path):
+        # html for a request path, query order does not matter
+        p = urlparse(path)
+        return self.pages.get(key(p.path, p.query))
+
+    def completion(self, title, base_url, fast=False):
+        corpus, next_path = self.corpora[title]
+        next_page = base_url + next_path if next_path else "null"
+        corpus = json.dumps({"corpus": corpus}, ensure_ascii=False, indent=4)
+        if fast:
+            return f"<response>\n    <next_page>{next_page}</next_page>\n    <json>{corpus}</json>\n</response>"
+        return (f"<response>\n    <chain_of_thought>{self.reasoning}</chain_of_thought>\n"
+                f"    <site_summary>{self.summary}</site_summary>\n"
+                f"    <next_page>{next_page}</next_page>\n    <json>{corpus}</json>\n</response>")
+
+    def respond(self, prompt, base_url):
+        # recorded answer to a prompt about one of this site's pages, None if it is not one
+        if PACK_PROMPT in prompt:
+            # one block per packed page, each the page's own fast answer
+            blocks = []
+            for i, page in PACKED_PAGE.findall(prompt.split(PACK_PROMPT)[0]):
+                title = heading(page)
+                blocks.append(f'<page id="{i}">{self.completion(title, base_url, True) if title in self.corpora else ""}</page>\n')
+            if FAST_PROMPT in prompt:
+                return "<response>\n" + "".join(blocks) + "</response>"
+            return (f"<response>\n<chain_of_thought>{self.reasoning}</chain_of_thought>\n"
+                    f"<site_summary>{self.summary}</site_summary>\n" + "".join(blocks) + "</response>")
+        title = heading(prompt)
+        if title not in self.corpora:
+            return None
+        if RULES_PROMPT in prompt:
+            return f"<rules>{json.dumps(self.rules, ensure_ascii=False)}</rules>"
+        return self.completion(title, base_url, FAST_PROMPT in prompt)
+
+def heading(text):
+    match = TITLE.search(text)
+    return html.unescape(match.group(1).strip()) if match else None
+
+def key(path, query=""):
+    return path + ("?" + urlencode(sorted(parse_qsl(query, keep_blank_values=True))) if query else "")
+
+def _load(name):
+    with open(EVAL_DIR / name, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+def _e(text):
+    # the recorded crawl has the odd list or number where a string belongs
+    if isinstance(text, list):
+        text = "; ".join(str(item) for item in text if item)
+    return html.escape(str(text or ""))
+
+def webonary():
+    # browse pages per letter, ?letter=a&pg=2 (webonary.org/rungus)
+    site = Site(
+        "webonary", "Rungus Dictionary", "rungus", "english, malay",
+        reasoning="The page is one browse page of the Rungus dictionary for a single letter. Every entry is a div "
+                  "with the headword, its English and Malay senses and optional example sentences in all three "
+                  "languages. Pages within a letter are numbered with pg, after the last page of a letter the "
+                  "crawl continues with page 1 of the next letter in the alphabet bar.",
+        summary="Entries are div.entry blocks: span.headword, span.sense english/malay, div.example blocks with "
+                "vernacular, english and malay spans. Browse pages are /browse/?letter=X&pg=N; follow the "
+                "next link, after the last page of a letter go to pg=1 of the next letter.",
+        rules={
+            "entry": "div.entry",
+            "word": "span.headword",
+            "translations": {"english": "span.sense.english", "malay": "span.sense.malay"},
+            "example": {
+                "container": "div.example",
+                "fields": {"rungus": "span.vernacular", "english": "span.translation.english",
+                           "malay": "span.translation.malay"},
+            },
+            "next_page": "a.next@href",
+        },
+    )
+    letters = {}
+    for word, entry in _load("LLM_webonary_org_rungus.json").items():
+        letter = word[:1].lower()
+        if "a" <= letter <= "z":
+            letters.setdefault(letter, []).append((word, entry))
+    alphabet = "".join(f'<a href="/browse/?letter={letter}&amp;pg=1">{letter}</a> ' for letter in sorted(letters))
+    sidebar = f'<div class="alphabet"><h3>Browse</h3>{alphabet}</div>'
+
+    pages = []
+    for letter in sorted(letters):
+        words = sorted(letters[letter], key=lambda item: item[0].casefold())
+        chunks = [words[i:i + ENTRIES_PER_PAGE] for i in range(0, len(words), ENTRIES_PER_PAGE)]
+        pages.extend((letter, number, chunk, len(chunks)) for number, chunk in enumerate(chunks, start=1))
+
+    for i, (letter, number, chunk, total) in enumerate(pages):
+        blocks = []
+        for word, entry in chunk:
+            translations = entry.get("translations") or {}
+            examples = "".join(
+                f'<div class="example"><span class="vernacular">{_e(example.get("rungus"))}</span>'
+                f'<span class="translation english">{_e(example.get("english"))}</span>'
+                f'<span class="translation malay">{_e(example.get("malay"))}</span></div>'
+                for example in entry.get("example_sentences") or []
+            )
+            blocks.append(
+                f'<div class="entry"><span class="headword">{_e(word)}</span>'
+                f'<span class="sense english">{_e(translations.get("english"))}</span>'
+                f'<span class="sense malay">{_e(translations.get("malay"))}</span>{examples}</div>'
+            )
+        links = [f'<span class="current">{number}</span>']
+        if number > 1:
+            links.insert(0, f'<a class="prev" href="/browse/?letter={letter}&amp;pg={number - 1}">previous</a>')
+        if number < total:
+            links.append(f'<a class="next" href="/browse/?letter={letter}&amp;pg={number + 1}">next</a>')
+        body = "\n".join(blocks) + f'\n<div class="pagination">{" ".join(links)}</div>'
+        corpus = {word: entry for word, entry in chunk}
+        site.add(key("/browse/", f"letter={letter}&pg={number}"), f"Browse {letter.upper()}: page {number} of {total}",
+                 body, sidebar, corpus)
+    return site
+
+def wiktionary():
+    # category listing, ?pagefrom=<next lemma> (en.wiktionary.org/wiki/Category:Adyghe_lemmas)
+    site = Site(
+        "wiktionary", "Wiktionary", "adyghe", None,
+        reasoning="This is a page of the Adyghe lemmas category. The lemmas are the link texts of the list items "
+                  "in the category listing; the link labelled next page continues the listing from the first "
+                  "lemma of the following page.",
+        summary="Lemmas are the links in the ul lists of div#mw-pages, one lemma per li. The next page of the "
+                "category is the 'next page' link (?pagefrom=<lemma>); there is none on the last page.",
+        rules={"sentence": "#mw-pages li", "next_page": "a.next@href"},
+    )
+    lemmas = _load("LLM_Wiktionary_Adyghe_lemmas.json")
+    chunks = [lemmas[i:i + LEMMAS_PER_PAGE] for i in range(0, len(lemmas), LEMMAS_PER_PAGE)]
+    sidebar = '<div class="portal"><h3>Categories</h3><a href="/wiki/Category:Adyghe_language">Adyghe language</a></div>'
+    for number, chunk in enumerate(chunks):
+        query = f"pagefrom={quote(chunk[0])}" if number else ""
+        items = "".join(f'<li><a href="/wiki/{quote(lemma)}">{_e(lemma)}</a></li>' for lemma in chunk)
+        link = (f'<a class="next" href="/wiki/Category:Adyghe_lemmas?pagefrom={quote(chunks[number + 1][0])}">next page</a>'
+                if number + 1 < len(chunks) else "")
+        body = f'<div id="mw-pages"><p>The following {len(chunk)} pages are in this category.</p>{link}<ul>{items}</ul>{link}</div>'
+        site.add(key("/wiki/Category:Adyghe_lemmas", query), f"Category:Adyghe lemmas ({chunk[0]})", body, sidebar, chunk)
+    return site
+
+def bibleis():
+    # one chapter per page, /bible/HUNK90/GEN/3 (live.bible.is)
+    site = Site(
+        "bibleis", "Bible.is", "hungarian", None,
+        reasoning="The page shows one chapter of Genesis in the Hungarian Karoli translation. Each verse is a "
+                  "span next to its verse number; the chapters are numbered in the path and the next chapter "
+                  "link leads to the following one.",
+        summary="Verses are span.verse elements in div.chapter (verse numbers are separate sup elements, skip "
+                "them). Chapters are /bible/HUNK90/GEN/N, the next chapter link increments N.",
+        rules={"sentence": "div.chapter span.verse", "next_page": "a.next@href"},
+    )
+    verses = _load("LLM_BibleIS_HUNK90_GEN.json")
+    chapters = [verses[i:i + VERSES_PER_CHAPTER] for i in range(0, len(verses), VERSES_PER_CHAPTER)]
+    sidebar = '<div class="versions"><h3>Versions</h3><a href="/bible/HUNK90/">Karoli 1990</a></div>'
+    for number, chapter in enumerate(chapters, start=1):
+        text = "".join(f'<sup>{i}</sup><span class="verse">{_e(verse)}</span> ' for i, verse in enumerate(chapter, start=1))
+        links = f'<a class="prev" href="/bible/HUNK90/GEN/{number - 1}">previous chapter</a>' if number > 1 else ""
+        if number < len(chapters):
+            links += f' <a class="next" href="/bible/HUNK90/GEN/{number + 1}">next chapter</a>'
+        body = f'<div class="chapter">{text}</div><div class="chapter-nav">{links}</div>'
+        site.add(key(f"/bible/HUNK90/GEN/{number}"), f"Genesis {number}", body, sidebar, chapter)
+    return site
+
+SITES = {"webonary": webonary, "wiktionary": wiktionary, "bibleis": bibleis}
+
+def build(name, max_pages=None):
+    site = SITES[name]()
+    if max_pages:
+        site.truncate(max_pages)
+    return site
@@ -0,0 +1,190 @@
+import argparse
+import inspect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fixtures
+from fixture_server import FixtureServer
+from fake_llm import FakeLLMServer
+
+# offline throughput benchmark: crawls a recorded site against the fake llm server for every
+# engine x worker count and reports pages/s, entries/s and per-page latency percentiles
+# each run is a fresh process in a fresh directory, no cache, state or learned rules carry over
+ROOT = Path(__file__).resolve().parent.parent
+
+# crawler switches a run can turn off (--no-<name>), module and flag they map to
+OPTIONS = {
+    "reduce": ("main", "REDUCE_HTML"),
+    "chunking": ("main", "CHUNKED_EXTRACTION"),
+    "pagination": ("main", "PAGINATION_INFERENCE"),
+    "rules": ("main", "RULE_INDUCTION"),
+    "fast": ("main", "FAST_PROMPTS"),
+    "boilerplate": ("scrape", "STRIP_BOILERPLATE"),
+    "dedup": ("main", "DEDUP_RAW"),
+    "page-dedup": ("main", "PAGE_DEDUP"),
+}
+
+def run_one(config):
+    # child process: one crawl, returns the measurements
+    sys.path.insert(0, str(ROOT))
+    os.chdir(config["directory"])
+    from concurrent.futures import ThreadPoolExecutor
+    import main
+    import scrape
+    from crawl_state import CrawlState
+    from corpus_writer import CorpusWriter
+    from backends import OpenAIBackend, LocalBackend
+    from inference import set_backend
+    from telemetry import percentile # the trace's nearest rank, so bench and trace percentiles agree
+
+    for name, enabled in config["options"].items():
+        module, flag = OPTIONS[name]
+        setattr(sys.modules[module], flag, enabled)
+    main.CACHE_READ = main.CACHE_WRITE = False
+    main.PAGE_PACKING = config["pack"]
+    scrape.PAGE_CACHE = False
+    if config["backend"] == "local":
+        backend = LocalBackend(config["llm_url"], "bench", config["workers"], config["batch_size"])
+    else:
+        backend = OpenAIBackend(config["llm_url"], "bench", "bench") # no rate limit, workers are the cap
+    set_backend(backend)
+
+    latencies = []
+    def timed(process_page):
+        if inspect.iscoroutinefunction(process_page):
+            async def wrapper(*args, **kwargs):
+                started = time.monotonic()
+                try:
+                    return await process_page(*args, **kwargs)
+                finally:
+                    latencies.append(time.monotonic() - started)
+            return wrapper
+
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return process_page(*args, **kwargs)
+            finally:
+                latencies.append(time.monotonic() - started)
+        return wrapper
+
+    target_languages = config["target_languages"]
+    crawl = main.Crawler(config["start_url"], config["source_language"], target_languages, "corpus.json")
+    crawl.writer = CorpusWriter("corpus.jsonl")
+    crawl.state = CrawlState("state.sqlite")
+    started = time.monotonic()
+    if config["engine"] == "async":
+        import async_engine
+        async_engine.ASYNC_MAX_PAGES = config["workers"]
+        async_engine.AsyncCrawler.process_page = timed(async_engine.AsyncCrawler.process_page)
+        crawl.run("async")
+    else:
+        main.MAX_WORKERS = config["workers"]
+        main.executor = ThreadPoolExecutor(max_workers=config["workers"])
+        main.Crawler.process_page = timed(main.Crawler.process_page)
+        crawl.run("threads")
+    seconds = time.monotonic() - started
+    crawl.writer.close()
+
+    counts = crawl.state.counts()
+    return {
+        "seconds": seconds,
+        "pages": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "entries": len(crawl.dictionary),
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p99": percentile(latencies, 0.99),
+        "replayed": main.rulebook.stats["replayed"],
+    }
+
+def run_child(config):
+    with tempfile.TemporaryDirectory(prefix="bench-") as directory:
+        config = dict(config, directory=directory)
+        config_path, result_path = Path(directory) / "config.json", Path(directory) / "result.json"
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+        with open(Path(directory) / "crawl.log", "w", encoding="utf-8") as log:
+            completed = subprocess.run(
+                [sys.executable, __file__, "--child", str(config_path), str(result_path)],
+                stdout=log, stderr=subprocess.STDOUT,
+            )
+        if completed.returncode != 0 or not result_path.exists():
+            tail = (Path(directory) / "crawl.log").read_text(encoding="utf-8").splitlines()[-20:]
+            raise RuntimeError(f"benchmark run failed ({completed.returncode}):\n" + "\n".join(tail))
+        return json.loads(result_path.read_text(encoding="utf-8"))
+
+def main():
+    argparser = argparse.ArgumentParser(description="Offline crawl throughput benchmark")
+    argparser.add_argument("--site", choices=sorted(fixtures.SITES), default="webonary")
+    argparser.add_argument("--max-pages", type=int, default=40, help="Pages of the site's chain to crawl")
+    argparser.add_argument("--workers", default="1,4,16", help="Comma-separated worker counts (pages in flight)")
+    argparser.add_argument("--engines", default="threads,async", help="Comma-separated engines")
+    argparser.add_argument("--ttft", type=float, default=0.5, help="Fake llm seconds to the first token")
+    argparser.add_argument("--tokens-per-second", type=float, default=200.0, help="Fake llm generation speed per request")
+    argparser.add_argument("--site-latency", type=float, default=0.05, help="Fixture server seconds per response")
+    argparser.add_argument("--backend", choices=("openrouter", "local"), default="openrouter",
+                           help="Streaming chat backend, or the local backend (batched with --batch-size > 1)")
+    argparser.add_argument("--batch-size", type=int, default=1)
+    argparser.add_argument("--pack", action="store_true", help="Pack small pages into shared llm requests")
+    argparser.add_argument("--repeat", type=int, default=1, help="Runs per configuration, the median run is reported")
+    for name in OPTIONS:
+        argparser.add_argument(f"--no-{name}", action="store_true", help=f"Run with {OPTIONS[name][1]} = False")
+    argparser.add_argument("--json", help="Also write the results to this file")
+    args = argparser.parse_args()
+
+    site = fixtures.build(args.site, args.max_pages)
+    fixture_server = FixtureServer(site, latency=args.site_latency).start()
+    llm_server = FakeLLMServer(site, fixture_server.url, ttft=args.ttft, tokens_per_second=args.tokens_per_second).start()
+    options = {name: not getattr(args, f"no_{name.replace('-', '_')}") for name in OPTIONS}
+    print(f"{site.name}: {len(site.pages)} pages, {site.entries()} entries; llm ttft {args.ttft}s, "
+          f"{args.tokens_per_second:g} tokens/s; {args.backend} backend"
+          + (f", batches of {args.batch_size}" if args.batch_size > 1 else "")
+          + ("; packed pages" if args.pack else "")
+          + "".join(f"; no {name}" for name, enabled in options.items() if not enabled))
+    print(f"{'engine':<8} {'workers':>7} {'pages':>6} {'entries':>8} {'seconds':>8} {'pages/s':>8} {'entries/s':>10} "
+          f"{'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'llm calls':>9} {'peak':>5}")
+
+    results = []
+    try:
+        for engine in args.engines.split(","):
+            for workers in (int(w) for w in args.workers.split(",")):
+                runs = []
+                for _ in range(args.repeat):
+                    llm_server.reset()
+                    result = run_child({
+                        "engine": engine, "workers": workers, "options": options,
+                        "backend": args.backend, "batch_size": args.batch_size, "pack": args.pack, "llm_url": llm_server.url,
+                        "start_url": fixture_server.url + site.start_path,
+                        "source_language": site.source_language, "target_languages": site.target_languages,
+                    })
+                    result.update(llm_calls=llm_server.stats["requests"], llm_peak=llm_server.stats["peak"],
+                                  output_tokens=llm_server.stats["output_tokens"])
+                    runs.append(result)
+                result = sorted(runs, key=lambda run: run["seconds"])[len(runs) // 2]
+                result.update(engine=engine, workers=workers, pages_per_second=result["pages"] / result["seconds"],
+                              entries_per_second=result["entries"] / result["seconds"])
+                results.append(result)
+                print(f"{engine:<8} {workers:>7} {result['pages']:>6} {result['entries']:>8} {result['seconds']:>8.1f} "
+                      f"{result['pages_per_second']:>8.2f} {result['entries_per_second']:>10.1f} {result['p50']:>7.2f} "
+                      f"{result['p90']:>7.2f} {result['p99']:>7.2f} {result['llm_calls']:>9} {result['llm_peak']:>5}")
+    finally:
+        llm_server.stop()
+        fixture_server.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"site": site.name, "arguments": vars(args), "results": results}, fh, indent=2)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        with open(sys.argv[2], "r", encoding="utf-8") as fh:
+            measured = run_one(json.load(fh))
+        with open(sys.argv[3], "w", encoding="utf-8") as fh:
+            json.dump(measured, fh)
+    else:
+        main()
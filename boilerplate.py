@@ -0,0 +1,158 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+from reduce import Node, _open_tag, text_content
+from inference import CHARS_PER_TOKEN
+
+# per-host boilerplate detection on reduced trees: the first pages of a host teach it which
+# blocks (header, navigation, sidebar, footer) every page repeats; later pages drop them,
+# keeping only pagination-looking links out of them so the model can still find the next page
+# a host is learned per crawl scope (site_summary.site_scope): the dictionaries of one host differ
+LEARN_PAGES = 5 # pages per host fingerprinted before anything is stripped
+SHARED_SHARE = 0.8 # block must appear on this share of the learning pages
+MIN_BLOCK_TOKENS = 20 # smaller blocks are not worth a fingerprint (and may be real repeated content)
+
+# links kept out of stripped blocks (plus <link rel="next"> and select pickers): short ones (page numbers, alphabet letters and digraphs such as
+# "ch", "ng", "дж", "къ"), next/prev wording, arrows
+SHORT_LINK_CHARS = 4
+PAGINATION_TEXT = re.compile(r"^(\d{1,5}|next|prev|previous|older|newer|more|first|last|.*[«»‹›→←].*)$", re.I)
+PAGINATION_HINT = re.compile(r"pag|next|prev", re.I) # in rel/class/id
+
+class HostBoilerplate:
+    def __init__(self):
+        self.pages = 0
+        self.counts = Counter() # fingerprint -> learning pages it appeared on
+        self.shared = None # frozen set of boilerplate fingerprints once learning is done
+
+def _fingerprint(node, digests):
+    # bottom-up digest of every subtree, digests[id(node)] = (digest, chars)
+    parts, size = [_open_tag(node)], len(_open_tag(node))
+    for child in node.children:
+        if isinstance(child, Node):
+            digest, child_size = _fingerprint(child, digests)
+            parts.append(digest)
+            size += child_size
+        elif isinstance(child, str):
+            parts.append(child)
+            size += len(child)
+    digest = hashlib.blake2b("\x00".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+    digests[id(node)] = (digest, size)
+    return digest, size
+
+def _blocks(root, digests):
+    # fingerprints of the blocks big enough to count
+    minimum = MIN_BLOCK_TOKENS * CHARS_PER_TOKEN
+    stack, found = [root], set()
+    while stack:
+        node = stack.pop()
+        for child in node.children:
+            if isinstance(child, Node):
+                digest, size = digests[id(child)]
+                if size >= minimum:
+                    found.add(digest)
+                    stack.append(child)
+    return found
+
+def _is_pagination_link(node):
+    if node.tag == "select": # a page or letter picker, kept whole
+        return True
+    if node.tag not in ("a", "link"):
+        return False
+    attrs = dict(node.attrs)
+    if not attrs.get("href"):
+        return False
+    if any(PAGINATION_HINT.search(attrs.get(name) or "") for name in ("rel", "class", "id")):
+        return True
+    text = " ".join(text_content(node).split())
+    return 0 < len(text) <= SHORT_LINK_CHARS or bool(PAGINATION_TEXT.match(text))
+
+def _pagination_links(node):
+    links, stack = [], [node]
+    while stack:
+        current = stack.pop()
+        if _is_pagination_link(current):
+            links.append(current)
+            continue
+        stack.extend(child for child in reversed(current.children) if isinstance(child, Node))
+    return links
+
+class BoilerplateDetector:
+    def __init__(self, learn_pages=LEARN_PAGES):
+        self.learn_pages = learn_pages
+        self.hosts = {} # (crawl scope, netloc) -> HostBoilerplate
+        self.lock = threading.Lock()
+        self.stats = {"pages": 0, "tokens_removed": 0}
+
+    def _host(self, url, scope):
+        netloc = urlparse(url).netloc.lower()
+        with self.lock:
+            if (scope, netloc) not in self.hosts:
+                self.hosts[scope, netloc] = HostBoilerplate()
+            return netloc, self.hosts[scope, netloc]
+
+    def process(self, url, root, scope=None):
+        # learn from or strip a reduced tree in place; returns the estimated tokens removed
+        netloc, host = self._host(url, scope)
+        digests = {}
+        _fingerprint(root, digests)
+
+        with self.lock:
+            shared = host.shared
+            if shared is None:
+                host.counts.update(_blocks(root, digests))
+                host.pages += 1
+                if host.pages >= self.learn_pages:
+                    needed = max(2, math.ceil(SHARED_SHARE * host.pages))
+                    host.shared = {digest for digest, count in host.counts.items() if count >= needed}
+                    host.counts = None
+                    print(f"Learned {len(host.shared)} boilerplate blocks for {netloc} from {host.pages} pages")
+                return 0
+        if not shared:
+            return 0
+
+        removed = self._strip(root, shared, digests)
+        tokens = math.ceil(removed / CHARS_PER_TOKEN)
+        with self.lock:
+            self.stats["pages"] += 1
+            self.stats["tokens_removed"] += tokens
+        if tokens:
+            print(f"Stripped boilerplate from {url}: -{tokens} tokens")
+        return tokens
+
+    def strip(self, url, root, scope=None):
+        # only strip what is already learned: no learning, no stats (probes compare against reduce_page output)
+        _, host = self._host(url, scope)
+        with self.lock:
+            shared = host.shared
+        if shared:
+            digests = {}
+            _fingerprint(root, digests)
+            self._strip(root, shared, digests)
+
+    def _strip(self, node, shared, digests):
+        # drop the outermost shared blocks, keeping their pagination links; returns chars removed
+        removed, kept = 0, []
+        for child in node.children:
+            if not isinstance(child, Node):
+                kept.append(child)
+                continue
+            digest, size = digests[id(child)]
+            if digest not in shared:
+                removed += self._strip(child, shared, digests)
+                kept.append(child)
+                continue
+            links = _pagination_links(child)
+            if links:
+                nav = Node("nav", parent=node)
+                for link in links:
+                    link.parent = nav
+                    nav.children.append(link)
+                    size -= digests[id(link)][1]
+                kept.append(nav)
+            removed += size
+        node.children = kept
+        return removed
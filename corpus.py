@@ -0,0 +1,106 @@
+import json
+import threading
+
+SHARDS = 64 # lock stripes for dict corpora; merges of different headwords rarely share one
+ITER_BATCH = 10000 # sentences copied per lock hold when iterating a list corpus
+SEPARATOR = "; " # joins differing translations of a headword seen more than once
+
+def _merge_text(old, new):
+    # "a; b" + "b; c" -> "a; b; c", so merging the same value twice changes nothing
+    if not old:
+        return new
+    if not new or not isinstance(old, str) or not isinstance(new, str):
+        return old
+    parts = old.split(SEPARATOR)
+    parts += [part for part in new.split(SEPARATOR) if part not in parts]
+    return SEPARATOR.join(parts)
+
+# a headword seen again (another page, another sense): translations are joined, example sentences
+# appended unless already there, other fields filled where the earlier entry had none
+def merge_values(old, new):
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    merged = dict(old)
+    for field, value in new.items():
+        current = merged.get(field)
+        if field == "translations" and isinstance(current, dict) and isinstance(value, dict):
+            merged[field] = {language: _merge_text(current.get(language), value.get(language))
+                             for language in {**current, **value}}
+        elif isinstance(current, list) and isinstance(value, list):
+            seen = {json.dumps(item, ensure_ascii=False, sort_keys=True) for item in current}
+            merged[field] = current + [item for item in value
+                                       if json.dumps(item, ensure_ascii=False, sort_keys=True) not in seen]
+        elif current is None or current == "" or current == []:
+            merged[field] = value
+    return merged
+
+def _pack(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _unpack(packed):
+    return json.loads(packed)
+
+# master corpus shared by every worker. dict corpora are split into hash shards, each behind its own
+# lock, and keep their entries as compact utf-8 json (a fraction of nested dicts' size); sentences of
+# list corpora stay in crawl order behind one lock held only for the append
+# merge() returns what to log: the entry, or the merged entry when the headword was already there.
+# on_merged(merged) runs under the same lock, so the log gets a headword's merges in merge order and
+# its last line (the one compaction keeps) is the final merged value
+class CorpusStore:
+    def __init__(self, kind=dict, shards=SHARDS):
+        self.kind = kind
+        self.shards = [{} for _ in range(shards)] if kind is dict else [[]]
+        self.locks = [threading.Lock() for _ in self.shards]
+
+    def merge(self, entry, on_merged=None):
+        if self.kind is list:
+            with self.locks[0]:
+                self.shards[0].append(entry)
+                if on_merged:
+                    on_merged(entry)
+            return entry
+        if not isinstance(entry, tuple):
+            return None
+        key, value = entry
+        index = hash(key) % len(self.shards)
+        with self.locks[index]:
+            shard = self.shards[index]
+            if key in shard:
+                value = merge_values(_unpack(shard[key]), value)
+            shard[key] = _pack(value)
+            if on_merged:
+                on_merged((key, value)) # a queue put for the writer, cheap enough to hold the lock
+        return key, value
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def __iter__(self):
+        # sentences, or (word, entry) pairs; a shard or batch is copied at a time, never the whole corpus
+        if self.kind is list:
+            sentences, start = self.shards[0], 0
+            while True:
+                with self.locks[0]:
+                    batch = sentences[start:start + ITER_BATCH] # append-only, earlier indices never move
+                if not batch:
+                    return
+                yield from batch
+                start += len(batch)
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                items = list(shard.items())
+            for key, packed in items:
+                yield key, _unpack(packed)
+
+    def get(self, key, default=None):
+        index = hash(key) % len(self.shards)
+        with self.locks[index]:
+            packed = self.shards[index].get(key)
+        return default if packed is None else _unpack(packed)
+
+# combine the (entries, next_page) results of one page's chunks, in page order
+def combine_chunks(results):
+    entries = sum(count for count, _ in results)
+    # prefer the last chunk's <next_page>, fall back to earlier chunks (pagination may sit at the top)
+    next_page = next((np for _, np in reversed(results) if np), None)
+    return entries, next_page
@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+try:
+    import zstandard # optional, only for compressed output
+except ImportError:
+    zstandard = None
+
+BATCH_SIZE = 1000 # records written per batch
+FSYNC_INTERVAL = 1.0 # seconds between fsyncs, a crash loses at most this much
+_CLOSE = object()
+
+# append-only corpus output, one record per line:
+#   dict corpora -> ["word", {entry}], list corpora -> "sentence"
+# workers only enqueue; a single background thread does all file i/o
+class CorpusWriter:
+    def __init__(self, path, compress=False, append=False):
+        if compress and zstandard is None:
+            raise RuntimeError("zstd output needs the zstandard package (pip install zstandard)")
+        self.path = path
+        self.compress = compress
+        self.queue = queue.Queue()
+        self.written = 0
+        self.fh = open(path, "ab" if append else "wb")
+        self.compressor = zstandard.ZstdCompressor() if compress else None
+        self.thread = threading.Thread(target=self._run, name="corpus-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, entry):
+        self.queue.put(list(entry) if isinstance(entry, tuple) else entry)
+
+    def flush(self):
+        # blocks until everything queued so far is on disk
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        self.fh.close()
+
+    def _run(self):
+        last_sync = time.monotonic()
+        closing = False
+        while not closing:
+            try:
+                batch = [self.queue.get(timeout=FSYNC_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not _CLOSE]
+            closing = len(records) < len(batch)
+            if records:
+                data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+                if self.compressor:
+                    data = self.compressor.compress(data) # one zstd frame per batch, frames concatenate
+                self.fh.write(data)
+                self.fh.flush()
+                self.written += len(records)
+
+            if closing or time.monotonic() - last_sync >= FSYNC_INTERVAL:
+                os.fsync(self.fh.fileno())
+                last_sync = time.monotonic()
+            for _ in batch:
+                self.queue.task_done()
+
+def read_records(path):
+    with open(path, "rb") as fh:
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("reading zstd output needs the zstandard package (pip install zstandard)")
+            stream = zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True)
+            lines = io.TextIOWrapper(stream, encoding="utf-8")
+        else:
+            lines = (line.decode("utf-8") for line in fh)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue # torn last line after a crash
+
+# rebuild the regular json output from the jsonl log, later entries win
+# kind is the corpus's: dict (dictionary, [headword, entry] records) or list (raw content, one record
+# per entry); a raw entry may itself be a two-element list, so the records never decide the kind
+def compact(jsonl_path, json_path, kind=dict):
+    if kind is dict:
+        corpus = {}
+        for headword, entry in read_records(jsonl_path):
+            corpus[headword] = entry
+    else:
+        corpus = list(read_records(jsonl_path))
+
+    tmp = json_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(corpus, fh, ensure_ascii=False, indent=4)
+    os.replace(tmp, json_path)
+    return corpus
+
+# on demand: python corpus_writer.py output/x.jsonl output/x.json [--raw]
+if __name__ == "__main__":
+    corpus = compact(sys.argv[1], sys.argv[2], list if "--raw" in sys.argv[3:] else dict)
+    print(f"Compacted {len(corpus)} entries into {sys.argv[2]}")
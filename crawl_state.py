@@ -0,0 +1,102 @@
+import json
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_page TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_url ON entries (url);
+"""
+
+# persisted frontier + visited set + per-page results, one sqlite file per crawl
+# every url the crawl has ever seen is a row; a restart requeues whatever was not done
+class CrawlState:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def add(self, url):
+        # True if the url is new to the crawl (i.e. it should be scheduled)
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO pages (url, status, updated) VALUES (?, ?, ?)",
+                (url, QUEUED, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def start(self, url):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET status = ?, attempts = attempts + 1, updated = ? WHERE url = ?",
+                (IN_PROGRESS, time.time(), url),
+            )
+
+    def finish(self, url, entries, next_page=None):
+        # page result and status change land together, a crash never leaves half a page
+        rows = [(url, json.dumps(list(e) if isinstance(e, tuple) else e, ensure_ascii=False)) for e in entries]
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self.conn.executemany("INSERT INTO entries (url, entry) VALUES (?, ?)", rows)
+                self.conn.execute(
+                    "UPDATE pages SET status = ?, next_page = ?, error = NULL, updated = ? WHERE url = ?",
+                    (DONE, next_page, time.time(), url),
+                )
+
+    def fail(self, url, error):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET status = ?, error = ?, updated = ? WHERE url = ?",
+                (FAILED, str(error), time.time(), url),
+            )
+
+    def urls(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT url FROM pages")]
+
+    def pending(self):
+        # anything not done: never started, interrupted mid-page, or given up on (bans, outages)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT url FROM pages WHERE status != ? ORDER BY updated", (DONE,)
+            )]
+
+    def entries(self):
+        # entries of finished pages, in the order they were recorded
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT entry FROM entries JOIN pages USING (url) WHERE status = ? ORDER BY entries.rowid",
+                (DONE,),
+            ).fetchall()
+        for (entry,) in rows:
+            entry = json.loads(entry)
+            yield tuple(entry) if isinstance(entry, list) else entry
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM pages GROUP BY status"))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
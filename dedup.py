@@ -0,0 +1,119 @@
+import hashlib
+import re
+from array import array
+import threading
+import unicodedata
+import zlib
+
+# streaming duplicate filter for raw content corpora, applied as sentences are merged
+#   exact: 64-bit hash of the normalized sentence (case, punctuation and spacing don't count)
+#   near: minhash signature over character shingles, banded for lsh; a sentence sharing a whole band
+#   with an earlier one is only a candidate, dropped when the shingle jaccard of the two reaches the
+#   threshold (a band alone also matches pairs well below it, 64 slots are too few to estimate it
+#   closely: verses differing in a word or two land on either side)
+# the jaccard comes from bottom-k sketches, the SKETCH smallest shingle hashes of each sentence: exact
+# while both sentences have at most SKETCH shingles (SKETCH + 4 characters, nearly every verse), an
+# estimate past that
+# per sentence the index keeps one int for the exact hash, one per band and a sketch of at most
+# 4 * SKETCH bytes, however long the sentence
+SHINGLE = 5 # characters per shingle, script independent (words would fail on unsegmented text)
+NUM_HASHES = 64 # minhash signature length
+NEAR_THRESHOLD = 0.9 # jaccard similarity (of shingle sets) treated as a duplicate
+SKETCH = 256 # shingle hashes kept per sentence to confirm a candidate
+MIN_NEAR_CHARS = 30 # shorter entries (lemmas, verse labels) are only deduplicated exactly, case and
+                    # punctuation included: "блэ-" (a prefix) and "блэ" are different lemmas
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_EMPTY = 1 << 64
+_MIX = 0x9E3779B97F4A7C15 # odd 64-bit multiplier, spreads crc32 over the whole word
+
+def normalize(sentence):
+    text = unicodedata.normalize("NFKC", sentence).casefold()
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _shingle_hash(shingle):
+    # crc32 is ~10x cheaper than blake2b and this runs once per character of every sentence
+    return (zlib.crc32(shingle.encode("utf-8")) * _MIX) & (_EMPTY - 1)
+
+def bands_for(threshold, num_hashes=NUM_HASHES):
+    # (bands, rows) whose s-curve midpoint (1/bands)^(1/rows) is closest to threshold
+    options = [(num_hashes // rows, rows) for rows in range(1, num_hashes + 1) if num_hashes % rows == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+def signature(text, num_hashes=NUM_HASHES):
+    # one permutation hashing: every shingle hashed once, the minimum kept per bin, empty bins
+    # filled from the next non-empty one (rotation densification) so short texts still get a full signature
+    bins = [_EMPTY] * num_hashes
+    for i in range(max(1, len(text) - SHINGLE + 1)):
+        value = _shingle_hash(text[i:i + SHINGLE])
+        index = (value * num_hashes) >> 64 # top bits pick the bin, the full value is compared
+        if value < bins[index]:
+            bins[index] = value
+    filled = list(bins)
+    for i in range(num_hashes):
+        distance = 1
+        while filled[i] == _EMPTY:
+            source = bins[(i + distance) % num_hashes]
+            if source != _EMPTY:
+                filled[i] = source + distance * _EMPTY # borrowed values must not equal the source bin's
+            distance += 1
+    return filled
+
+def shingles(text):
+    return {text[i:i + SHINGLE] for i in range(max(1, len(text) - SHINGLE + 1))}
+
+def sketch(text, size=SKETCH):
+    # the size smallest 32-bit shingle hashes of a normalized text, sorted
+    values = sorted({_shingle_hash(shingle) >> 32 for shingle in shingles(text)})[:size]
+    return array("I", values).tobytes()
+
+def similarity(a, b, size=SKETCH):
+    # jaccard similarity of two sketches: of the size smallest hashes of both, the share found in both
+    a, b = set(array("I", a)), set(array("I", b))
+    union = sorted(a | b)[:size]
+    return sum(1 for value in union if value in a and value in b) / len(union)
+
+class SentenceDeduplicator:
+    def __init__(self, near=True, threshold=NEAR_THRESHOLD):
+        self.near = near
+        self.threshold = threshold
+        self.bands, self.rows = bands_for(threshold)
+        self.lock = threading.Lock()
+        self.exact = set()
+        self.buckets = {} # band key -> sketches of the kept sentences in that bucket
+        self.stats = {"kept": 0, "exact": 0, "near": 0}
+
+    def _keys(self, sentence):
+        # (exact key, band keys, sketch); hashing happens outside the lock
+        text = normalize(sentence)
+        if len(text) < MIN_NEAR_CHARS:
+            return _hash64(_WHITESPACE.sub(" ", unicodedata.normalize("NFKC", sentence)).strip()), (), None
+        exact = _hash64(text)
+        if not self.near:
+            return exact, (), None
+        values = signature(text)
+        bands = [hash((band,) + tuple(values[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+        return exact, bands, sketch(text)
+
+    def add(self, sentence):
+        # True if the sentence is new (and is now indexed), False for a duplicate
+        if not isinstance(sentence, str):
+            return True
+        exact, bands, kept = self._keys(sentence)
+        with self.lock:
+            if exact in self.exact:
+                self.stats["exact"] += 1
+                return False
+            candidates = {other for key in bands for other in self.buckets.get(key, ())}
+            if any(similarity(kept, other) >= self.threshold for other in candidates):
+                self.stats["near"] += 1
+                return False
+            self.exact.add(exact)
+            for key in bands:
+                self.buckets.setdefault(key, []).append(kept) # one sketch, referenced from each bucket
+            self.stats["kept"] += 1
+            return True
@@ -0,0 +1,133 @@
+import argparse
+import json
+
+import numpy as np
+from rapidfuzz import fuzz, process # fast implementation of levenshtein distance
+
+# shared matching engine for the eval scripts: every reference entry gets its closest llm entry
+# exact matches are a hash lookup, the rest are scored in blocks with rapidfuzz's cdist on all cores
+# precision needs the reverse direction: which llm entries a reference entry matches
+BLOCK_ROWS = 256 # query rows per cdist call, bounds memory at rows x choices scores
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def best_matches(queries, choices, scorer=fuzz.ratio, workers=-1):
+    # (best choice, score) for every query; exact hits skip scoring
+    exact = set(choices)
+    results = [(query, 100.0) if query in exact else None for query in queries]
+    rest = [i for i, result in enumerate(results) if result is None]
+    if not choices:
+        return [result or (None, 0.0) for result in results]
+    for start in range(0, len(rest), BLOCK_ROWS):
+        rows = rest[start:start + BLOCK_ROWS]
+        scores = process.cdist([queries[i] for i in rows], choices, scorer=scorer, dtype=np.float32, workers=workers)
+        best = scores.argmax(axis=1)
+        for row, i in enumerate(rows):
+            results[i] = (choices[best[row]], float(scores[row, best[row]]))
+    return results
+
+def matched(queries, choices, threshold, scorer=fuzz.ratio, workers=-1):
+    # which queries reach threshold against some choice; cheaper than best_matches, scores below the cutoff are skipped
+    exact = set(choices)
+    found = [query in exact for query in queries]
+    if threshold >= 100 or not choices:
+        return found
+    rest = [i for i, hit in enumerate(found) if not hit]
+    for start in range(0, len(rest), BLOCK_ROWS):
+        rows = rest[start:start + BLOCK_ROWS]
+        scores = process.cdist([queries[i] for i in rows], choices, scorer=scorer, score_cutoff=threshold,
+                               dtype=np.float32, workers=workers)
+        for row, i in enumerate(rows):
+            found[i] = bool(scores[row].max() >= threshold)
+    return found
+
+def pair_scores(a, b, scorer=fuzz.ratio, workers=-1):
+    # scorer(a[i], b[i]) for every i, in one call
+    if not a:
+        return []
+    return process.cpdist(a, b, scorer=scorer, dtype=np.float32, workers=workers).tolist()
+
+def print_missing(label, missing):
+    print(f"missing {label}:", len(missing))
+    for bespoke, llm, score in missing:
+        print(f"bespoke: {bespoke}")
+        print(f"closest llm: {llm}")
+        print(f"similarity: {score:.2f}")
+        print("-" * 10)
+
+def print_scores(found, total, correct=None, produced=None):
+    # found of total reference entries were matched; correct of produced llm entries match the reference
+    # keep in mind some mismatches will be trivial, due to punctuation differences, etc.
+    # manually inspect the missing entries and determine if they are truly missing
+    recall = found / total if total else 0.0
+    print(f"accuracy (before manually filtering out false positives): {100 * recall:.2f}%")
+    print(f"recall: {100 * recall:.2f}%")
+    if correct is None:
+        print("precision, f1: n/a (the reference covers only part of the crawl)")
+        return
+    precision = correct / produced if produced else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    print(f"precision: {100 * precision:.2f}%")
+    print(f"f1: {100 * f1:.2f}%")
+
+def arguments(threshold):
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--threshold", type=float, default=threshold, help="Similarity that counts as a match, 100 = exact")
+    argparser.add_argument("--workers", type=int, default=-1, help="Cores for scoring, -1 = all")
+    argparser.add_argument("--quiet", action="store_true", help="Only print the scores")
+    return argparser.parse_args()
+
+def evaluate_lists(name, llm, reference, threshold=100, partial=False):
+    # list corpora (sentences, lemmas): each reference entry against every llm entry
+    args = arguments(threshold)
+    print(f"bespoke {name} length:", len(reference), "\n")
+
+    best = best_matches(reference, llm, workers=args.workers)
+    missing = [(entry, match, score) for entry, (match, score) in zip(reference, best) if score < args.threshold]
+    if not args.quiet:
+        print_missing("entries", missing)
+    else:
+        print("missing entries:", len(missing))
+
+    correct = None if partial else sum(matched(llm, reference, args.threshold, workers=args.workers))
+    print_scores(len(reference) - len(missing), len(reference), correct, len(llm))
+
+def evaluate_dictionary(name, llm, reference, threshold=100, partial=False):
+    # dictionary corpora: headwords are matched like list entries, the translations of shared headwords
+    # are compared as a whole
+    args = arguments(threshold)
+    print(f"llm {name} length:", len(llm))
+    print(f"bespoke {name} length:", len(reference))
+
+    llm_keys, reference_keys = list(llm), list(reference)
+    absent = [key for key in reference_keys if key not in llm]
+    best = best_matches(absent, llm_keys, workers=args.workers)
+    missing_words = [(key, match, score) for key, (match, score) in zip(absent, best) if score < args.threshold]
+
+    shared = [key for key in reference_keys if key in llm]
+    scores = pair_scores([str(reference[key]["translations"]) for key in shared],
+                         [str(llm[key]["translations"]) for key in shared], workers=args.workers)
+    missing_translations = [(key, llm[key]["translations"], reference[key]["translations"], score)
+                            for key, score in zip(shared, scores) if score < args.threshold]
+
+    if args.quiet:
+        print("missing entries:", len(missing_words))
+        print("missing translations:", len(missing_translations))
+    else:
+        print_missing("entries", missing_words)
+        print("missing translations:", len(missing_translations))
+        for key, llm_translations, bespoke_translations, score in missing_translations:
+            print(f"bespoke: {key}")
+            print(f"closest llm: {llm_translations}")
+            print(f"bespoke: {bespoke_translations}")
+            print(f"similarity: {score:.2f}")
+            print("-" * 10)
+
+    correct = None if partial else sum(matched(llm_keys, reference_keys, args.threshold, workers=args.workers))
+    print_scores(len(reference) - len(missing_words), len(reference), correct, len(llm))
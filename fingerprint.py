@@ -0,0 +1,118 @@
+import hashlib
+import re
+import threading
+import zlib
+
+from dedup import normalize
+
+# content fingerprints of fetched pages, so mirrors, session-parameter variants, print views and
+# redirects to the same content are extracted once: an exact hash of the page's reduced text plus a
+# 64-bit simhash for pages that differ only in a counter, a timestamp or a stray word
+# the simhash index is split into SIMHASH_DISTANCE + 1 bands: two hashes within that many bits of
+# each other agree on at least one band, so a lookup only compares against pages sharing a band
+# the simhash covers the site template too, so small pages of one template land within a few bits of
+# each other: a near match is only a candidate until the word shingles of both texts agree
+SIMHASH_DISTANCE = 3 # differing bits that make a page a candidate
+CONFIRM_JACCARD = 0.98 # word shingle jaccard a candidate needs to count as the same page
+SHINGLE_WORDS = 3
+MIN_WORDS = 20 # pages with less text than this are only matched exactly
+
+_TAG = re.compile(r"<[^>]*>")
+_BANDS = SIMHASH_DISTANCE + 1
+_BAND_BITS = 64 // _BANDS
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def page_text(html):
+    # what the page says: markup, attributes and urls (session ids, print flags) don't count
+    return normalize(_TAG.sub(" ", html))
+
+def simhash(words):
+    hashes = [_hash64(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))]
+    # a bit is set when it is set in more than half of the shingle hashes
+    columns = zip(*(format(h, "064b") for h in hashes))
+    value = 0
+    for column in columns:
+        value = (value << 1) | (column.count("1") * 2 > len(hashes))
+    return value
+
+def shingles(words):
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+
+def similarity(words, other):
+    a, b = shingles(words), shingles(other)
+    return len(a & b) / len(a | b)
+
+def _bands(value):
+    return [(band, (value >> (band * _BAND_BITS)) & ((1 << _BAND_BITS) - 1)) for band in range(_BANDS)]
+
+class PageFingerprints:
+    def __init__(self, distance=SIMHASH_DISTANCE):
+        self.distance = distance
+        self.lock = threading.Lock()
+        self.exact = {} # content hash -> url that claimed it
+        self.bands = {} # (band, bits) -> [(simhash, url)]
+        self.claims = {} # url -> (content hash, simhash or None)
+        self.texts = {} # url -> its page text, compressed, to confirm near matches against
+        self.next_pages = {} # url -> next_page its extraction found, once finished
+        self.parked = {} # url still being extracted -> urls with its content waiting for the outcome
+        self.stats = {"exact": 0, "near": 0}
+
+    def claim(self, url, html):
+        # the url that already has this content, or None after recording url as its owner
+        words = page_text(html).split()
+        exact = _hash64(" ".join(words))
+        value = simhash(words) if len(words) >= MIN_WORDS else None
+        with self.lock:
+            owner = self.exact.get(exact)
+            if owner is not None and owner != url:
+                self.stats["exact"] += 1
+                return owner
+            if value is not None:
+                for band in _bands(value):
+                    for other, other_url in self.bands.get(band, ()):
+                        if (other_url != url and bin(value ^ other).count("1") <= self.distance
+                                and similarity(words, self._words(other_url)) >= CONFIRM_JACCARD):
+                            self.stats["near"] += 1
+                            return other_url
+            self.exact[exact] = url
+            if value is not None:
+                for band in _bands(value):
+                    self.bands.setdefault(band, []).append((value, url))
+                self.texts[url] = zlib.compress(" ".join(words).encode("utf-8"))
+            self.claims[url] = (exact, value)
+        return None
+
+    def _words(self, url):
+        return zlib.decompress(self.texts[url]).decode("utf-8").split()
+
+    def park(self, url, owner):
+        # url has owner's content: ("finished", owner's next_page) once owner is done, ("parked", None)
+        # while it is in flight, settled by its finish() or release(), ("released", None) if it failed
+        with self.lock:
+            if owner in self.next_pages:
+                return "finished", self.next_pages[owner]
+            if owner not in self.claims:
+                return "released", None
+            self.parked.setdefault(owner, []).append(url)
+            return "parked", None
+
+    def finish(self, url, next_page):
+        # returns the urls parked on url, done along with it
+        with self.lock:
+            self.next_pages[url] = next_page
+            return self.parked.pop(url, [])
+
+    def release(self, url):
+        # the page failed: its content is free for the next url that serves it
+        # returns the urls parked on url, they have to be extracted after all
+        with self.lock:
+            exact, value = self.claims.pop(url, (None, None))
+            self.texts.pop(url, None)
+            if self.exact.get(exact) == url:
+                del self.exact[exact]
+            if value is not None:
+                for band in _bands(value):
+                    self.bands[band] = [item for item in self.bands.get(band, ()) if item[1] != url]
+            return self.parked.pop(url, [])
@@ -1,30 +1,129 @@
-from openai import OpenAI
+from rate_limit import LLMRateLimiter
+from stream_json import scan_response
 import json
-import re
+import math
+import threading
 
 OPENROUTER_API_KEY = ""
-MODEL = "meta-llama/llama-4-maverick" # can use oss, or write implementation for local inference
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_CONCURRENCY = 64 # requests in flight, the rate limiter below is the real ceiling
+MODEL = "meta-llama/llama-4-maverick" # can use oss, or switch LLM_BACKEND to a local server
 MAX_TRY_COUNT = 5
+TEMPERATURE = 0.1
+PROMPT_VERSION = 2 # bump whenever the prompt templates change, invalidates cached completions
+CHARS_PER_TOKEN = 3.5 # rough average for html/multilingual text, good enough for budgeting
+LLM_RPM = 60 # account limits for MODEL, every llm call draws from one shared budget
+LLM_TPM = 200000
+OUTPUT_TOKEN_RATIO = 0.5 # expected completion size relative to the prompt, settled against real usage
+RATE_LIMIT_RETRIES = 5 # 429s waited out inside the call before giving up to the page retry loop
+PROMPT_PRICE = 0.15 # usd per million prompt tokens of MODEL (openrouter's model page), for cost reports
+COMPLETION_PRICE = 0.60 # usd per million completion tokens
 
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key=OPENROUTER_API_KEY,
-)
+# backend, see backends.py (main.py --backend/--base-url/--model override these)
+LLM_BACKEND = "openrouter" # openrouter | local | fake
+LOCAL_BASE_URL = "http://localhost:8080/v1" # llama.cpp server / vllm serve
+LOCAL_MODEL = "local"
+LOCAL_CONCURRENCY = 4 # server slots (llama.cpp --parallel), or batches in flight when batching
+LOCAL_BATCH_SIZE = 1 # > 1 groups pages into one /v1/completions call
+LOCAL_BATCH_WINDOW = 0.05 # seconds a batch waits for more pages once a slot is free
+LOCAL_PROMPT_TEMPLATE = "{content}" # the model's chat template, batched completions don't apply one
+LOCAL_MAX_TOKENS = 8192 # completion cap of a batched page; /v1/completions stops at 16 tokens without one
 
+# cheap token estimate, no tokenizer dependency (exact counts come back in usage)
+def estimate_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+limiter = LLMRateLimiter(LLM_RPM, LLM_TPM)
+
+# prompt + expected completion, reserved before sending
+def estimate_request_tokens(content):
+    prompt_tokens = estimate_tokens(content)
+    return prompt_tokens + math.ceil(prompt_tokens * OUTPUT_TOKEN_RATIO)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            from backends import create_backend # backends imports this module
+            _backend = create_backend(LLM_BACKEND)
+        return _backend
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+# streamed chat completion, yields text deltas as they arrive
+# usage, if given, is filled with the real token counts when the backend reports them
+def stream_completion(content, temperature=TEMPERATURE, usage=None):
+    return get_backend().stream(content, temperature, usage)
+
+async def astream_completion(content, temperature=TEMPERATURE, usage=None):
+    async for delta in get_backend().astream(content, temperature, usage):
+        yield delta
+
+# whole completion as one string, for calls nothing is streamed out of
+def complete(content, temperature=TEMPERATURE):
+    return "".join(stream_completion(content, temperature))
+
+# appended after the html when a page was split, so the model doesn't expect a full page
+def get_chunk_note(index, total):
+    return f"""\n\n--------\n\nNote: the HTML above is part {index} of {total} of a single page that was too large to send at once. Extract ALL entries contained in this part only. For the next_page tag, use any pagination links visible in this part, or null if there are none."""
+
+# appended after the pages of a packed request, see packing.py
+def get_pack_note(count):
+    return f"""\n\n--------\n\nNote: the HTML above is {count} separate pages of the same site, each wrapped in a <page id="n" url="..."></page> tag. Apply the instructions above to every page on its own. Write any chain_of_thought and site_summary only once, before the first page. Then, for every page in order, respond with a <page id="n"></page> tag (same id) that contains that page's next_page and json tags, exactly as described for a single page."""
+
+# appended to the page's prompt when its response was cut off mid-corpus (max tokens, dropped connection)
+def get_continuation_note(last_entry):
+    last = last_entry[0] if isinstance(last_entry, tuple) else last_entry
+    return f"""\n\n--------\n\nNote: a previous response for this page was cut off. All entries up to and including {json.dumps(last, ensure_ascii=False)} were already extracted. Extract ONLY the entries that come after it on the page, in the same JSON format, and keep any chain_of_thought to a sentence or two."""
+
+# the extract helpers take a complete response; streamed responses go through stream_json.ResponseScanner
 # we tell the model to include a chain_of_thought for step-by-step reasoning, print it for debugging
 def extract_chain_of_thought_from_response(response):
-    match = re.search(r"<chain_of_thought>(.*?)</chain_of_thought>", response, re.DOTALL)
-    return match.group(1) if match else None
+    return scan_response(response).get("chain_of_thought")
+
+# text of a closed <next_page> section -> url to crawl, or None
+def next_page_from_section(text):
+    next_page = text.strip() if text else None
+    # the prompt asks for null on the last page, don't crawl that as a url
+    return next_page if next_page and next_page.lower() not in ("null", "none") else None
 
 # we tell the model to include a next_page for pagination
 def extract_next_page_from_response(response):
-    match = re.search(r'<next_page>(.*?)</next_page>', response, re.DOTALL)
-    return match.group(1) if match else None
+    return next_page_from_section(scan_response(response).get("next_page"))
+
+# full prompts also ask for a short site_summary, later pages of the site get it instead of reasoning again
+def extract_site_summary_from_response(response):
+    summary = scan_response(response).get("site_summary")
+    return summary.strip() if summary is not None else None
 
 # we tell the model to wrap the response in a <json></json> tag so we can extract it in case it produces extra text
 def extract_json_from_response(response):
-    match = re.search(r'<json>(.*?)</json>', response, re.DOTALL)
-    return match.group(1) if match else None
+    return scan_response(response).get("json")
+
+# the model's extraction selectors, see rules.py
+def extract_rules_from_response(response):
+    rules = scan_response(response).get("rules")
+    if rules is None:
+        return None
+    try:
+        return json.loads(rules)
+    except ValueError:
+        return None
+
+# dictionary prompt when target languages are given, raw content prompt otherwise
+# with a site summary from earlier pages the short prompt is used, it skips the chain of thought
+def build_prompt(source_language, target_languages, site_summary=None):
+    if site_summary:
+        return get_fast_prompt(source_language, target_languages, site_summary)
+    if target_languages:
+        return get_system_prompt_dictionary(source_language, target_languages)
+    return get_system_prompt_raw_content(source_language)
 
 # for dictionary pages
 def get_system_prompt_dictionary(language_to_translate, target_languages):
@@ -65,10 +164,12 @@ Response instructions:
 - Always include mappings for ALL indicated target languages, even if the word is not present in the dictionary (null)
 - You are required to begin your response with a chain_of_thought tag, within which you will outline your thought process for determining the structure of the HTML and how you will go about parsing it. You will also detail in depth, thinking step-by-step through the structure and layout of the page/site, whether there is a logical next page to visit or not, and, if so, what the URL is. To do this, you are first REQUIRED to ENTIRELY verbalize and map out the HOLISTIC pagination structure of the entire website. Keep in mind that some websites have peculiar structures or multiple pagination hierarchies, and you should be lay out ALL of this. To ensure correctness, you are REQUIRED to list ALL of the possibilities you considered and why you chose the one you did. Be very careful when setting the next page to null, as the greater objective is to scrape the whole dictionary, A-Z, not just the current letter or word or page -- you are just working on a slice. Think logically.
 - The next_page tag should be the full URL, not just the relative path, or null if you've determined there to be none.
+- After the chain_of_thought, include a site_summary tag: a compact description (at most 150 words) of where the entries sit in the page template and of the site's complete pagination hierarchy and URL scheme, written for someone who will only see later pages of the same site and must extract them and choose their next page.
 - Your final JSON object MUST be wrapped in a <json></json> tag, and the whole response should be strictly structured like:
 ```
 <response>
     <chain_of_thought>...</chain_of_thought>
+    <site_summary>...</site_summary>
     <next_page>...</next_page>
     <json>[json object here]</json>
 </response>
@@ -107,10 +208,12 @@ Constraints:
 Response instructions:
 - You are required to begin your response with a chain_of_thought tag, within which you will outline your thought process for determining the structure of the HTML and how you will go about parsing it. You will also detail in depth, thinking step-by-step through the structure and layout of the page/site, whether there is a logical next page to visit or not, and, if so, what the URL is. To do this, you are first REQUIRED to ENTIRELY verbalize and map out the HOLISTIC pagination structure of the entire website. Keep in mind that some websites have peculiar structures or multiple pagination hierarchies, and you should be lay out ALL of this. To ensure correctness, you are REQUIRED to list ALL of the possibilities you considered and why you chose the one you did. Be very careful when setting the next page to null, as the greater objective is to scrape the whole dictionary, A-Z, not just the current letter or word or page -- you are just working on a slice. Think logically.
 - The next_page tag should be the full URL, not just the relative path, or null if you've determined there to be none.
+- After the chain_of_thought, include a site_summary tag: a compact description (at most 150 words) of where the entries sit in the page template and of the site's complete pagination hierarchy and URL scheme, written for someone who will only see later pages of the same site and must extract them and choose their next page.
 - Your final JSON object MUST be wrapped in a <json></json> tag, and the whole response should be strictly structured like:
 ```
 <response>
     <chain_of_thought>...</chain_of_thought>
+    <site_summary>...</site_summary>
     <next_page>...</next_page>
     <json>[json object here]</json>
 </response>
@@ -121,4 +224,83 @@ IMPORTANT:
 - You will potentially be dealing with an unfamiliar writing system, language, or character set. You must be able to handle and parse any and all characters that are present in the HTML, with HIGH FIDELITY (no loss of information, no corruption, no modification).
 \n\n--------\n\n"""
     
-    return prompt
\ No newline at end of file
+    return prompt
+# for pages of a site the model already described (fast mode): no chain of thought, just the answer
+def get_fast_prompt(language, target_languages, site_summary):
+    if target_languages:
+        target = f'a dictionary of the language "{language}", with target languages "{target_languages}"'
+        schema = f"""{{"corpus": {{"word_in_language": {{"translations": {{"target_language_1": "...", "target_language_n": "..."}}, "example_sentences": [{{"{language}": "...", "target_language_1": "...", "target_language_n": "..."}}, ...]}}, ...}}}}"""
+        rules = "Include ALL words on the page and mappings for ALL target languages (null when missing), with every example sentence that contains the word."
+    else:
+        target = f'contents in the language "{language}"'
+        schema = """{"corpus": ["sentence1", "sentence2", ...]}"""
+        rules = "Include ALL sentences on the page."
+
+    prompt = f"""You will be provided with the HTML contents of a web page containing {target}. You have already studied this site; this is your summary of it:
+
+{site_summary}
+
+Extract the page into a JSON object of the form:
+```
+{schema}
+```
+{rules} Preserve every character exactly as written.
+
+Do NOT explain your reasoning. Respond with exactly:
+```
+<response>
+    <next_page>full URL of the next page according to the site's pagination hierarchy, or null</next_page>
+    <json>[json object here]</json>
+</response>
+```
+\n\n--------\n\n"""
+
+    return prompt
+
+# asks once per page template for selectors that reproduce the extraction locally (rules.py)
+def get_rule_induction_prompt(language, target_languages, sample_entries):
+    if target_languages:
+        schema = f"""{{
+    "entry": "selector matching each dictionary entry (one element per word)",
+    "word": "selector, relative to the entry, for the word in {language}",
+    "translations": {{
+        "target_language_1": "selector, relative to the entry, for the definition in target_language_1",
+        "target_language_n": "..."
+    }},
+    "example": {{
+        "container": "selector, relative to the entry, matching each example sentence block (or null)",
+        "fields": {{"{language}": "selector relative to the block", "target_language_1": "...", "target_language_n": "..."}}
+    }},
+    "next_page": "selector for the link to the next page, e.g. a.next@href (or null)"
+}}"""
+        target = f'a dictionary of the language "{language}", with target languages "{target_languages}"'
+    else:
+        schema = f"""{{
+    "sentence": "selector matching every element whose text is a sentence in {language}",
+    "next_page": "selector for the link to the next page, e.g. a.next@href (or null)"
+}}"""
+        target = f'contents in the language "{language}"'
+
+    prompt = f"""You will be provided with the HTML contents of a web page containing {target}, followed by entries that were already extracted from it.
+
+Many more pages of this site share the same template. Instead of extracting the page again, write CSS selectors that reproduce the extraction with a simple program, so the remaining pages can be processed without you.
+
+Selectors support: tag names, *, .class, #id, [attr], [attr=value], [attr*=value], :nth-child(n), :nth-of-type(n), :first-child, :last-child, descendant (space) and child (>) combinators, and comma-separated alternatives. Append @attr to take an attribute instead of the text (e.g. a@href). An empty string selects the entry element itself. Text is whitespace-collapsed.
+
+The rules should have the following structure:
+```
+{schema}
+```
+
+Already extracted from this page (use them to check your selectors):
+```
+{json.dumps(sample_entries, ensure_ascii=False, indent=2)}
+```
+
+Response instructions:
+- Use only classes, ids and tags that appear in the HTML below, they are all that is left after preprocessing.
+- Prefer selectors that describe the template (classes, structure) over ones tied to this page's content.
+- Your response must contain the rules as a JSON object wrapped in a <rules></rules> tag, and nothing else is required.
+\n\n--------\n\n"""
+
+    return prompt
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path("cache") / "completions"
+CACHE_MAX_BYTES = 1024 * 1024 * 1024 # 1 GiB of raw responses
+EVICT_TO = 0.9 # evict down to this fraction of the budget, not just under it
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# on-disk, content-addressed store of raw llm responses
+# one file per completion, least recently used files are evicted first (mtime = last use)
+class CompletionCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sizes = None # path -> bytes, built lazily on first write
+        self.total = 0
+
+    def key(self, model, prompt_version, temperature, content):
+        # content is prompt + reduced html, so the html hash is part of it
+        material = json.dumps([model, prompt_version, temperature, content_hash(content)])
+        return content_hash(material)
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.txt"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                text = fh.read()
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return text
+
+    def contains(self, key):
+        # no hit/miss accounting, for callers deciding how to extract a page
+        return self._path(key).exists()
+
+    def put(self, key, text):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        os.replace(tmp, path) # atomic, readers never see a partial response
+
+        with self.lock:
+            if self.sizes is None:
+                self.sizes = self._scan()
+                self.total = sum(self.sizes.values())
+            self.total -= self.sizes.get(path, 0)
+            self.sizes[path] = path.stat().st_size
+            self.total += self.sizes[path]
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        sizes = {}
+        if self.directory.exists():
+            for path in self.directory.glob("*/*.txt"):
+                sizes[path] = path.stat().st_size
+        return sizes
+
+    def _evict(self):
+        # oldest mtime first
+        by_age = sorted(self.sizes, key=lambda p: p.stat().st_mtime if p.exists() else 0)
+        for path in by_age:
+            if self.total <= self.max_bytes * EVICT_TO:
+                break
+            self.total -= self.sizes.pop(path)
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
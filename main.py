@@ -1,190 +1,541 @@
 from pathlib import Path
 
+import argparse
 import json
+import os
+import sys
 import re
 import time
 import threading
 from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from scrape import scrape_url, normalize_url
-from inference import (
-    client,
-    MODEL,
-    get_system_prompt_dictionary,
-    get_system_prompt_raw_content,
-    extract_json_from_response,
-    extract_chain_of_thought_from_response,
-    extract_next_page_from_response,
-)
+from scrape import fetch, reduce_page, normalize_url, probe_page, get_fetch_stats, scheduler, REDUCTION_STATS
+from corpus import CorpusStore, combine_chunks
+from corpus_writer import CorpusWriter, compact
+from crawl_state import CrawlState
+from pagination import PaginationInference
+from rules import Rulebook, RULES_PATH
+from site_summary import SiteSummaries, SITES_PATH, site_scope
+from telemetry import Telemetry, serve_metrics
+from dedup import SentenceDeduplicator, NEAR_THRESHOLD
+from packing import PagePacker
+from fingerprint import PageFingerprints
+from backends import create_backend, BACKENDS
+from pipeline import PagePipeline
+from llm_cache import CompletionCache, CACHE_DIR, CACHE_MAX_BYTES
+from inference import LLM_BACKEND, set_backend, complete, stream_completion
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
+try:
+    import yaml
+except ImportError: # only yaml job files need it, json ones work without
+    yaml = None
+
 # config
 OUTPUT_DIR = Path("output")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 MAX_WORKERS = 20
+MAX_JOBS = 8 # crawls of a --jobs file running at once, their pages share the MAX_WORKERS pool
 MAX_LLM_ATTEMPTS = 3
-
-# globals, locks
-DICT_LOCK = threading.Lock()  # protect master dict
-VISIT_LOCK = threading.Lock()  # protect visited_urls, enqueue
-FILE_LOCK = threading.Lock()  # protect disk file writes
-
-visited_urls = set()
-dictionary = None
-
+MAX_CONTINUATIONS = 2 # follow-up requests for a response cut off mid-corpus (max tokens, dropped connection)
+REDUCE_HTML = True # strip scripts/styles/attributes before prompting, see reduce.py
+CHUNKED_EXTRACTION = True # split oversized pages and extract the chunks in parallel
+CHUNK_MAX_TOKENS = 12000 # html budget per chunk, leaves room for the prompt and the output
+CHUNK_WORKERS = 20
+CACHE_READ = True # replay cached completions (--no-cache/--refresh turn this off)
+CACHE_WRITE = True # store completions that parsed (--no-cache turns this off)
+PAGINATION_INFERENCE = True # learn the next_page url pattern and crawl predicted pages ahead, see pagination.py
+RULE_INDUCTION = True # learn css selectors per page template and replay them instead of the llm, see rules.py
+FAST_PROMPTS = True # after a site's first pages, prompt with its summary instead of full reasoning, see site_summary.py
+PAGE_DEDUP = True # skip extraction of pages whose content was already seen under another url, see fingerprint.py
+PAGE_PACKING = False # small pages in flight together share one llm request (--pack), see packing.py
+DEDUP_RAW = True # drop repeated sentences in raw content mode as they are merged, see dedup.py
+NEAR_DUPLICATES = True # also drop near duplicates (minhash/lsh), not only normalized exact repeats
+NEAR_DUP_THRESHOLD = NEAR_THRESHOLD # shingle jaccard similarity that counts as a near duplicate
+
+# shared by every crawl in the process: the page and chunk pools (the worker budget), the completion
+# cache, site summaries, extraction rules and the packer. the http session, the politeness scheduler
+# (scrape.py) and the llm backend's rate limiter (inference.py) are process-wide as well
 executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
-futures = set()  # live futures pool
-futures_lock = threading.Lock()  # guards futures set
+chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS)  # separate pool, page workers block on it
+
+completion_cache = CompletionCache(CACHE_DIR, CACHE_MAX_BYTES)
+rulebook = Rulebook(RULES_PATH)
+sites = SiteSummaries(SITES_PATH)
+packer = PagePacker(complete, on_response=lambda urls, mode, response, scope: learn_from_pack(urls, mode, response, scope))
 
 # helpers
-def save_json(data, path):
-    with open(path, "w", encoding="utf-8") as fh:
-        json.dump(data, fh, ensure_ascii=False, indent=4)
-
-def save_json_threadsafe(snapshot, path):
-    with FILE_LOCK:
-        save_json(snapshot, path)
-
-def track(fut):
-    # remove finished future from pool
-    with futures_lock:
-        futures.discard(fut)
-
-def enqueue_new(url, source_language, target_languages, out_path):
-    url = normalize_url(url)
-    if not url:
-        return False
+def learn_from_pack(urls, mode, response, scope):
+    # a full-prompt pack is one response, it counts as one full page towards the scope's summary however
+    # many pages it carried
+    if mode == "full" and scope and urls:
+        sites.learn(scope, response)
+
+# one crawl: its frontier, visited set, corpus, output log, crawl state, page fingerprints, pagination
+# patterns and telemetry. several crawls run in one process (--jobs) and share the module level pools
+class Crawler(PagePipeline):
+    def __init__(self, start_url, source_language, target_languages=None, out_path=None, zstd=False,
+                 dedup=True, dedup_threshold=NEAR_DUP_THRESHOLD, name=None):
+        self.start_url = start_url
+        self.source_language = source_language
+        self.target_languages = target_languages or None
+        if out_path is None:
+            stem = f"corpus_{source_language}" if self.target_languages is None else f"{source_language}_to_{target_languages}"
+            out_path = OUTPUT_DIR / f"{stem}.json"
+        self.out_path = str(out_path)
+        base = self.out_path[:-len(".json")] if self.out_path.endswith(".json") else self.out_path
+        self.name = name or os.path.basename(base)
+        # entries stream into the jsonl log; it is compacted into out_path at the end
+        self.jsonl_path = base + ".jsonl" + (".zst" if zstd else "")
+        self.zstd = zstd
+        # same output name -> same state file, so a restart continues where it stopped
+        self.state_path = base + ".state.sqlite"
+        self.trace_path = base + ".trace.jsonl"
+
+        if self.target_languages is None:
+            dictionary = CorpusStore(list) # raw content (list of sentences)
+        else:
+            dictionary = CorpusStore(dict) # dictionary entries by headword
+        self.dedup_threshold = dedup_threshold
+        deduplicator = None # SentenceDeduplicator in raw content mode, None keeps every sentence
+        if self.target_languages is None and DEDUP_RAW and dedup:
+            deduplicator = SentenceDeduplicator(NEAR_DUPLICATES and dedup_threshold < 1, dedup_threshold)
+        scope = site_scope(start_url, source_language, self.target_languages) # site summaries, boilerplate
+        pagination = None # per crawl: two crawls of a site both need its pages
+        if PAGINATION_INFERENCE:
+            pagination = PaginationInference(lambda url, reference: probe_page(url, reference, scope))
+        # writer (append-only jsonl output, fed by every worker) and state (persisted frontier/visited
+        # set/page results, lets a crawl resume) are opened by open()
+        super().__init__(
+            source_language, self.target_languages, dictionary, None, None, completion_cache,
+            cache_read=CACHE_READ, cache_write=CACHE_WRITE, reduce=REDUCE_HTML,
+            chunked=CHUNKED_EXTRACTION, chunk_max_tokens=CHUNK_MAX_TOKENS, max_attempts=MAX_LLM_ATTEMPTS,
+            max_continuations=MAX_CONTINUATIONS, pagination=pagination,
+            rulebook=rulebook if RULE_INDUCTION else None,
+            sites=sites, fast_prompts=FAST_PROMPTS, telemetry=Telemetry(label=self.name), deduplicator=deduplicator,
+            packer=packer if PAGE_PACKING else None,
+            fingerprints=PageFingerprints() if PAGE_DEDUP else None,
+            scope=scope,
+        )
+        self.pending = []
+
+        self.visit_lock = threading.Lock() # protect visited_urls, enqueue
+        self.visited_urls = set()
+        self.futures = set() # this crawl's live futures in the shared pool
+        self.futures_lock = threading.Lock()
+
+    def open(self, fresh=False, metrics_port=None):
+        os.makedirs(os.path.dirname(self.out_path) or ".", exist_ok=True)
+        if fresh:
+            for path in (self.state_path, self.state_path + "-wal", self.state_path + "-shm", self.trace_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.writer = CorpusWriter(self.jsonl_path, compress=self.zstd)
+        self.state = CrawlState(self.state_path)
+        self.pending = self.resume()
+        # one jsonl line per page (stage timings, tokens, retries), appended across resumed runs
+        self.telemetry.start(self.trace_path, metrics_port=metrics_port)
+        kind = "raw content scrape" if self.target_languages is None else "dictionary crawl"
+        print(f"Starting {kind} {self.name}, writing to {self.out_path}")
+
+    def close(self):
+        # compact the log into out_path, print this crawl's numbers
+        # as one print: the reports of crawls finishing together (--jobs) must not interleave
+        self.writer.close()
+        self.telemetry.close()
+        compact(self.jsonl_path, self.out_path, kind=self.dictionary.kind)
+        lines = [
+            f"\nCrawl {self.name} ({self.start_url}):",
+            f"Compacted {self.writer.written} logged entries from {self.jsonl_path} into {self.out_path}",
+            f"Pages: {self.state.counts()}",
+            f"Total entries collected: {len(self.dictionary)}",
+        ]
+        self.state.close()
+        if self.deduplicator is not None:
+            stats = self.deduplicator.stats
+            lines.append(f"Duplicate sentences dropped: {stats['exact']} exact, {stats['near']} near "
+                         f"(threshold {self.dedup_threshold:g})")
+        if self.fingerprints and (self.fingerprints.stats["exact"] or self.fingerprints.stats["near"]):
+            stats = self.fingerprints.stats
+            lines.append(f"LLM calls avoided by page dedup: {stats['exact'] + stats['near']} "
+                         f"({stats['exact']} identical, {stats['near']} near-identical pages)")
+        lines.extend(self.telemetry.report())
+        lines.append(f"Per-page trace: {self.trace_path}")
+        print("\n".join(lines))
+
+    def run(self, engine="threads"):
+        if engine == "async":
+            import asyncio
+            asyncio.run(self.async_crawler().run(self.start_url, self.pending))
+        else:
+            self.run_threads()
+
+    def track(self, fut):
+        # remove finished future from pool
+        with self.futures_lock:
+            self.futures.discard(fut)
 
-    with VISIT_LOCK:
-        if url in visited_urls:
+    def enqueue(self, url):
+        url = normalize_url(url)
+        if not url:
             return False
-        visited_urls.add(url)
-
-    # schedule page
-    future = executor.submit(process_page, url, source_language, target_languages, out_path)
-    future.add_done_callback(track)
-    with futures_lock:
-        futures.add(future)
-    return True
-
-# worker
-def process_page(url, source_language, target_languages, out_path):
-    # scrape single URL, stream LLM, cascade <next_page>, retry on failures
-    for attempt in range(1, MAX_LLM_ATTEMPTS + 1):
-        try:
-            print(f"Scraping {url} (attempt {attempt}/{MAX_LLM_ATTEMPTS})")
-            # download raw HTML
-            html = scrape_url(url)
-
-            # determine which prompt to use
-            if target_languages:
-                system_prompt_content = get_system_prompt_dictionary(source_language, target_languages)
-            else:
-                system_prompt_content = get_system_prompt_raw_content(source_language)
-
-            # streaming llm call
-            completion = client.chat.completions.create(
-                model=MODEL,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": system_prompt_content
-                        + html
-                        + "\n\nBegin. ",
-                    }
-                ],
-                temperature=0.1,
-                stream=True,
+
+        with self.visit_lock:
+            if url in self.visited_urls:
+                return False
+            self.visited_urls.add(url)
+        self.state.add(url)
+
+        self.submit_page(url)
+        return True
+
+    def requeue(self, url):
+        self.submit_page(url)
+
+    def submit_page(self, url):
+        # schedule page
+        future = executor.submit(self.process_page, url)
+        future.add_done_callback(self.track)
+        with self.futures_lock:
+            self.futures.add(future)
+
+    # worker
+    def process_page(self, url):
+        # scrape single URL, stream LLM, cascade <next_page>, retry on failures
+        page = self.page(url)
+        self.state.start(url)
+        for attempt in range(1, MAX_LLM_ATTEMPTS + 1):
+            stage = "fetch"
+            page.attempt(attempt)
+            try:
+                if page.html is None:
+                    with page.trace.stage("fetch"):
+                        raw, final_url = fetch(url)
+                    with page.trace.stage("reduce"):
+                        page.fetched(reduce_page(url, raw, final_url, self.reduce, self.scope))
+                stage = "llm"
+                if page.skip_duplicate():
+                    break
+                replayed = page.match_rules()
+                if replayed is not None:
+                    page.use_rules(replayed)
+                    break
+
+                mode, prompt, chunks = page.prompt(attempt)
+                if len(chunks) > 1:
+                    _, next_page = self.extract_chunked(url, prompt, chunks, page.on_next_page, page.on_entry, mode, page.trace)
+                    page.chunked(next_page)
+                elif not self.extract_packed(url, prompt, page.html, mode, attempt, page.on_next_page, page.on_entry, page.trace):
+                    self.extract_page(url, page.content(prompt), page.on_next_page, page.on_entry, mode, True, page.trace)
+                if page.should_induce():
+                    page.induce(complete)
+                break  # success -> exit retry-loop
+
+            except Exception as exception:
+                delay = page.failed(exception, attempt, stage)
+                if delay is None:
+                    break
+                time.sleep(delay)
+
+        if page.finish(page.record()):
+            for predicted_url in page.observe():
+                self.enqueue(predicted_url)
+        page.done()
+
+    def extract_page(self, url, content, on_next_page=None, on_entry=None, mode="full", learn_site=True, trace=None):
+        # streaming llm call (or cached replay), corpus entries go to on_entry as they close
+        # returns (entries, next_page)
+        extraction = self.extraction(url, content, on_next_page, on_entry, mode, learn_site, trace)
+        while extraction.content is not None:
+            extraction.lookup()
+            usage = {} # real token counts, if the backend reports them before we stop reading
+            stream = [extraction.cached] if extraction.cached is not None else stream_completion(extraction.content, usage=usage)
+            try:
+                for chunk in stream:
+                    if extraction.feed(chunk):
+                        break
+            except Exception as exception:
+                extraction.broke(exception)
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close() # ends the http response when we stopped early
+                extraction.record(usage)
+            extraction.closed()
+        return extraction.result()
+
+    def extract_chunk(self, url, prompt, chunk, index, total, on_next_page, on_entry, mode="full", trace=None):
+        # chunks retry on their own, a failed chunk costs only itself
+        for attempt in range(1, MAX_LLM_ATTEMPTS + 1):
+            try:
+                # the last chunk saw the pagination, its summary is the one worth keeping
+                return self.extract_page(
+                    f"{url} [chunk {index}/{total}]", self.chunk_content(prompt, chunk, index, total),
+                    on_next_page, on_entry, mode, index == total, trace,
+                )
+            except Exception as exception:
+                delay = self.chunk_failed(url, index, total, exception, attempt, trace)
+                if delay is None:
+                    return 0, None
+                time.sleep(delay)
+
+    def extract_chunked(self, url, prompt, chunks, enqueue, on_entry, mode="full", trace=None):
+        # all chunks in flight at once, page takes about as long as its largest chunk
+        total = len(chunks)
+        print(f"Splitting {url} into {total} chunks")
+        chunk_futures = [
+            chunk_executor.submit(
+                self.extract_chunk, url, prompt, chunk, i, total,
+                enqueue if i == total else None,  # last chunk decides <next_page>
+                on_entry, mode, trace,
             )
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+        return combine_chunks([future.result() for future in chunk_futures])
+
+    def extract_packed(self, url, prompt, html, mode, attempt, on_next_page, on_entry, trace):
+        # False -> extract the page alone
+        key = self.pack_key(url, prompt, html, attempt)
+        if key is None:
+            return False
+        with trace.stage("generate"):
+            packed = self.packer.submit(url, prompt, html, mode, self.scope).result()
+        self.cache_packed(packed, key)
+        return self.use_packed(packed, mode, on_next_page, on_entry, trace)
+
+    def resume(self):
+        # rebuild visited set, corpus and jsonl log from a previous run; returns urls still to do
+        self.visited_urls.update(self.state.urls())
+        restored = 0
+        for entry in self.state.entries():
+            if self.deduplicator is not None:
+                self.deduplicator.add(entry) # rebuild the index, saved entries were already deduplicated
+            if self.dictionary.merge(entry, self.writer.write) is not None:
+                restored += 1
+        pending = self.state.pending()
+        if self.visited_urls:
+            print(f"Resuming crawl {self.name}: {restored} entries restored, {len(pending)} pages pending, "
+                  f"{len(self.visited_urls) - len(pending)} pages done")
+        return pending
+
+    def run_threads(self):
+        self.enqueue(self.start_url)
+        for url in self.pending:
+            self.submit_page(url)
+
+        # wait for this crawl's futures to finish, other crawls keep the pool busy meanwhile
+        while True:
+            with self.futures_lock:
+                if not self.futures:
+                    break
+                current = set(self.futures)
+            wait(current, return_when=FIRST_COMPLETED)
+            time.sleep(0.1)
+
+    def async_crawler(self):
+        from async_engine import AsyncCrawler  # aiohttp only needed for this engine
+
+        return AsyncCrawler(
+            self.source_language, self.target_languages, self.dictionary, self.writer, self.state,
+            self.completion_cache, cache_read=self.cache_read, cache_write=self.cache_write, reduce=self.reduce,
+            chunked=self.chunked, chunk_max_tokens=self.chunk_max_tokens, max_attempts=self.max_attempts,
+            max_continuations=self.max_continuations, pagination=self.pagination, rulebook=self.rulebook,
+            sites=self.sites, fast_prompts=self.fast_prompts, telemetry=self.telemetry,
+            deduplicator=self.deduplicator, packer=self.packer, fingerprints=self.fingerprints, scope=self.scope,
+        )
+
+# batch runs (--jobs): a yaml or json file with a list of crawls, or a mapping with "jobs" and
+# "defaults" merged into every job. a job has start_url, source_language, optionally target_languages
+# (none = raw content), output (json path), fresh, zstd, dedup, dedup_threshold, metrics_port
+JOB_KEYS = {"name", "start_url", "source_language", "target_languages", "output", "fresh", "zstd", "dedup",
+            "dedup_threshold", "metrics_port"}
+
+def load_jobs(path, defaults=None):
+    # [(Crawler, job settings)]; defaults (the command line flags) apply where the file sets nothing
+    with open(path, encoding="utf-8") as fh:
+        text = fh.read()
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ValueError(f"{path}: reading yaml job files needs pyyaml (pip install pyyaml)")
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+    defaults = dict(defaults or {})
+    if isinstance(spec, dict):
+        defaults.update(spec.get("defaults") or {})
+        spec = spec.get("jobs")
+    if not isinstance(spec, list) or not spec:
+        raise ValueError(f"{path}: expected a list of jobs")
+    jobs, state_paths = [], set()
+    for number, job in enumerate(spec, start=1):
+        if not isinstance(job, dict):
+            raise ValueError(f"{path}: job {number} is not a mapping")
+        job = {**defaults, **job}
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise ValueError(f"{path}: job {number} has unknown keys {sorted(unknown)}")
+        if not job.get("start_url") or not job.get("source_language"):
+            raise ValueError(f"{path}: job {number} needs start_url and source_language")
+        if isinstance(job.get("target_languages"), list):
+            job["target_languages"] = ", ".join(job["target_languages"])
+        crawl = Crawler(
+            job["start_url"], job["source_language"], job.get("target_languages"), job.get("output"),
+            zstd=job.get("zstd", False), dedup=job.get("dedup", True),
+            dedup_threshold=job.get("dedup_threshold", NEAR_DUP_THRESHOLD), name=job.get("name"),
+        )
+        # two crawls on one state file would resume each other's frontier
+        if crawl.state_path in state_paths:
+            raise ValueError(f"{path}: job {number} writes to {crawl.out_path} like an earlier job")
+        state_paths.add(crawl.state_path)
+        jobs.append((crawl, job))
+    return jobs
+
+def run_job(crawl, job):
+    # one crawl from resume to compaction; a failing job is reported and leaves the others running
+    try:
+        crawl.open(job.get("fresh", False), job.get("metrics_port"))
+        crawl.run_threads()
+        crawl.close()
+        return True
+    except Exception as exception:
+        print(f"Crawl {crawl.name} failed: {exception!r}")
+        return False
 
-            buf, dispatched = [], False
-            for event in completion:
-                chunk = event.choices[0].delta.content or ""
-                buf.append(chunk)
-
-                # first time we see </next_page> -> enqueue successor
-                if not dispatched:
-                    next_page = extract_next_page_from_response("".join(buf))
-                    if next_page:
-                        if enqueue_new(next_page, source_language, target_languages, out_path):
-                            dispatched = True
-
-            # parse json
-            full_resp = "".join(buf)
-            chain_of_thought = extract_chain_of_thought_from_response(full_resp)
-            print("Chain of thought for " + url + ": " + (chain_of_thought or "empty"))
-            page_dict = json.loads(extract_json_from_response(full_resp))
-            break  # success -> exit retry-loop
-
-        except Exception as exception:
-            print(f"Attempt {attempt} failed for {url}: {exception}")
-            if attempt == MAX_LLM_ATTEMPTS:
-                print(f"Giving up {url} after {MAX_LLM_ATTEMPTS} attempts")
-                page_dict = {}
-            else:
-                continue
-
-    # merge new dictionary into master
-    with DICT_LOCK:
-        corpus_from_llm = page_dict.get("corpus")
-        num_added = 0
-
-        if corpus_from_llm is not None:
-            if isinstance(dictionary, list) and isinstance(corpus_from_llm, list):
-                # if corpus_from_llm is a list, extend dictionary with it
-                dictionary.extend(corpus_from_llm)
-                num_added = len(corpus_from_llm)
-            elif isinstance(dictionary, dict) and isinstance(corpus_from_llm, dict):
-                # if corpus_from_llm is a dict, update dictionary with it
-                dictionary.update(corpus_from_llm)
-                num_added = len(corpus_from_llm)
-
-            if isinstance(dictionary, list):
-                temp = list(dictionary) # shallow copy of list
-            elif isinstance(dictionary, dict):
-                temp = dict(dictionary) # shallow copy of dict
-            else: # on error, just use the dictionary as is
-                temp = dictionary
-
-            save_json_threadsafe(temp, out_path)
-            print(f"Finished {url} (+{num_added} entries)")
-        else:
-            print(f"Finished {url} (no corpus data to add)")
+async def run_job_async(crawl, job, http, pages):
+    # run_job on the event loop: the crawl's pages share the loop's http session and page semaphore
+    import asyncio
+    try:
+        await asyncio.to_thread(crawl.open, job.get("fresh", False), job.get("metrics_port"))
+        await crawl.async_crawler().run(crawl.start_url, crawl.pending, http, pages)
+        await asyncio.to_thread(crawl.close)
+        return True
+    except Exception as exception:
+        print(f"Crawl {crawl.name} failed: {exception!r}")
+        return False
 
-def main():
-    global dictionary
+def run_jobs(jobs, engine="threads", metrics_port=None):
+    # up to MAX_JOBS crawls at once; their pages share the page pool (async: the event loop, http session
+    # and page semaphore), the politeness scheduler and the llm backend's rate limiter
+    # metrics_port: one /metrics endpoint for the whole run, every crawl's series labelled with its name
+    # returns the names of the crawls that failed
+    print(f"Running {len(jobs)} crawls, {min(MAX_JOBS, len(jobs))} at a time")
+    server = serve_metrics(metrics_port, [crawl.telemetry for crawl, _ in jobs]) if metrics_port else None
+    if engine == "async":
+        import asyncio
+        from async_engine import open_session, ASYNC_MAX_PAGES
+
+        async def run_all():
+            slots = asyncio.Semaphore(MAX_JOBS)
+            pages = asyncio.Semaphore(ASYNC_MAX_PAGES)
+            async with open_session() as http:
+                async def run_one(crawl, job):
+                    async with slots:
+                        return await run_job_async(crawl, job, http, pages)
+                return await asyncio.gather(*(run_one(crawl, job) for crawl, job in jobs))
+
+        results = asyncio.run(run_all())
+    else:
+        # job threads only wait on their crawl's futures, the page work runs in the shared executor
+        with ThreadPoolExecutor(max_workers=MAX_JOBS, thread_name_prefix="job") as job_executor:
+            results = list(job_executor.map(lambda item: run_job(*item), jobs))
+    if server:
+        server.shutdown()
+        server.server_close()
+    failed = [crawl.name for (crawl, _), ok in zip(jobs, results) if not ok]
+    print(f"\n{len(jobs) - len(failed)} of {len(jobs)} crawls finished"
+          + (f", failed: {', '.join(failed)}" if failed else ""))
+    return failed
+
+def report(backend):
+    # process-wide numbers, summed over every crawl of the run
+    if REDUCTION_STATS["pages"]:
+        saved = REDUCTION_STATS["tokens_before"] - REDUCTION_STATS["tokens_after"]
+        print(f"Input tokens saved by reduction: {saved} over {REDUCTION_STATS['pages']} pages")
+        # per step, they add up to the total; resolving links to absolute urls costs tokens
+        steps = ", ".join(f"{step} {tokens}" for step, tokens in REDUCTION_STATS["steps"].items() if tokens)
+        print(f"  by step: {steps}")
+    fetch_stats = get_fetch_stats()
+    print(f"HTTP: {fetch_stats['requests']} requests, {fetch_stats['cache_hits']} not modified, "
+          f"{fetch_stats['bytes_downloaded']} bytes downloaded, {fetch_stats['bytes_saved']} bytes saved")
+    print(f"Per-host concurrency at end of crawl: {scheduler.limits()}")
+    llm_stats = backend.limiter.stats if getattr(backend, "limiter", None) else None
+    if llm_stats:
+        print(f"LLM: {llm_stats['calls']} calls, {llm_stats['actual']} tokens used ({llm_stats['estimated']} estimated), "
+              f"{llm_stats['waited_seconds']:.0f}s waiting for budget, {llm_stats['rate_limited']} rate limited")
+    if rulebook.stats["induced"] or rulebook.stats["replayed"]:
+        print(f"Extraction rules: {rulebook.stats['induced']} induced, {rulebook.stats['replayed']} pages replayed "
+              f"without the llm, {rulebook.stats['fallbacks']} fell back")
+    for line in sites.report():
+        print(line)
+    if packer.stats["packs"]:
+        print(f"Packed requests: {packer.stats['packs']} for {packer.stats['pages']} pages, "
+              f"{packer.stats['rerun']} pages rerun alone")
+    if completion_cache.hits:
+        print(f"Completions replayed from cache: {completion_cache.hits}")
 
-    start_url = input("URL: ").strip()
-    source_language = input("Language to translate: ").strip()
+def main():
+    global CACHE_READ, CACHE_WRITE, PAGE_PACKING
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--jobs", help="YAML/JSON file listing crawls to run together in this process, "
+                                          "instead of prompting for one")
+    argparser.add_argument("--no-cache", action="store_true", help="Neither read nor write the completion cache")
+    argparser.add_argument("--refresh", action="store_true", help="Ignore cached completions but store the new ones")
+    argparser.add_argument("--engine", choices=("threads", "async"), default="threads",
+                           help="Thread pool (default) or asyncio crawl engine")
+    argparser.add_argument("--zstd", action="store_true", help="Compress the jsonl output with zstd")
+    argparser.add_argument("--fresh", action="store_true",
+                           help="Discard saved crawl state for this output instead of resuming")
+    argparser.add_argument("--backend", choices=BACKENDS, default=LLM_BACKEND,
+                           help="LLM backend: OpenRouter, a local OpenAI-compatible server, or an in-process fake")
+    argparser.add_argument("--base-url", help="Endpoint of the openrouter/local backend")
+    argparser.add_argument("--model", help="Model name sent to the backend")
+    argparser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    argparser.add_argument("--pack", action="store_true",
+                           help="Send small pages of a site together in one LLM request (tiny pages, slow first token)")
+    argparser.add_argument("--no-dedup", action="store_true", help="Keep repeated sentences in raw content mode")
+    argparser.add_argument("--dedup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                           help="Similarity (0-1) above which raw sentences count as near duplicates, 1 = exact only")
+    args = argparser.parse_args()
+    CACHE_READ = not (args.no_cache or args.refresh)
+    CACHE_WRITE = not args.no_cache
+    PAGE_PACKING = PAGE_PACKING or args.pack
+
+    jobs = None
+    if args.jobs:
+        # command line flags are the defaults of every job, the file's own settings win
+        defaults = {"fresh": args.fresh, "zstd": args.zstd, "dedup": not args.no_dedup,
+                    "dedup_threshold": args.dedup_threshold}
+        try:
+            jobs = load_jobs(args.jobs, defaults)
+        except (OSError, ValueError) as exception:
+            argparser.error(str(exception))
+    backend = create_backend(args.backend, args.base_url, args.model)
+    set_backend(backend)
+    print(f"LLM backend: {backend.describe()}")
+
+    failed = []
+    if jobs is not None:
+        failed = run_jobs(jobs, args.engine, args.metrics_port)
+    else:
+        start_url = input("URL: ").strip()
+        source_language = input("Language to translate: ").strip()
 
-    target_languages_input = input("Target languages (leave none for raw content scrape): ").strip()
-    target_languages = target_languages_input if len(target_languages_input) > 0 else None
+        target_languages_input = input("Target languages (leave none for raw content scrape): ").strip()
+        target_languages = target_languages_input if len(target_languages_input) > 0 else None
 
-    if target_languages is None:
-        out_path = str(OUTPUT_DIR / f"corpus_{source_language}.json")
-        dictionary = [] # list for raw content (list of sentences)
-        print(f"Starting raw content scrape, writing to {out_path}")
-    else:
-        out_path = str(OUTPUT_DIR / f"{source_language}_to_{target_languages}.json")
-        dictionary = {} # dict for dictionary entries
-        print(f"Starting dictionary crawl, writing to {out_path}")
-    
-    print(f"Starting crawl, writing to {out_path}")
-
-    enqueue_new(start_url, source_language, target_languages, out_path)
-
-    # wait for futures pool to empty
-    while True:
-        with futures_lock:
-            if not futures:
-                break
-            current = set(futures)
-        wait(current, return_when=FIRST_COMPLETED)
-        time.sleep(0.1)
+        crawl = Crawler(start_url, source_language, target_languages, zstd=args.zstd, dedup=not args.no_dedup,
+                        dedup_threshold=args.dedup_threshold)
+        crawl.open(args.fresh, args.metrics_port)
+        crawl.run(args.engine)
+        crawl.close()
 
     executor.shutdown(wait=True)
-    print(f"\nTotal entries collected: {len(dictionary)}")
+    chunk_executor.shutdown(wait=True)
+    print()
+    report(backend)
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,111 @@
+import re
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+from inference import estimate_tokens, get_pack_note, next_page_from_section
+from stream_json import CorpusStreamParser, scan_response
+
+# small pages (single-entry dictionary pages, short verse pages) share one llm request: the
+# instructions are paid once per pack instead of once per page, and the pack costs one round trip
+# the pack's output is generated in sequence though, so it pays off when the prompt and the time to
+# first token outweigh a page's output, not for pages with long corpora
+# pages that arrive within PACK_WINDOW for the same site and prompt join an open pack until it is
+# full; a page left alone, a failed pack and a page whose block does not validate run on their own
+PACK_PAGE_TOKENS = 1000 # pages up to this size are packed
+PACK_MAX_TOKENS = 12000 # html budget per pack, same as a chunk's
+PACK_MAX_PAGES = 8
+PACK_WINDOW = 0.3 # seconds a new pack waits for more pages
+
+_BLOCK = re.compile(r'<page id="(\d+)"[^>]*>(.*?)</page>', re.DOTALL)
+
+def pack_pages(pages):
+    # [(url, html)] -> the request body, one delimited block per page
+    return "".join(f'<page id="{i}" url="{url}">\n{html}\n</page>\n' for i, (url, html) in enumerate(pages, start=1))
+
+def split_response(response, count):
+    # packed response -> [(entries, next_page, block) or None] per page, None where the block is missing or
+    # invalid; a block has the sections of a single page's response, so it can be cached as one
+    blocks = {int(i): text for i, text in _BLOCK.findall(response)}
+    results = []
+    for i in range(1, count + 1):
+        block = blocks.get(i)
+        if block is None:
+            results.append(None)
+            continue
+        sections = scan_response(block)
+        entries = []
+        parser = CorpusStreamParser(entries.append)
+        parser.feed(sections.get("json") or "")
+        if "next_page" not in sections or not parser.done or parser.errors:
+            results.append(None)
+            continue
+        results.append((entries, next_page_from_section(sections["next_page"]), block))
+    return results
+
+class PagePacker:
+    def __init__(self, complete, on_response=None, max_tokens=PACK_MAX_TOKENS, max_pages=PACK_MAX_PAGES,
+                 window=PACK_WINDOW):
+        self.complete = complete # content -> whole response text
+        self.on_response = on_response # (urls extracted, mode, response, scope), e.g. to learn the site summary
+        self.max_tokens = max_tokens
+        self.max_pages = max_pages
+        self.window = window
+        self.lock = threading.Lock()
+        self.open = {} # (netloc, prompt, scope) -> pack filling up
+        self.stats = {"packs": 0, "pages": 0, "rerun": 0}
+
+    def submit(self, url, prompt, html, mode="full", scope=None):
+        # Future of (entries, next_page, block) for this page, or None: extract it on its own
+        # scope: the crawl's site_summary.site_scope, pages of two crawls are not packed together
+        future = Future()
+        key = (urlparse(url).netloc, prompt, scope)
+        tokens = estimate_tokens(html)
+        with self.lock:
+            pack = self.open.get(key)
+            if pack is not None and (pack["tokens"] + tokens > self.max_tokens or len(pack["pages"]) >= self.max_pages):
+                self._close(key) # full, this page opens the next one
+                pack = None
+            if pack is None:
+                pack = self.open[key] = {"pages": [], "tokens": 0, "mode": mode}
+                threading.Timer(self.window, self._expire, args=(key, pack)).start()
+            pack["pages"].append((url, html, future))
+            pack["tokens"] += tokens
+            if len(pack["pages"]) >= self.max_pages:
+                self._close(key)
+        return future
+
+    def _expire(self, key, pack):
+        with self.lock:
+            if self.open.get(key) is pack:
+                self._close(key)
+
+    def _close(self, key):
+        # under the lock: the pack leaves the open set and is sent from its own thread
+        pack = self.open.pop(key)
+        threading.Thread(target=self._send, args=(key[1], pack["pages"], pack["mode"], key[2]), name="llm-pack",
+                         daemon=True).start()
+
+    def _send(self, prompt, pages, mode, scope):
+        if len(pages) == 1:
+            pages[0][2].set_result(None) # nobody joined, the normal streaming path is better
+            return
+        started = time.monotonic()
+        try:
+            content = prompt + pack_pages([(url, html) for url, html, _ in pages]) + get_pack_note(len(pages)) + "\n\nBegin. "
+            response = self.complete(content)
+            results = split_response(response, len(pages))
+            if self.on_response:
+                self.on_response([url for (url, _, _), result in zip(pages, results) if result], mode, response, scope)
+        except Exception as exception:
+            print(f"Pack of {len(pages)} pages failed, extracting them one by one: {exception}")
+            results = [None] * len(pages)
+        rerun = sum(result is None for result in results)
+        with self.lock:
+            self.stats["packs"] += 1
+            self.stats["pages"] += len(pages) - rerun
+            self.stats["rerun"] += rerun
+        print(f"Packed {len(pages)} pages into one request ({time.monotonic() - started:.1f}s, {rerun} to rerun)")
+        for (_, _, future), result in zip(pages, results):
+            future.set_result(result)
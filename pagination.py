@@ -0,0 +1,218 @@
+import re
+import string
+import threading
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# learns the url pattern behind a chain of <next_page> hops (?page=2 -> ?page=3, ?letter=a -> ?letter=b,
+# /page/4/ -> /page/5/) and predicts the pages ahead so the workers can crawl them in parallel
+# the llm stays the source of truth: a hop that disagrees with a pattern retires it
+# urls passed in are expected to be normalized (scrape.normalize_url), predictions come out the same way
+MIN_OBSERVATIONS = 3 # hops with the same step before the pattern is trusted
+FAN_OUT = 16 # predicted pages kept ahead of the furthest page the llm led to
+MAX_PREDICTED = 2000 # per pattern, in case a site answers every page number with content
+
+_RUN = re.compile(r"\d+|[A-Za-z]")
+
+def _query(p):
+    return dict(parse_qsl(p.query, keep_blank_values=True))
+
+def _locate(url, next_url):
+    # the one query value or path segment that differs -> (where, old, new), else None
+    a, b = urlparse(url), urlparse(next_url)
+    if (a.scheme, a.netloc) != (b.scheme, b.netloc):
+        return None
+    a_query, b_query = _query(a), _query(b)
+    if a.path == b.path and a_query.keys() == b_query.keys():
+        changed = [key for key in a_query if a_query[key] != b_query[key]]
+        if len(changed) == 1:
+            return ("query", changed[0]), a_query[changed[0]], b_query[changed[0]]
+    a_parts, b_parts = a.path.split("/"), b.path.split("/")
+    if a.query == b.query and len(a_parts) == len(b_parts):
+        changed = [i for i, (x, y) in enumerate(zip(a_parts, b_parts)) if x != y]
+        if len(changed) == 1:
+            return ("path", changed[0]), a_parts[changed[0]], b_parts[changed[0]]
+    return None
+
+def _split(a, b):
+    # (prefix, a_middle, b_middle, suffix) around the single number/letter that differs, else None
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < min(len(a), len(b)) - start and a[len(a) - 1 - end] == b[len(b) - 1 - end]:
+        end += 1
+    a_mid, b_mid = a[start:len(a) - end], b[start:len(b) - end]
+    # widen to whole digit runs so 19 -> 20 and 11 -> 12 read as numbers, not digits
+    if a_mid.isdigit() or b_mid.isdigit():
+        while start and a[start - 1].isdigit():
+            start -= 1
+        while end and a[len(a) - end].isdigit():
+            end -= 1
+        a_mid, b_mid = a[start:len(a) - end], b[start:len(b) - end]
+    if not (_RUN.fullmatch(a_mid) and _RUN.fullmatch(b_mid)):
+        return None
+    return a[:start], a_mid, b_mid, a[len(a) - end:]
+
+class Pattern:
+    def __init__(self, where, prefix, suffix, kind, step, width):
+        self.key = None # series() of the pages it was inferred from
+        self.where = where # ("query", name) or ("path", segment index)
+        self.prefix = prefix # text around the counter inside that value (page-3.html)
+        self.suffix = suffix
+        self.kind = kind # "number" or "letter"
+        self.step = step
+        self.width = width # zero padding (page=007)
+        self.hops = 0
+        self.confirmed = None # furthest value the llm itself led to
+        self.frontier = None # furthest value already enqueued
+        self.predicted = 0
+        self.retired = False
+        self.busy = False # a worker is probing ahead
+
+    def value(self, url):
+        # counter value of url if it belongs to this series (same site, same everything else)
+        p = urlparse(url)
+        if self.where[0] == "query":
+            raw = _query(p).get(self.where[1])
+        else:
+            parts = p.path.split("/")
+            raw = parts[self.where[1]] if self.where[1] < len(parts) else None
+        if raw is None or not raw.startswith(self.prefix) or not raw.endswith(self.suffix):
+            return None
+        middle = raw[len(self.prefix):len(raw) - len(self.suffix)]
+        if self.kind == "number":
+            return int(middle) if middle.isdigit() else None
+        return ord(middle) if len(middle) == 1 and middle.isalpha() else None
+
+    def render(self, url, value):
+        # url with the counter set to value, None past the end of the sequence
+        if self.kind == "number":
+            if value < 0:
+                return None
+            middle = str(value).zfill(self.width)
+        else:
+            middle = chr(value)
+            if middle not in string.ascii_letters:
+                return None
+        raw = self.prefix + middle + self.suffix
+        p = urlparse(url)
+        if self.where[0] == "query":
+            query = _query(p)
+            query[self.where[1]] = raw
+            return urlunparse(p._replace(query=urlencode(sorted(query.items()))))
+        parts = p.path.split("/")
+        parts[self.where[1]] = raw
+        return urlunparse(p._replace(path="/".join(parts)))
+
+    def series(self, url):
+        # key shared by every page of the series: the url minus its counter
+        return (self.where, self.prefix, self.suffix, self.kind, self.step, self.render(url, 0 if self.kind == "number" else ord("a")))
+
+    def ahead(self, a, b):
+        # how many steps b is past a
+        return (b - a) // self.step
+
+def infer(url, next_url):
+    # pattern explaining one hop, or None
+    located = _locate(url, next_url)
+    if located is None:
+        return None
+    where, a_raw, b_raw = located
+    split = _split(a_raw, b_raw)
+    if split is None:
+        return None
+    prefix, a_mid, b_mid, suffix = split
+    if a_mid.isdigit() and b_mid.isdigit():
+        kind, step = "number", int(b_mid) - int(a_mid)
+    elif a_mid.isalpha() and b_mid.isalpha() and a_mid.islower() == b_mid.islower():
+        kind, step = "letter", ord(b_mid) - ord(a_mid)
+    else:
+        return None
+    if step == 0:
+        return None
+    width = len(a_mid) if kind == "number" and len(a_mid) > 1 and a_mid.startswith("0") else 0
+    return Pattern(where, prefix, suffix, kind, step, width)
+
+class PaginationInference:
+    def __init__(self, probe):
+        self.probe = probe # probe(url, reference) -> True if url serves a page of its own
+        self.patterns = {}
+        self.lock = threading.Lock()
+
+    def observe(self, url, next_url, reference=None):
+        # record one llm hop; returns predicted urls to enqueue (often none)
+        # blocking, probing ahead fetches pages: call it from a worker, not a stream callback
+        candidate = infer(url, next_url) if next_url else None
+        with self.lock:
+            self._retire_disagreeing(url, next_url)
+            if candidate is None:
+                return []
+            candidate.key = candidate.series(url)
+            pattern = self.patterns.setdefault(candidate.key, candidate)
+            value = pattern.value(next_url)
+            if pattern.retired or value is None:
+                return []
+            pattern.hops += 1
+            if pattern.confirmed is None or pattern.ahead(pattern.confirmed, value) > 0:
+                pattern.confirmed = value
+            if pattern.hops == MIN_OBSERVATIONS:
+                print(f"Inferred pagination pattern at {next_url}: {pattern.where[0]} {pattern.where[1]}, "
+                      f"{pattern.kind} step {pattern.step:+d}")
+            if pattern.hops < MIN_OBSERVATIONS or pattern.busy or pattern.predicted >= MAX_PREDICTED:
+                return []
+            start = pattern.confirmed
+            if pattern.frontier is not None and pattern.ahead(start, pattern.frontier) > 0:
+                start = pattern.frontier
+            if pattern.ahead(pattern.confirmed, start) > FAN_OUT // 2:
+                return [] # refill in batches, every batch costs a probe fetch
+            candidates = []
+            for i in range(1, FAN_OUT - pattern.ahead(pattern.confirmed, start) + 1):
+                predicted = pattern.render(next_url, start + i * pattern.step)
+                if predicted is None:
+                    break
+                candidates.append(predicted)
+            if not candidates:
+                return []
+            pattern.busy = True
+
+        try:
+            found = self._probe_ahead(candidates, reference)
+        finally:
+            with self.lock:
+                pattern.busy = False
+        with self.lock:
+            if not found:
+                # nothing past the frontier, the llm takes the chain from here
+                pattern.retired = True
+                print(f"Pagination pattern ends after {next_url}, following the llm from here")
+                return []
+            pattern.frontier = start + len(found) * pattern.step
+            pattern.predicted += len(found)
+        print(f"Fanning out {len(found)} predicted pages after {next_url}")
+        return found
+
+    def _probe_ahead(self, candidates, reference):
+        # binary search for the furthest candidate that exists, the ones before it are taken on trust
+        if self.probe(candidates[-1], reference):
+            return candidates
+        low, high = -1, len(candidates) - 1 # candidates[high] is missing
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.probe(candidates[middle], reference):
+                low = middle
+            else:
+                high = middle
+        return candidates[:low + 1]
+
+    def _retire_disagreeing(self, url, next_url):
+        # lock held; the llm leading anywhere but the predicted successor (or nowhere) ends a pattern
+        for pattern in self.patterns.values():
+            if pattern.retired or pattern.hops < MIN_OBSERVATIONS:
+                continue
+            value = pattern.value(url)
+            if value is None or pattern.series(url) != pattern.key:
+                continue
+            expected = pattern.render(url, value + pattern.step)
+            if next_url != expected:
+                pattern.retired = True
+                print(f"Pagination pattern retired: the llm went from {url} to {next_url}, expected {expected}")
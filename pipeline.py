@@ -0,0 +1,401 @@
+import time
+
+from reduce import split_html
+from retry import classify, backoff
+from scrape import normalize_url
+from stream_json import CorpusStreamParser, ResponseScanner
+from telemetry import Telemetry, PageTrace
+from packing import PACK_PAGE_TOKENS
+from inference import (
+    get_backend,
+    PROMPT_VERSION,
+    TEMPERATURE,
+    estimate_tokens,
+    build_prompt,
+    get_chunk_note,
+    get_continuation_note,
+    next_page_from_section,
+)
+
+# what both crawl engines do with a page, minus the i/o: duplicate and rule checks, the prompt, how a
+# streamed response is parsed, continued, salvaged, cached and learned from, packing, dedup and merging,
+# when to retry and what to record once the page is done. main.Crawler (thread pool) and
+# async_engine.AsyncCrawler (asyncio) subclass PagePipeline and only fetch, stream, wait and schedule
+
+class Extraction:
+    # one llm extraction of a page (or chunk), over the continuation requests a cut-off response needs
+    # the engine loops while content is set: lookup() the cache, stream the content (or replay cached),
+    # feed() the chunks, broke() on an exception, record() the call, then closed(); result() is
+    # (entries, next_page). lookup() and closed() do the disk i/o, the async engine runs them in a thread
+    def __init__(self, pipeline, url, content, on_next_page, on_entry, mode, learn_site, trace):
+        self.pipeline = pipeline
+        self.url = url
+        self.on_next_page = on_next_page
+        self.on_entry = on_entry
+        self.mode = mode # prompt kind ("full"/"fast") for the per-mode stats
+        self.learn_site = learn_site
+        self.trace = trace or PageTrace(url)
+        self.continuation = 0
+        self.entries = 0 # from the requests before this one
+        self.next_page = None
+        self.last_entry = None # a continuation starts after it
+        self.dispatched = False
+        self.request(content)
+
+    def request(self, content):
+        cache = self.pipeline.completion_cache
+        self.content = self.sent = content # content: still to request, None once the response is settled
+        self.started = time.monotonic()
+        self.key = cache.key(get_backend().model, PROMPT_VERSION, TEMPERATURE, content)
+        self.cached = None
+        self.parser = CorpusStreamParser(self.emit)
+        # the <json> section goes to the incremental parser as it streams
+        self.scanner = ResponseScanner(self.on_section, lambda name, text: self.parser.feed(text), streamed=("json",))
+        self.buf, self.first_chunk, self.busy = [], None, 0.0
+
+    def lookup(self):
+        if self.pipeline.cache_read:
+            self.cached = self.pipeline.completion_cache.get(self.key)
+        if self.cached is not None:
+            print(f"Cache hit for {self.url}")
+
+    def emit(self, entry):
+        self.last_entry = entry
+        if self.on_entry:
+            self.on_entry(entry)
+
+    def on_section(self, name, text):
+        # </next_page> -> hand successor to caller while the corpus is still streaming
+        if name == "next_page" and self.on_next_page and not self.dispatched:
+            next_page = next_page_from_section(text)
+            if next_page:
+                self.dispatched = self.on_next_page(next_page)
+
+    def feed(self, chunk):
+        # True once nothing more is needed from the response: whatever the model adds after the corpus
+        # is not worth waiting (or paying) for
+        received = time.monotonic()
+        self.first_chunk = self.first_chunk or received
+        self.buf.append(chunk)
+        self.scanner.feed(chunk)
+        self.busy += time.monotonic() - received
+        return self.scanner.has("json") and self.scanner.has("next_page")
+
+    def broke(self, exception):
+        # entries already streamed are kept, a stream that broke before any is a failed request
+        if not self.parser.entries:
+            self.fail(exception)
+        else:
+            print(f"Stream for {self.url} broke after {self.parser.entries} entries, keeping them: {exception}")
+
+    def fail(self, exception):
+        # a failed first request fails the extraction, a failed continuation keeps what came before
+        if not self.continuation:
+            raise exception
+        print(f"Continuation for {self.url} failed, keeping {self.entries} entries: {exception}")
+        self.content = None
+
+    def record(self, usage=None):
+        # usage: real token counts, if the backend reported them before we stopped reading
+        self.trace.record_call(
+            self.cached is not None, self.sent, "".join(self.buf), self.started, self.first_chunk, self.busy, usage,
+        )
+
+    def closed(self):
+        # the response is in: continue it, salvage it or cache it; leaves content set to request again
+        if self.content is None: # a continuation broke
+            return
+        pipeline, parser = self.pipeline, self.parser
+        full_resp = "".join(self.buf)
+        if self.mode == "full":
+            chain_of_thought = self.scanner.sections.get("chain_of_thought")
+            print("Chain of thought for " + self.url + ": " + (chain_of_thought or "empty"))
+        self.next_page = self.next_page or next_page_from_section(self.scanner.sections.get("next_page"))
+        if self.cached is None and pipeline.sites:
+            pipeline.sites.record(self.mode, estimate_tokens(full_resp), self.started)
+
+        if parser.entries and not parser.corpus_closed and self.continuation < pipeline.max_continuations:
+            # cut off mid-corpus: ask for the rest only, instead of paying for the whole page again
+            print(f"Response for {self.url} was cut off after {parser.entries} entries, continuing")
+            self.trace.count(continuations=1)
+            self.entries += parser.entries
+            self.continuation += 1
+            self.request(self.content + get_continuation_note(self.last_entry))
+            return
+
+        malformed = not parser.done or parser.errors
+        if self.mode == "fast" and pipeline.sites:
+            pipeline.sites.parsed(pipeline.scope, not malformed)
+        if malformed:
+            if not parser.entries:
+                return self.fail(ValueError(f"no parsable corpus in response for {self.url}"))
+            # keep the valid prefix instead of paying for the whole page again
+            print(f"Salvaged {parser.entries} entries from a malformed response for {self.url}")
+        else:
+            # only responses that parsed are cached, a bad completion must not be replayed on retry
+            if self.cached is None and pipeline.cache_write:
+                pipeline.completion_cache.put(self.key, full_resp)
+            if self.mode == "full" and self.learn_site and not self.continuation and pipeline.sites:
+                pipeline.sites.learn(pipeline.scope, full_resp)
+        self.entries += parser.entries
+        self.content = None
+
+    def result(self):
+        return self.entries, self.next_page
+
+class Page:
+    # one page across its attempts: the html, the successor found, the entries it added
+    def __init__(self, pipeline, url):
+        self.pipeline = pipeline
+        self.url = url
+        self.trace = pipeline.telemetry.page(url)
+        self.html = None # fetched once: a retry after a failed llm call reuses it
+        self.duplicate_of = None
+        self.parked = False # a duplicate waiting for the page with its content, see skip_duplicate
+        self.dispatched, self.found_next = False, None
+        self.entries = []
+        self.extracted = [] # everything extracted for this page, duplicates included (rule induction checks against it)
+        self.error = None
+        self.merged = 0 # entries merged before the current attempt
+
+    def attempt(self, attempt):
+        print(f"Scraping {self.url} (attempt {attempt}/{self.pipeline.max_attempts})")
+        self.error = None # of the last attempt
+        self.merged = len(self.entries)
+
+    def enqueue(self, next_page):
+        self.found_next = next_page
+        if self.pipeline.enqueue(next_page):
+            self.dispatched = True
+        return self.dispatched
+
+    @property
+    def on_next_page(self):
+        return None if self.dispatched else self.enqueue
+
+    def on_entry(self, entry):
+        # merge each entry into the corpus as soon as it is streamed, log it to the jsonl output
+        self.extracted.append(entry)
+        pipeline = self.pipeline
+        if pipeline.deduplicator is not None and not pipeline.deduplicator.add(entry):
+            return
+        # the entry's shard lock, the merge and the log write under it: a repeated headword is logged
+        # merged, and the last line (the one compaction keeps) is the latest merge
+        with self.trace.stage("lock_wait"):
+            merged = pipeline.dictionary.merge(entry, pipeline.writer.write)
+        if merged is not None:
+            self.entries.append(entry)
+
+    def fetched(self, html):
+        self.html = html
+        if self.pipeline.fingerprints:
+            self.duplicate_of = self.pipeline.fingerprints.claim(self.url, html)
+
+    def skip_duplicate(self):
+        # same content as a page already extracted: its entries are in the corpus, its next_page is followed
+        # a duplicate of a page still in flight is parked until that page is done, or extracted if it fails
+        if self.duplicate_of is None:
+            return False
+        fingerprints = self.pipeline.fingerprints
+        outcome, next_page = fingerprints.park(self.url, self.duplicate_of)
+        if outcome == "released":
+            self.duplicate_of = fingerprints.claim(self.url, self.html)
+            return self.skip_duplicate()
+        print(f"{self.url} has the same content as {self.duplicate_of}, skipping extraction")
+        self.trace.mode = "duplicate"
+        self.trace.count(duplicates=1)
+        self.parked = outcome == "parked"
+        if next_page:
+            self.enqueue(next_page)
+        return True
+
+    def match_rules(self):
+        # template already has selectors -> (entries, next_page) without an llm call, None if they miss
+        rulebook = self.pipeline.rulebook
+        if not rulebook:
+            return None
+        with self.trace.stage("rules"):
+            return rulebook.replay(self.url, self.html, self.pipeline.target_languages)
+
+    def use_rules(self, replayed):
+        entries, next_page = replayed
+        self.trace.mode = "rules"
+        self.trace.count(replayed=1)
+        for entry in entries:
+            self.on_entry(entry)
+        if not self.dispatched:
+            self.enqueue(next_page)
+
+    def prompt(self, attempt):
+        # (mode, prompt, chunks); a retry goes back to the full prompt, in case the summary is what misled the model
+        pipeline = self.pipeline
+        summary = pipeline.sites.summary(pipeline.scope) if pipeline.sites and pipeline.fast_prompts and attempt == 1 else None
+        mode = self.trace.mode = "fast" if summary else "full"
+        prompt = build_prompt(pipeline.source_language, pipeline.target_languages, summary)
+        chunks = split_html(self.html, pipeline.chunk_max_tokens) if pipeline.chunked else [self.html]
+        return mode, prompt, chunks
+
+    def content(self, prompt):
+        return prompt + self.html + "\n\nBegin. "
+
+    def chunked(self, next_page):
+        if next_page and not self.dispatched:
+            self.enqueue(next_page)
+
+    def should_induce(self):
+        rulebook = self.pipeline.rulebook
+        return bool(rulebook and self.extracted and rulebook.claim(self.url, self.pipeline.target_languages))
+
+    def induce(self, complete):
+        pipeline = self.pipeline
+        with self.trace.stage("induce"):
+            pipeline.rulebook.induce(
+                self.url, self.html, list(self.extracted), complete, pipeline.source_language, pipeline.target_languages,
+            )
+
+    def failed(self, exception, attempt, stage):
+        # seconds to wait before the next attempt, None to give up
+        # an attempt can fail after merging entries (a write, a cache put, rule induction); those are in
+        # the corpus and the output log, so another attempt would merge them twice: the page stops with them
+        self.error = exception
+        kind = classify(exception)
+        print(f"Attempt {attempt} failed for {self.url} at {stage} ({kind or 'permanent'}): {exception}")
+        if len(self.entries) > self.merged:
+            print(f"Keeping the {len(self.entries) - self.merged} entries {self.url} already merged, not retrying")
+            return None
+        if kind is None or attempt == self.pipeline.max_attempts:
+            print(f"Giving up {self.url} after {attempt} attempts")
+            return None
+        self.trace.count(retries=1)
+        return backoff(kind, attempt)
+
+    def record(self):
+        # entries are already merged and queued for the writer, record the page result in the crawl state
+        # (blocking, the async engine runs it in a thread); returns the pages to extract after all
+        pipeline = self.pipeline
+        if self.parked:
+            print(f"Parked {self.url} until {self.duplicate_of} is done")
+            return []
+        failed = self.error is not None and not self.entries
+        requeue = []
+        with self.trace.stage("write"):
+            if failed:
+                pipeline.state.fail(self.url, self.error)
+            else:
+                pipeline.state.finish(self.url, self.entries, self.found_next)
+            if pipeline.fingerprints and self.duplicate_of is None:
+                if failed:
+                    # the content is free again: the pages parked on it are extracted after all
+                    requeue = pipeline.fingerprints.release(self.url)
+                    for url in requeue:
+                        print(f"{self.url} failed, extracting {url} (same content) instead")
+                else:
+                    for url in pipeline.fingerprints.finish(self.url, self.found_next):
+                        pipeline.state.finish(url, [], self.found_next)
+                        print(f"Finished {url} (same content as {self.url})")
+        if self.entries:
+            print(f"Finished {self.url} (+{len(self.entries)} entries)")
+        else:
+            print(f"Finished {self.url} (no corpus data to add)")
+        return requeue
+
+    def finish(self, requeue):
+        # requeue: from record(); True if the page's successor should feed the pagination pattern
+        pipeline = self.pipeline
+        for url in requeue:
+            pipeline.requeue(url)
+        return bool(pipeline.pagination and self.error is None and self.duplicate_of is None)
+
+    def observe(self):
+        # the llm's hop feeds the pattern; once it is trusted, returns the pages ahead (probing them fetches)
+        with self.trace.stage("pagination"):
+            return self.pipeline.pagination.observe(
+                self.url, normalize_url(self.found_next) if self.found_next else None, self.html,
+            )
+
+    def done(self):
+        failed = self.error is not None and not self.entries
+        self.pipeline.telemetry.finish(self.trace, len(self.entries), self.error if failed else None)
+
+class PagePipeline:
+    # the settings and shared objects of one crawl; subclasses add enqueue(url) and the i/o
+    def __init__(self, source_language, target_languages, dictionary, writer, state, completion_cache,
+                 cache_read=True, cache_write=True, reduce=True, chunked=True, chunk_max_tokens=12000,
+                 max_attempts=3, pagination=None, rulebook=None, sites=None, fast_prompts=True, telemetry=None,
+                 deduplicator=None, max_continuations=2, packer=None, fingerprints=None, scope=None):
+        self.source_language = source_language
+        self.target_languages = target_languages
+        self.dictionary = dictionary
+        self.writer = writer
+        self.state = state
+        self.completion_cache = completion_cache
+        self.cache_read = cache_read
+        self.cache_write = cache_write
+        self.reduce = reduce
+        self.chunked = chunked
+        self.chunk_max_tokens = chunk_max_tokens
+        self.max_attempts = max_attempts
+        self.max_continuations = max_continuations # follow-up requests for a response cut off mid-corpus
+        self.packer = packer # PagePacker, None to send every page on its own
+        self.fingerprints = fingerprints # PageFingerprints, None to extract pages with repeated content too
+        self.pagination = pagination # PaginationInference, None to follow the llm's chain only
+        self.rulebook = rulebook # Rulebook, None to send every page to the llm
+        self.sites = sites # SiteSummaries: per-scope summaries for fast prompts + per-mode stats
+        self.scope = scope # the crawl's key in sites, see site_summary.site_scope
+        self.fast_prompts = fast_prompts
+        self.telemetry = telemetry or Telemetry() # per-page spans; without one they are only aggregated
+        self.deduplicator = deduplicator # SentenceDeduplicator for raw content, None keeps every sentence
+
+    def enqueue(self, url):
+        raise NotImplementedError
+
+    def requeue(self, url):
+        # a url already visited goes through process_page again
+        raise NotImplementedError
+
+    def page(self, url):
+        return Page(self, url)
+
+    def extraction(self, url, content, on_next_page=None, on_entry=None, mode="full", learn_site=True, trace=None):
+        return Extraction(self, url, content, on_next_page, on_entry, mode, learn_site, trace)
+
+    def chunk_content(self, prompt, chunk, index, total):
+        return prompt + chunk + get_chunk_note(index, total) + "\n\nBegin. "
+
+    def chunk_failed(self, url, index, total, exception, attempt, trace=None):
+        # seconds to wait before the chunk's next attempt, None to give up on it (a failed chunk costs only itself)
+        kind = classify(exception)
+        print(f"Chunk {index}/{total} attempt {attempt} failed for {url} ({kind or 'permanent'}): {exception}")
+        if kind is None or attempt == self.max_attempts:
+            print(f"Giving up chunk {index}/{total} of {url} after {attempt} attempts")
+            return None
+        if trace:
+            trace.count(retries=1)
+        return backoff(kind, attempt)
+
+    def pack_key(self, url, prompt, html, attempt):
+        # a small page's first attempt goes into a pack with others of its site
+        # returns the page's cache key, None to extract it alone
+        key = self.completion_cache.key(get_backend().model, PROMPT_VERSION, TEMPERATURE, prompt + html + "\n\nBegin. ")
+        if (self.packer is None or attempt > 1 or estimate_tokens(html) > PACK_PAGE_TOKENS
+                or (self.cache_read and self.completion_cache.contains(key))):
+            return None
+        return key
+
+    def use_packed(self, packed, mode, on_next_page, on_entry, trace):
+        # False if the pack failed for this page and it goes alone
+        if packed is None:
+            return False
+        entries, next_page, _ = packed
+        trace.mode = mode + "-packed"
+        trace.count(packed=1)
+        for entry in entries:
+            on_entry(entry)
+        if next_page and on_next_page:
+            on_next_page(next_page)
+        return True
+
+    def cache_packed(self, packed, key):
+        # the page's block replays like a completion of its own
+        if packed is not None and self.cache_write:
+            self.completion_cache.put(key, packed[2])
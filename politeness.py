@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# per-host scheduler in front of every fetch: FIFO queue per host, robots.txt crawl-delay,
+# and AIMD concurrency (add one slot per healthy round, halve on 429/503/errors/latency spikes)
+INITIAL_CONCURRENCY = 2
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 8 # never more than the http pool keeps per host
+BACKOFF_FACTOR = 0.5
+LATENCY_FACTOR = 2.0 # latency this far above the host's baseline counts as congestion
+LATENCY_ALPHA = 0.2 # ewma weight of the newest sample
+DEFAULT_BACKOFF = 30.0 # seconds to pause a host on 429/503 without Retry-After
+MAX_BACKOFF = 600.0
+THROTTLE_STATUSES = {429, 503}
+
+class HostState:
+    def __init__(self):
+        self.limit = float(INITIAL_CONCURRENCY)
+        self.active = 0
+        self.waiting = deque() # tickets in arrival order
+        self.wakers = {} # ticket of a coroutine blocked on its turn or a slot -> (loop, future)
+        self.next_allowed = 0.0 # monotonic time before which nothing starts
+        self.crawl_delay = 0.0
+        self.healthy = 0 # healthy responses since the last limit change
+        self.latency = None # ewma
+        self.baseline = None
+        self.last_decrease = 0.0
+        self.robots_loaded = threading.Event()
+        self.robots_loading = False
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Crawl-delay (and Request-rate) for our user agent group, falling back to "*"
+# urllib.robotparser only accepts integer delays, real robots.txt files use "0.5" too
+def parse_crawl_delay(text, user_agent="*"):
+    delays, agents, in_rules = {}, [], False
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = (part.strip() for part in line.split(":", 1))
+        field = field.lower()
+        if field == "user-agent":
+            if in_rules: # a new group starts
+                agents, in_rules = [], False
+            agents.append(value.lower())
+            continue
+        in_rules = True
+        delay = None
+        try:
+            if field == "crawl-delay":
+                delay = float(value)
+            elif field == "request-rate" and "/" in value:
+                requests, seconds = value.split("/", 1)
+                delay = float(seconds.rstrip("smh ")) / float(requests)
+        except ValueError:
+            continue
+        if delay is not None:
+            for agent in agents:
+                delays[agent] = max(delays.get(agent, 0.0), delay)
+    return delays.get(user_agent.lower(), delays.get("*"))
+
+def _resolve(future):
+    if not future.done(): # its waiter may have been cancelled meanwhile
+        future.set_result(None)
+
+class PolitenessScheduler:
+    def __init__(self, fetch_robots=None, user_agent="*"):
+        self.fetch_robots = fetch_robots # url -> robots.txt text or None
+        self.user_agent = user_agent
+        self.hosts = {}
+        self.cond = threading.Condition()
+
+    def _host(self, url):
+        netloc = urlparse(url).netloc.lower()
+        with self.cond:
+            if netloc not in self.hosts:
+                self.hosts[netloc] = HostState()
+            return netloc, self.hosts[netloc]
+
+    def _load_robots(self, url, host):
+        # first caller per host loads robots.txt, everyone else waits for it
+        with self.cond:
+            if host.robots_loaded.is_set():
+                return
+            first = not host.robots_loading
+            host.robots_loading = True
+        if not first:
+            host.robots_loaded.wait()
+            return
+        try:
+            text = self.fetch_robots(url) if self.fetch_robots else None
+            delay = parse_crawl_delay(text, self.user_agent) if text else None
+            if delay:
+                host.crawl_delay = min(delay, MAX_BACKOFF)
+                print(f"robots.txt for {urlparse(url).netloc}: crawl-delay {host.crawl_delay}s")
+        except Exception as exception:
+            print(f"Could not read robots.txt for {urlparse(url).netloc}: {exception}")
+        finally:
+            host.robots_loaded.set()
+
+    def _try_start(self, host, ticket):
+        # called with the lock held; 0 if the ticket may start now, seconds to wait for crawl-delay or
+        # Retry-After, None to wait for its turn or a free slot (_wake)
+        now = time.monotonic()
+        if host.waiting[0] is not ticket or host.active >= int(host.limit):
+            return None
+        if now < host.next_allowed:
+            return host.next_allowed - now
+        host.waiting.popleft()
+        host.active += 1
+        host.next_allowed = now + host.crawl_delay
+        self._wake(host) # the next ticket may fit in another slot
+        return 0
+
+    def _wake(self, host):
+        # called with the lock held: threads re-check on notify, the head's coroutine is resolved on its loop
+        self.cond.notify_all()
+        if host.waiting:
+            waker = host.wakers.pop(host.waiting[0], None)
+            if waker:
+                loop, future = waker
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def _leave(self, host, ticket):
+        # called with the lock held: a cancelled waiter gives up its place
+        host.wakers.pop(ticket, None)
+        if ticket in host.waiting:
+            head = host.waiting[0] is ticket
+            host.waiting.remove(ticket)
+            if head:
+                self._wake(host)
+
+    def acquire(self, url):
+        netloc, host = self._host(url)
+        self._load_robots(url, host)
+        ticket = object()
+        with self.cond:
+            host.waiting.append(ticket)
+            try:
+                while True:
+                    delay = self._try_start(host, ticket)
+                    if delay == 0:
+                        return netloc
+                    self.cond.wait(delay)
+            except BaseException:
+                self._leave(host, ticket)
+                raise
+
+    async def acquire_async(self, url):
+        netloc, host = self._host(url)
+        if not host.robots_loaded.is_set():
+            await asyncio.to_thread(self._load_robots, url, host)
+        ticket, loop = object(), asyncio.get_running_loop()
+        with self.cond:
+            host.waiting.append(ticket)
+        try:
+            while True:
+                with self.cond:
+                    delay = self._try_start(host, ticket)
+                    if delay is None:
+                        # registered under the lock, a release right after cannot be missed
+                        future = loop.create_future()
+                        host.wakers[ticket] = (loop, future)
+                if delay == 0:
+                    return netloc
+                if delay is None:
+                    await future
+                else:
+                    await asyncio.sleep(delay)
+        except BaseException:
+            with self.cond:
+                self._leave(host, ticket)
+            raise
+
+    def release(self, netloc, status=None, latency=None, retry_after=None):
+        # status None means the request never got a response (timeout, connection reset)
+        now = time.monotonic()
+        with self.cond:
+            host = self.hosts[netloc]
+            host.active -= 1
+            if status is None or status in THROTTLE_STATUSES or status >= 500:
+                pause = parse_retry_after(retry_after)
+                if pause is None and status in THROTTLE_STATUSES:
+                    pause = DEFAULT_BACKOFF
+                if pause:
+                    host.next_allowed = max(host.next_allowed, now + min(pause, MAX_BACKOFF))
+                    print(f"Backing off {netloc} for {min(pause, MAX_BACKOFF):.0f}s (status {status})")
+                self._decrease(host, now)
+            elif latency is not None:
+                self._observe_latency(host, latency, now)
+            self._wake(host)
+
+    def _observe_latency(self, host, latency, now):
+        host.latency = latency if host.latency is None else (
+            LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * host.latency
+        )
+        # baseline follows the best latency seen, drifting up slowly so it can adapt
+        host.baseline = host.latency if host.baseline is None else min(host.latency, host.baseline * 1.01)
+        if host.latency > LATENCY_FACTOR * host.baseline:
+            self._decrease(host, now)
+            return
+        host.healthy += 1
+        if host.healthy >= host.limit: # one healthy round trip per slot -> one more slot
+            host.limit = min(MAX_CONCURRENCY, host.limit + 1)
+            host.healthy = 0
+
+    def _decrease(self, host, now):
+        # at most once per observed round trip, one slow burst should not collapse the limit
+        if now - host.last_decrease < (host.latency or 1.0):
+            return
+        host.limit = max(MIN_CONCURRENCY, host.limit * BACKOFF_FACTOR)
+        host.healthy = 0
+        host.last_decrease = now
+
+    def limits(self):
+        with self.cond:
+            return {netloc: int(host.limit) for netloc, host in self.hosts.items()}
@@ -0,0 +1,131 @@
+import asyncio
+import re
+import threading
+import time
+
+# shared budget for llm calls: one bucket for requests/minute, one for tokens/minute
+# callers reserve an estimate before sending, settle with real usage afterwards,
+# and the provider's x-ratelimit-* headers pull the local view down to the server's
+MAX_WAIT_SLICE = 1.0
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount):
+        # seconds until `amount` is available; oversized requests only need a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate else MAX_WAIT_SLICE
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_reset(value):
+    # "1m30s" / "200ms" / "12" (seconds) / 1718000000000 (epoch ms, openrouter)
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+        if number > 1e12:
+            return max(0.0, number / 1000 - time.time())
+        if number > 1e9:
+            return max(0.0, number - time.time())
+        return number
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+class LLMRateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "waited_seconds": 0.0, "rate_limited": 0, "estimated": 0, "actual": 0}
+
+    def _try_take(self, estimate):
+        # lock held; 0 if reserved, else seconds to wait
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_for(1), self.tokens.wait_for(estimate))
+        if wait:
+            return wait
+        self.requests.tokens -= 1
+        self.tokens.tokens -= estimate
+        self.stats["calls"] += 1
+        self.stats["estimated"] += estimate
+        return 0.0
+
+    def acquire(self, estimate):
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                wait = self._try_take(estimate)
+            if not wait:
+                break
+            time.sleep(min(wait, MAX_WAIT_SLICE))
+        self._waited(started)
+
+    async def acquire_async(self, estimate):
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                wait = self._try_take(estimate)
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, MAX_WAIT_SLICE))
+        self._waited(started)
+
+    def _waited(self, started):
+        waited = time.monotonic() - started
+        with self.lock:
+            self.stats["waited_seconds"] += waited
+
+    def settle(self, estimate, actual):
+        # give back (or charge) the difference between the reservation and real usage
+        with self.lock:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + estimate - actual)
+            self.stats["actual"] += actual
+
+    def update_from_headers(self, headers):
+        # trust the provider's remaining counts when they are lower than ours
+        if not headers:
+            return
+        with self.lock:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                try:
+                    remaining = float(remaining) if remaining is not None else None
+                except ValueError:
+                    remaining = None
+                if remaining is None:
+                    continue
+                bucket.tokens = min(bucket.tokens, remaining)
+                if remaining < 1:
+                    reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}") or headers.get("x-ratelimit-reset"))
+                    if reset:
+                        self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+
+    def penalize(self, retry_after=None):
+        # got a 429 anyway: drain both buckets and hold everyone until the window resets
+        wait = parse_reset(retry_after) or 60.0 / max(self.requests.capacity, 1) * 5
+        with self.lock:
+            self.stats["rate_limited"] += 1
+            self.requests.tokens = min(self.requests.tokens, 0.0)
+            self.tokens.tokens = min(self.tokens.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+        print(f"LLM rate limited, pausing all calls for {wait:.1f}s")
@@ -0,0 +1,325 @@
+import html
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from inference import estimate_tokens
+
+# reduction pipeline run on every page before it is pasted into the prompt
+# keeps text, structure and links, drops everything the model never needs
+REDUCE_STEPS = (
+    "drop_tags",
+    "drop_comments",
+    "filter_attributes",
+    "trim_classes",
+    "resolve_links",
+    "drop_empty",
+    "collapse_whitespace",
+)
+
+DROP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "math", "canvas",
+    "iframe", "object", "embed", "video", "audio", "source", "track",
+    "link", "meta", "base", "input", "button",
+}
+# <link rel="next"> is some sites' only pagination signal, and select/option their page or letter picker
+KEEP_LINK_RELS = {"next", "prev", "previous"}
+KEEP_ATTRS = {"href", "id", "class", "lang", "title", "alt", "rel", "dir", "colspan", "rowspan", "value"}
+MAX_CLASSES = 2 # keep the first few classes, utility-class soup gets cut
+MAX_CLASS_LEN = 30
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "source", "track", "wbr",
+}
+KEEP_EMPTY_TAGS = {"br", "hr", "td", "th"} # structural even when empty
+# start tags that implicitly close an open sibling (<li>one<li>two)
+IMPLIED_END = {
+    "li": {"li"}, "p": {"p"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"},
+    "tr": {"tr", "td", "th"}, "td": {"td", "th"}, "th": {"td", "th"},
+}
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or []
+        self.children = []
+        self.parent = parent
+
+class Comment:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+class TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#root")
+        self.stack = [self.root]
+        self.base_href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "base" and self.base_href is None:
+            self.base_href = dict(attrs).get("href")
+        while len(self.stack) > 1 and self.stack[-1].tag in IMPLIED_END.get(tag, ()):
+            self.stack.pop()
+        node = Node(tag, attrs, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        # pop to the matching open tag, ignore stray end tags
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+    def handle_comment(self, data):
+        self.stack[-1].children.append(Comment(data))
+
+def parse_html(text):
+    builder = TreeBuilder()
+    builder.feed(text)
+    builder.close()
+    return builder.root, builder.base_href
+
+# serialize a node (or text) back to html
+def to_html(node):
+    out = []
+    _write(node, out)
+    return "".join(out)
+
+def _write(node, out):
+    if isinstance(node, str):
+        out.append(html.escape(node, quote=False))
+        return
+    if isinstance(node, Comment):
+        out.append(f"<!--{node.text}-->")
+        return
+    if node.tag != "#root":
+        out.append(_open_tag(node))
+        if node.tag in VOID_TAGS:
+            return
+    for child in node.children:
+        _write(child, out)
+    if node.tag != "#root":
+        out.append(f"</{node.tag}>")
+
+def _open_tag(node):
+    attrs = "".join(
+        f' {k}="{html.escape(v, quote=True)}"' if v is not None else f" {k}"
+        for k, v in node.attrs
+    )
+    return f"<{node.tag}{attrs}>"
+
+def text_content(node):
+    if isinstance(node, str):
+        return node
+    if isinstance(node, Comment):
+        return ""
+    return "".join(text_content(child) for child in node.children)
+
+# steps, each mutates the tree in place
+def _drop_tags(node, ctx):
+    node.children = [
+        child for child in node.children
+        if not (isinstance(child, Node) and child.tag in ctx["drop_tags"] and not _pagination_link(child))
+    ]
+    for child in node.children:
+        if isinstance(child, Node):
+            _drop_tags(child, ctx)
+
+def _pagination_link(node):
+    if node.tag != "link":
+        return False
+    rels = (dict(node.attrs).get("rel") or "").lower().split()
+    return any(rel in KEEP_LINK_RELS for rel in rels)
+
+def _drop_comments(node, ctx):
+    node.children = [child for child in node.children if not isinstance(child, Comment)]
+    for child in node.children:
+        if isinstance(child, Node):
+            _drop_comments(child, ctx)
+
+def _filter_attributes(node, ctx):
+    for child in _iter_nodes(node):
+        child.attrs = [(k, v) for k, v in child.attrs if k in ctx["keep_attrs"]]
+
+def _trim_classes(node, ctx):
+    for child in _iter_nodes(node):
+        trimmed = []
+        for k, v in child.attrs:
+            if k == "class" and v:
+                classes = [c for c in v.split() if len(c) <= ctx["max_class_len"]][:ctx["max_classes"]]
+                if not classes:
+                    continue
+                v = " ".join(classes)
+            trimmed.append((k, v))
+        child.attrs = trimmed
+
+def _resolve_links(node, ctx):
+    base = ctx["base_url"]
+    if not base:
+        return
+    for child in _iter_nodes(node):
+        resolved = []
+        for k, v in child.attrs:
+            if k == "href" and v:
+                v = v.strip()
+                if v.lower().startswith("javascript:"):
+                    continue
+                v = urljoin(base, v)
+            resolved.append((k, v))
+        child.attrs = resolved
+
+def _drop_empty(node, ctx):
+    kept = []
+    for child in node.children:
+        if isinstance(child, Node):
+            _drop_empty(child, ctx)
+            if not _is_empty(child):
+                kept.append(child)
+        else:
+            kept.append(child)
+    node.children = kept
+
+def _is_empty(node):
+    if node.tag in KEEP_EMPTY_TAGS:
+        return False
+    if node.tag == "img":
+        return not any(k == "alt" and v for k, v in node.attrs)
+    if any(k == "href" for k, _ in node.attrs):
+        return False
+    return not node.children or all(isinstance(c, str) and not c.strip() for c in node.children)
+
+WHITESPACE = re.compile(r"\s+")
+
+def _collapse_whitespace(node, ctx):
+    if node.tag == "pre":
+        return
+    collapsed = []
+    last = len(node.children) - 1
+    for i, child in enumerate(node.children):
+        if isinstance(child, str):
+            child = WHITESPACE.sub(" ", child)
+            if child == " " and (i == 0 or i == last):
+                # leading/trailing whitespace-only text carries no content
+                continue
+            collapsed.append(child)
+        else:
+            _collapse_whitespace(child, ctx)
+            collapsed.append(child)
+    node.children = collapsed
+
+STEPS = {
+    "drop_tags": _drop_tags,
+    "drop_comments": _drop_comments,
+    "filter_attributes": _filter_attributes,
+    "trim_classes": _trim_classes,
+    "resolve_links": _resolve_links,
+    "drop_empty": _drop_empty,
+    "collapse_whitespace": _collapse_whitespace,
+}
+
+def _iter_nodes(node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(child for child in current.children if isinstance(child, Node))
+
+def reduce_tree(root, base_url=None, steps=REDUCE_STEPS, drop_tags=DROP_TAGS, keep_attrs=KEEP_ATTRS,
+                max_classes=MAX_CLASSES, max_class_len=MAX_CLASS_LEN, savings=None, tokens=None):
+    # savings: step -> tokens it saved, added to when given (tokens: the page's before the first step);
+    # measuring serializes the tree after every step
+    ctx = {
+        "base_url": base_url,
+        "drop_tags": drop_tags,
+        "keep_attrs": keep_attrs,
+        "max_classes": max_classes,
+        "max_class_len": max_class_len,
+    }
+    for step in steps:
+        STEPS[step](root, ctx)
+        if savings is not None:
+            tokens = _saved(savings, step, tokens, to_html(root))
+    return root
+
+def _saved(savings, step, before, text):
+    after = estimate_tokens(text)
+    savings[step] = savings.get(step, 0) + before - after
+    return after
+
+# tree_hook(root) runs on the reduced tree before it is serialized (boilerplate.py), its savings count as "hook"
+# resolving links adds tokens, so its savings are negative: the steps add up to the whole reduction
+def reduce_html(text, base_url=None, tree_hook=None, savings=None, **options):
+    root, base_href = parse_html(text)
+    if base_url and base_href:
+        base_url = urljoin(base_url, base_href) # honour <base href> for relative links
+    page = {} if savings is not None else None
+    tokens = estimate_tokens(text)
+    reduce_tree(root, base_url, savings=page, tokens=tokens, **options)
+    if tree_hook:
+        tree_hook(root)
+    reduced = to_html(root).strip()
+    if savings is not None:
+        _saved(page, "hook", tokens - sum(page.values()), reduced)
+        for step, saved in page.items():
+            savings[step] = savings.get(step, 0) + saved
+    return reduced
+
+# split reduced html at element boundaries so every chunk stays under max_tokens
+# oversized elements are split recursively, each piece re-wrapped in its ancestors' tags
+def split_html(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    root, _ = parse_html(text)
+    chunks = []
+    _split_children(root, [], max_tokens, chunks)
+
+    # descending leaves small fragments (headers, pagination), fold them into neighbours
+    merged = []
+    for chunk in chunks:
+        if merged and estimate_tokens(merged[-1]) + estimate_tokens(chunk) <= max_tokens:
+            merged[-1] += chunk
+        else:
+            merged.append(chunk)
+    return merged or [text]
+
+def _split_children(node, ancestors, max_tokens, chunks):
+    opening = "".join(_open_tag(a) for a in ancestors)
+    closing = "".join(f"</{a.tag}>" for a in reversed(ancestors))
+    budget = max_tokens - estimate_tokens(opening + closing)
+    pieces, size = [], 0
+
+    def flush():
+        nonlocal pieces, size
+        if pieces:
+            chunks.append(opening + "".join(pieces) + closing)
+        pieces, size = [], 0
+
+    for child in node.children:
+        piece = to_html(child)
+        tokens = estimate_tokens(piece)
+        if tokens > budget and isinstance(child, Node) and child.children and child.tag not in VOID_TAGS:
+            # element alone is too big, descend into it
+            flush()
+            _split_children(child, ancestors + [child], max_tokens, chunks)
+            continue
+        if size + tokens > budget:
+            flush()
+        pieces.append(piece)
+        size += tokens
+    flush()
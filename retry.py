@@ -0,0 +1,55 @@
+import random
+
+import requests
+
+from scrape import FetchError
+
+try:
+    import aiohttp
+except ImportError: # only the async engine needs it
+    aiohttp = None
+
+try:
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+except ImportError: # only the http llm backends need the sdk
+    APIConnectionError = APIStatusError = RateLimitError = None
+
+# page retries: how a failed stage is retried. the error class sets the backoff, permanent errors
+# (404, a request the model endpoint rejects) are not retried at all
+# waits are full jitter, uniform up to the exponential step, so pages that failed together spread out
+BACKOFF = { # error class -> (first step, cap) in seconds
+    "parse": (0.0, 0.0), # an unusable completion, the next sample is independent of it
+    "connection": (1.0, 20.0),
+    "server": (2.0, 60.0), # 5xx from the site or the model endpoint
+    "rate_limit": (10.0, 120.0), # 429s that outlasted the politeness scheduler / the llm limiter
+}
+RETRY_STATUS = {408, 425, 500, 502, 503, 504}
+
+_CONNECTION = tuple(t for t in (ConnectionError, TimeoutError, requests.RequestException,
+                                aiohttp and aiohttp.ClientError, APIConnectionError) if t)
+
+def classify(exception):
+    # error class of a failed attempt, None if another attempt cannot help
+    if RateLimitError and isinstance(exception, RateLimitError):
+        return "rate_limit"
+    status = None
+    if isinstance(exception, FetchError):
+        status = exception.status
+    elif APIStatusError and isinstance(exception, APIStatusError):
+        status = exception.status_code
+    elif aiohttp and isinstance(exception, aiohttp.ClientResponseError):
+        status = exception.status
+    if status is not None:
+        if status == 429:
+            return "rate_limit"
+        return "server" if status in RETRY_STATUS or status >= 500 else None
+    if isinstance(exception, _CONNECTION):
+        return "connection"
+    if isinstance(exception, ValueError): # no parsable corpus, bad json
+        return "parse"
+    return "server" # unknown failure: retry, but not right away
+
+def backoff(kind, attempt):
+    # seconds to wait before attempt + 1
+    first, cap = BACKOFF[kind]
+    return random.uniform(0, min(cap, first * 2 ** (attempt - 1)))
@@ -0,0 +1,321 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl
+
+from reduce import Node, parse_html, text_content, split_html, WHITESPACE
+from inference import get_rule_induction_prompt, extract_rules_from_response
+
+# per-template extraction rules: the llm writes css selectors once, later pages replay them locally
+# a page the rules don't explain well enough goes through the llm as before
+RULES_PATH = Path("cache") / "rules.json"
+RULE_SAMPLE_TOKENS = 12000 # html shown to the model when inducing, the first chunk of the page
+RULE_SAMPLE_ENTRIES = 8 # extracted entries shown alongside, so the model sees the mapping
+RULE_MIN_AGREEMENT = 0.9 # share of the llm's entries the rules must reproduce on the induction page
+RULE_MIN_VALID = 0.9 # share of replayed entries that must be complete (word + a translation)
+RULE_COVERAGE_SLACK = 0.5 # replayed text coverage may drop to this fraction of the induction page's
+RULE_MAX_ATTEMPTS = 2 # inductions per template before it stays on the llm
+RULE_MAX_FALLBACKS = 3 # consecutive replay failures before the rules are dropped and re-induced
+
+# css subset, enough for the templates dictionary sites use
+_SIMPLE = re.compile(r"""
+    (?P<tag>[a-zA-Z][\w-]*|\*)
+  | \.(?P<cls>[\w-]+)
+  | \#(?P<id>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[*^$]?=)\s*["']?(?P<value>[^"'\]]*)["']?\s*)?\]
+  | :(?P<nth>nth-child|nth-of-type)\(\s*(?P<n>\d+)\s*\)
+  | :(?P<pseudo>first-child|last-child|first-of-type|last-of-type)
+""", re.X)
+
+def _compile_compound(text):
+    tests, pos = [], 0
+    while pos < len(text):
+        match = _SIMPLE.match(text, pos)
+        if not match:
+            raise ValueError(f"unsupported selector: {text!r}")
+        tests.append(match)
+        pos = match.end()
+    return tests
+
+def compile_selector(selector):
+    # "ul.words > li, div.entry" -> [[(combinator, compound), ...], ...] per alternative
+    alternatives = []
+    for part in selector.split(","):
+        steps, combinator = [], " "
+        for token in re.split(r"\s*(>)\s*|\s+", part.strip()):
+            if not token:
+                continue
+            if token == ">":
+                combinator = ">"
+                continue
+            steps.append((combinator, _compile_compound(token)))
+            combinator = " "
+        if steps:
+            alternatives.append(steps)
+    return alternatives
+
+def _siblings(node, same_type):
+    if node.parent is None:
+        return [node]
+    return [c for c in node.parent.children if isinstance(c, Node) and (not same_type or c.tag == node.tag)]
+
+def _matches(node, tests):
+    attrs = dict(node.attrs)
+    for test in tests:
+        if test["tag"]:
+            if test["tag"] != "*" and node.tag != test["tag"].lower():
+                return False
+        elif test["cls"]:
+            if test["cls"] not in (attrs.get("class") or "").split():
+                return False
+        elif test["id"]:
+            if attrs.get("id") != test["id"]:
+                return False
+        elif test["attr"]:
+            if test["attr"].lower() not in attrs:
+                return False
+            value, op, expected = attrs[test["attr"].lower()] or "", test["op"], test["value"]
+            if op == "=" and value != expected or op == "*=" and expected not in value \
+                    or op == "^=" and not value.startswith(expected) or op == "$=" and not value.endswith(expected):
+                return False
+        elif test["nth"]:
+            siblings = _siblings(node, test["nth"] == "nth-of-type")
+            if siblings.index(node) + 1 != int(test["n"]):
+                return False
+        elif test["pseudo"]:
+            siblings = _siblings(node, test["pseudo"].endswith("of-type"))
+            if siblings[0 if test["pseudo"].startswith("first") else -1] is not node:
+                return False
+    return True
+
+def _matches_steps(node, steps, scope):
+    # right to left: node matches the last compound, its ancestors (up to scope) the rest
+    combinator, tests = steps[-1]
+    if not _matches(node, tests):
+        return False
+    if len(steps) == 1:
+        return True
+    parent = node.parent
+    while parent is not None and parent is not scope:
+        if _matches_steps(parent, steps[:-1], scope):
+            return True
+        if combinator == ">":
+            return False
+        parent = parent.parent
+    return False
+
+def select(scope, selector):
+    # descendants of scope matching selector, in document order
+    alternatives = compile_selector(selector)
+    found = []
+    stack = [child for child in reversed(scope.children) if isinstance(child, Node)]
+    while stack:
+        node = stack.pop()
+        if any(_matches_steps(node, steps, scope) for steps in alternatives):
+            found.append(node)
+        stack.extend(child for child in reversed(node.children) if isinstance(child, Node))
+    return found
+
+def extract(scope, spec):
+    # first match's text (or @attr value), None if nothing matched
+    if spec is None:
+        return None
+    selector, _, attr = spec.partition("@")
+    selector = selector.strip()
+    if selector in ("", ":scope"):
+        node = scope
+    else:
+        matches = select(scope, selector)
+        if not matches:
+            return None
+        node = matches[0]
+    if attr:
+        return dict(node.attrs).get(attr.strip())
+    text = WHITESPACE.sub(" ", text_content(node)).strip()
+    return text or None
+
+def template_key(url, target_languages):
+    # pages of one template share host, path shape and query parameter names
+    p = urlparse(url)
+    path = re.sub(r"\d+", "0", p.path)
+    params = ",".join(sorted({key for key, _ in parse_qsl(p.query, keep_blank_values=True)}))
+    return f"{target_languages or ''}|{p.netloc}{path}?{params}"
+
+def _norm(text):
+    return WHITESPACE.sub(" ", str(text or "")).strip().casefold()
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+
+def apply_rules(rules, html, dictionary_mode):
+    # returns (entries, next_page, valid_share, coverage)
+    root, _ = parse_html(html)
+    entries, valid = [], 0
+    if dictionary_mode:
+        example = rules.get("example") or {}
+        for node in select(root, rules["entry"]):
+            word = extract(node, rules["word"])
+            translations = {lang: extract(node, spec) for lang, spec in (rules.get("translations") or {}).items()}
+            examples = []
+            if example.get("container"):
+                for block in select(node, example["container"]):
+                    fields = {lang: extract(block, spec) for lang, spec in (example.get("fields") or {}).items()}
+                    if any(fields.values()):
+                        examples.append(fields)
+            if not word:
+                continue
+            valid += any(translations.values())
+            entries.append((word, {"translations": translations, "example_sentences": examples}))
+    else:
+        for node in select(root, rules["sentence"]):
+            sentence = extract(node, "")
+            if sentence:
+                entries.append(sentence)
+                valid += 1
+    next_page = extract(root, rules.get("next_page")) if rules.get("next_page") else None
+
+    page_text = len(_norm(text_content(root))) or 1
+    extracted = sum(len(_norm(text)) for text in _strings(entries))
+    return entries, next_page, valid / max(len(entries), 1), min(1.0, extracted / page_text)
+
+def agreement(rule_entries, llm_entries, dictionary_mode):
+    # share of the llm's entries the rules reproduced (word + a matching translation / the sentence)
+    if not llm_entries:
+        return 0.0
+    if dictionary_mode:
+        produced = {_norm(word): entry for word, entry in rule_entries}
+        hits = 0
+        for word, entry in llm_entries:
+            mine = produced.get(_norm(word))
+            if mine is None:
+                continue
+            theirs = {lang: _norm(text) for lang, text in ((entry or {}).get("translations") or {}).items() if text}
+            ours = {lang: _norm(text) for lang, text in mine["translations"].items() if text}
+            # the model may trim or reword a little, containment is close enough
+            if not theirs or any(t and o and (t in o or o in t) for t in theirs.values() for o in ours.values()):
+                hits += 1
+        return hits / len(llm_entries)
+    text = " ".join(_norm(sentence) for sentence in rule_entries)
+    return sum(1 for sentence in llm_entries if _norm(sentence) in text) / len(llm_entries)
+
+class Rulebook:
+    def __init__(self, path=RULES_PATH):
+        self.path = Path(path) if path else None
+        self.lock = threading.Lock()
+        self.rules = {} # template -> rules (+ "coverage" seen at induction)
+        self.attempts = {}
+        self.fallbacks = {}
+        self.inducing = set()
+        self.stats = {"replayed": 0, "fallbacks": 0, "induced": 0, "rejected": 0}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    self.rules = json.load(fh)
+            except ValueError:
+                self.rules = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = str(self.path) + f".{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.rules, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def replay(self, url, html, target_languages):
+        # (entries, next_page) from the template's rules, None -> send the page to the llm
+        key = template_key(url, target_languages)
+        with self.lock:
+            rules = self.rules.get(key)
+        if rules is None:
+            return None
+        try:
+            entries, next_page, valid, coverage = apply_rules(rules, html, bool(target_languages))
+        except (KeyError, ValueError, TypeError) as exception:
+            entries, next_page, valid, coverage = [], None, 0.0, 0.0
+            print(f"Rules for {key} broke on {url}: {exception}")
+
+        covered = entries and valid >= RULE_MIN_VALID and coverage >= rules.get("coverage", 0.0) * RULE_COVERAGE_SLACK
+        # no next_page from the rules could also be the end of a letter, only the llm sees the whole site
+        ok = covered and next_page
+        with self.lock:
+            if ok:
+                self.fallbacks[key] = 0
+                self.stats["replayed"] += 1
+            else:
+                self.stats["fallbacks"] += 1
+            if not covered:
+                self.fallbacks[key] = self.fallbacks.get(key, 0) + 1
+                if self.fallbacks[key] >= RULE_MAX_FALLBACKS and key in self.rules:
+                    print(f"Rules for {key} keep missing, dropping them")
+                    del self.rules[key]
+                    self.fallbacks[key] = 0
+                    self._save()
+        if not covered:
+            print(f"Rules did not cover {url} ({len(entries)} entries, {valid:.0%} complete, "
+                  f"coverage {coverage:.0%}), falling back to the llm")
+            return None
+        if not ok:
+            print(f"Rules found no next page on {url}, letting the llm decide where the crawl goes")
+            return None
+        print(f"Replayed rules on {url}: {len(entries)} entries without the llm")
+        return entries, next_page
+
+    def claim(self, url, target_languages):
+        # True if the caller should induce rules for this page's template now (one caller at a time)
+        key = template_key(url, target_languages)
+        with self.lock:
+            if key in self.rules or key in self.inducing or self.attempts.get(key, 0) >= RULE_MAX_ATTEMPTS:
+                return False
+            self.inducing.add(key)
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            return True
+
+    def induce(self, url, html, llm_entries, complete, source_language, target_languages):
+        # after claim(): ask the model for selectors, keep them if they reproduce its own extraction
+        key = template_key(url, target_languages)
+        dictionary_mode = bool(target_languages)
+        try:
+            sample = split_html(html, RULE_SAMPLE_TOKENS)[0]
+            sample_text = _norm(text_content(parse_html(sample)[0]))
+            # only entries the model can see in the sample count
+            visible = [e for e in llm_entries if _norm(e[0] if dictionary_mode else e) in sample_text]
+            if not visible:
+                return False
+            prompt = get_rule_induction_prompt(source_language, target_languages, visible[:RULE_SAMPLE_ENTRIES])
+            rules = extract_rules_from_response(complete(prompt + sample))
+            if not isinstance(rules, dict) or not rules.get("entry" if dictionary_mode else "sentence"):
+                print(f"No usable rules for {key}")
+                with self.lock:
+                    self.stats["rejected"] += 1
+                return False
+            entries, _, _, coverage = apply_rules(rules, sample, dictionary_mode)
+            score = agreement(entries, visible, dictionary_mode)
+            if score < RULE_MIN_AGREEMENT:
+                print(f"Rules for {key} reproduce only {score:.0%} of the extraction, staying on the llm")
+                with self.lock:
+                    self.stats["rejected"] += 1
+                return False
+            rules["coverage"] = coverage
+            with self.lock:
+                self.rules[key] = rules
+                self.stats["induced"] += 1
+                self._save()
+            print(f"Induced rules for {key} ({score:.0%} agreement), replaying them on the rest of the template")
+            return True
+        except Exception as exception:
+            print(f"Rule induction failed for {key}: {exception}")
+            return False
+        finally:
+            with self.lock:
+                self.inducing.discard(key)
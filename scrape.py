@@ -1,14 +1,67 @@
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
+import hashlib
 import html
+import json
+import os
+import threading
+import time
+from pathlib import Path
 
 import unicodedata
 
+from reduce import reduce_html
+from boilerplate import BoilerplateDetector
+from politeness import PolitenessScheduler, THROTTLE_STATUSES
+from inference import estimate_tokens
+
 HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36",
+    "Accept-Encoding": DEFAULT_ACCEPT_ENCODING, # gzip/deflate (+br when brotli is installed)
 }
 
+# http pool
+POOL_HOSTS = 32 # hosts kept warm in the pool
+POOL_PER_HOST = 8 # keep-alive connections per host, requests beyond this wait for a free one
+FETCH_TIMEOUT = (10, 60) # connect, read (seconds)
+
+# on-disk page cache, revalidated with ETag/Last-Modified
+PAGE_CACHE = True
+PAGE_CACHE_DIR = Path("cache") / "pages"
+
+# drop header/nav/sidebar/footer blocks a host repeats on every page, see boilerplate.py
+STRIP_BOILERPLATE = True
+
+session = requests.Session()
+session.headers.update(HEADERS)
+_adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST, pool_block=True)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+class FetchError(Exception):
+    def __init__(self, url, status):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+def _fetch_robots(url):
+    p = urlparse(url)
+    response = session.get(f"{p.scheme}://{p.netloc}/robots.txt", timeout=FETCH_TIMEOUT)
+    return response.text if response.status_code == 200 else None
+
+# every fetch (both engines) goes through the per-host politeness scheduler
+scheduler = PolitenessScheduler(fetch_robots=_fetch_robots)
+
+FETCH_STATS = {"requests": 0, "cache_hits": 0, "cache_misses": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+
+boilerplate = BoilerplateDetector() # state per crawl scope and host, shared by both engines
+
+# running totals for the reduction stage, across all pages
+REDUCTION_STATS = {"pages": 0, "tokens_before": 0, "tokens_after": 0, "steps": {}} # steps: reduce.py step -> tokens saved
+STATS_LOCK = threading.Lock()
+
 def normalize_url(raw):
     raw = html.unescape(raw.strip())
     p = urlparse(raw)
@@ -22,7 +75,138 @@ def normalize_url(raw):
     query = urlencode(sorted(parse_qsl(p.query, keep_blank_values=True)), doseq=True)
     return urlunparse((p.scheme.lower(), p.netloc.lower(), path, "", query, ""))
 
-def scrape_url(url):
-    response = requests.get(url, headers=HEADERS)
-    text = unicodedata.normalize("NFKC", response.text)
-    return text
\ No newline at end of file
+def _count(**deltas):
+    with STATS_LOCK:
+        for name, delta in deltas.items():
+            FETCH_STATS[name] += delta
+
+def get_fetch_stats():
+    with STATS_LOCK:
+        return dict(FETCH_STATS)
+
+def _cache_paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    base = PAGE_CACHE_DIR / key[:2] / key
+    return base.with_suffix(".json"), base.with_suffix(".html")
+
+def _load_cached(url):
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        with open(body_path, "r", encoding="utf-8") as fh:
+            return meta, fh.read()
+    except (FileNotFoundError, ValueError):
+        return None, None
+
+def _store_cached(url, meta, text):
+    meta_path, body_path = _cache_paths(url)
+    meta_path.parent.mkdir(parents=True, exist_ok=True)
+    suffix = f".{threading.get_ident()}.tmp"
+    with open(str(body_path) + suffix, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    with open(str(meta_path) + suffix, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+    os.replace(str(body_path) + suffix, body_path)
+    os.replace(str(meta_path) + suffix, meta_path)
+
+# shared by the threaded and async fetchers
+def prepare_request(url):
+    # returns (meta, cached_text, conditional headers) for a url
+    meta, cached_text = _load_cached(url) if PAGE_CACHE else (None, None)
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    return meta, cached_text, headers
+
+def finish_request(url, meta, cached_text, status, headers, body_size, text, final_url, strict=False):
+    # records stats, serves 304s from disk, stores fresh 200s; returns (text, final_url)
+    # strict: 4xx raise too (crawled pages still go to the llm, some sites serve content with a 404)
+    _count(requests=1)
+    if status in THROTTLE_STATUSES or status >= 500:
+        # host is overloaded or rate limiting us, don't pay the llm for an error page
+        raise FetchError(url, status)
+    if strict and 400 <= status < 500:
+        raise FetchError(url, status)
+    if status == 304 and meta:
+        _count(cache_hits=1, bytes_saved=meta.get("size", 0))
+        return cached_text, meta.get("final_url") or url
+
+    _count(cache_misses=1, bytes_downloaded=body_size)
+    etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+    if PAGE_CACHE and status == 200 and (etag or last_modified):
+        _store_cached(url, {
+            "final_url": final_url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": body_size,
+        }, text)
+    return text, final_url or url
+
+# fetch through the pooled session, returns (text, final_url)
+# a cached copy is revalidated with a conditional GET, 304 -> served from disk
+def fetch(url, strict=False):
+    meta, cached_text, headers = prepare_request(url)
+    netloc = scheduler.acquire(url)
+    status, retry_after, started = None, None, time.monotonic()
+    try:
+        response = session.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+        status, retry_after = response.status_code, response.headers.get("Retry-After")
+    finally:
+        scheduler.release(netloc, status, time.monotonic() - started, retry_after)
+    return finish_request(
+        url, meta, cached_text, response.status_code, response.headers,
+        len(response.content), response.text, response.url, strict,
+    )
+
+# pagination inference checks predicted pages with this before enqueueing them
+def probe_page(url, reference=None, scope=None):
+    # True if url serves a page of its own: not an error, not a redirect elsewhere, not a copy of reference
+    # scope: the crawl's site_summary.site_scope, whose boilerplate the reference was stripped of
+    try:
+        raw, final_url = fetch(url, strict=True)
+    except (FetchError, requests.RequestException):
+        return False
+    if normalize_url(final_url) != normalize_url(url):
+        return False
+    if reference is None:
+        return True
+    text = unicodedata.normalize("NFKC", raw)
+    if text == reference:
+        return False
+    # the reference went through reduce_page, stripped of the host's boilerplate once that was learned;
+    # it may have been reduced while the host was still learning, so the unstripped reduction counts too
+    reductions = {reduce_html(text, base_url=final_url)}
+    if STRIP_BOILERPLATE:
+        reductions.add(reduce_html(text, base_url=final_url,
+                                   tree_hook=lambda root: boilerplate.strip(final_url or url, root, scope)))
+    return reference not in reductions
+
+def reduce_page(url, raw, final_url, reduce=True, scope=None):
+    text = unicodedata.normalize("NFKC", raw)
+    if not reduce:
+        return text
+
+    # strip markup the model never needs, resolve links against the final (redirected) url
+    hook = (lambda root: boilerplate.process(final_url or url, root, scope)) if STRIP_BOILERPLATE else None
+    savings = {}
+    reduced = reduce_html(text, base_url=final_url, tree_hook=hook, savings=savings)
+    before, after = estimate_tokens(text), estimate_tokens(reduced)
+    with STATS_LOCK:
+        REDUCTION_STATS["pages"] += 1
+        REDUCTION_STATS["tokens_before"] += before
+        REDUCTION_STATS["tokens_after"] += after
+        steps = REDUCTION_STATS["steps"]
+        for step, saved in savings.items():
+            step = "boilerplate" if step == "hook" else step
+            steps[step] = steps.get(step, 0) + saved
+    saved = before - after
+    print(f"Reduced {url}: {before} -> {after} tokens (saved {saved}, {100 * saved / max(before, 1):.1f}%)")
+    return reduced
+
+def scrape_url(url, reduce=True):
+    raw, final_url = fetch(url)
+    return reduce_page(url, raw, final_url, reduce)
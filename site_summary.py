@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from inference import extract_site_summary_from_response, extract_chain_of_thought_from_response
+
+# two-phase prompting: the first pages of a crawl scope get the full reasoning prompt, its site_summary
+# is kept per scope and later pages get the short prompt built around it
+SITES_PATH = Path("cache") / "sites.json"
+FULL_PAGES = 2 # full-prompt pages per scope before switching to fast mode
+FAST_FAILURES = 2 # fast-prompt responses in a row that did not parse before the summary is dropped
+SUMMARY_MAX_CHARS = 3000 # a chain of thought used as a fallback summary is cut to this
+
+def site_scope(start_url, source_language, target_languages=None):
+    # one host serves many unrelated dictionaries and translations (webonary, wiktionary, bible.is):
+    # a summary belongs to the seed's host and directory and the language pair, not the whole host
+    parsed = urlparse(start_url)
+    prefix = parsed.path[:parsed.path.rfind("/") + 1] or "/"
+    return f"{parsed.netloc.lower()}{prefix} {source_language} -> {target_languages or 'raw content'}"
+
+class SiteSummaries:
+    def __init__(self, path=SITES_PATH, full_pages=FULL_PAGES, fast_failures=FAST_FAILURES):
+        self.path = Path(path) if path else None
+        self.full_pages = full_pages
+        self.fast_failures = fast_failures
+        self.lock = threading.Lock()
+        self.sites = {} # site_scope() -> {"full_pages": n, "summary": text}
+        self.failures = {} # site_scope() -> fast-prompt responses in a row that did not parse
+        # per prompt mode: pages, output tokens and wall-clock seconds of uncached completions
+        self.modes = {mode: {"pages": 0, "output_tokens": 0, "seconds": 0.0} for mode in ("full", "fast")}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    self.sites = json.load(fh)
+            except ValueError:
+                self.sites = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = str(self.path) + f".{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.sites, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def summary(self, scope):
+        # the scope's summary once enough full pages were seen, else None (-> full prompt)
+        with self.lock:
+            site = self.sites.get(scope)
+            if site and site["full_pages"] >= self.full_pages and site.get("summary"):
+                return site["summary"]
+        return None
+
+    def learn(self, scope, response):
+        # from a full-prompt response; the latest summary wins, it has seen the most of the site
+        summary = extract_site_summary_from_response(response)
+        if not summary:
+            summary = (extract_chain_of_thought_from_response(response) or "").strip()[:SUMMARY_MAX_CHARS]
+        with self.lock:
+            site = self.sites.setdefault(scope, {"full_pages": 0, "summary": None})
+            site["full_pages"] += 1
+            if summary:
+                site["summary"] = summary
+            if site["full_pages"] == self.full_pages:
+                print(f"Switching {scope} to fast prompts")
+            self._save()
+
+    def parsed(self, scope, ok):
+        # outcome of a fast-prompt response: once they keep failing to parse the summary is misleading
+        # the model, it is dropped and the scope learns a new one from full prompts
+        with self.lock:
+            if ok:
+                self.failures.pop(scope, None)
+                return
+            self.failures[scope] = self.failures.get(scope, 0) + 1
+            if self.failures[scope] < self.fast_failures or scope not in self.sites:
+                return
+            del self.failures[scope]
+            del self.sites[scope]
+            print(f"Fast prompts keep failing for {scope}, back to full prompts")
+            self._save()
+
+    def record(self, mode, output_tokens, started):
+        with self.lock:
+            stats = self.modes[mode]
+            stats["pages"] += 1
+            stats["output_tokens"] += output_tokens
+            stats["seconds"] += time.monotonic() - started
+
+    def report(self):
+        lines = []
+        with self.lock:
+            for mode, stats in self.modes.items():
+                if stats["pages"]:
+                    lines.append(f"{mode} prompts: {stats['pages']} completions, "
+                                 f"{stats['output_tokens'] / stats['pages']:.0f} output tokens and "
+                                 f"{stats['seconds'] / stats['pages']:.1f}s per completion")
+        return lines
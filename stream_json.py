@@ -0,0 +1,191 @@
+import json
+import re
+
+WHITESPACE = " \t\r\n"
+SECTIONS = ("chain_of_thought", "site_summary", "next_page", "json", "rules") # tags the prompts ask for
+_OPEN = re.compile("<(" + "|".join(SECTIONS) + ")>")
+_LONGEST_OPEN = max(len(name) for name in SECTIONS) + 2
+
+# incremental parser for the {"corpus": ...} object inside <json>...</json>
+# feed() it text as it streams in; every corpus element is handed to on_entry the moment it closes:
+#   dict corpus -> on_entry((word, entry)), list corpus -> on_entry(sentence)
+# a broken tail only loses the element that was open, everything before it was already emitted
+class CorpusStreamParser:
+    def __init__(self, on_entry=None):
+        self.on_entry = on_entry
+        self.entries = 0
+        self.errors = 0 # elements that closed but were not valid json, skipped
+        self.kind = None # dict or list once the corpus container opens
+        self.corpus_closed = False
+        self.done = False # top-level object closed
+
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+        self.expect_key = False # at depth 1, next string is a key
+        self.key_start = None
+        self.last_key = None
+        self.corpus_next = False # saw "corpus": waiting for its container
+        self.element_start = None
+
+    def feed(self, text):
+        if self.done:
+            return
+        self.buf += text
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.key_start is not None:
+                        self.last_key = buf[self.key_start:i + 1]
+                        self.key_start = None
+                i += 1
+                continue
+
+            if self.kind is not None and not self.corpus_closed and self.depth == 2:
+                # between/inside elements of the corpus container
+                if self.element_start is None and ch not in WHITESPACE and ch != ",":
+                    if ch in "}]":
+                        self.corpus_closed = True
+                        self.depth -= 1
+                        i += 1
+                        continue
+                    self.element_start = i
+                elif self.element_start is not None and ch in ",}]":
+                    self._emit(buf[self.element_start:i])
+                    self.element_start = None
+                    if ch in "}]":
+                        self.corpus_closed = True
+                        self.depth -= 1
+                    i += 1
+                    continue
+
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1 and self.expect_key:
+                    self.key_start = i
+                    self.expect_key = False
+            elif ch in "{[":
+                self.depth += 1
+                if self.depth == 1:
+                    self.expect_key = ch == "{"
+                elif self.depth == 2 and self.corpus_next:
+                    self.kind = dict if ch == "{" else list
+                    self.corpus_next = False
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    break
+            elif ch == ":" and self.depth == 1:
+                self.corpus_next = self.last_key == '"corpus"' and self.kind is None
+            elif ch == "," and self.depth == 1:
+                self.expect_key = True
+                self.corpus_next = False
+            i += 1
+
+        # drop everything before the open element, the buffer stays element-sized
+        keep = self.element_start if self.element_start is not None else i
+        if self.key_start is not None:
+            keep = min(keep, self.key_start)
+        self.buf = buf[keep:]
+        self.pos = i - keep
+        if self.element_start is not None:
+            self.element_start -= keep
+        if self.key_start is not None:
+            self.key_start -= keep
+
+    def _emit(self, raw):
+        try:
+            if self.kind is dict:
+                item = next(iter(json.loads("{" + raw + "}").items()))
+            else:
+                item = json.loads("[" + raw + "]")[0]
+        except (ValueError, StopIteration):
+            self.errors += 1
+            return
+        self.entries += 1
+        if self.on_entry:
+            self.on_entry(item)
+
+# single pass over a streamed response: finds where each <tag>...</tag> section opens and closes
+# without rereading what came before, so a long response costs linear time however it is chunked
+# closed sections land in .sections and go to on_section(name, text), first occurrence wins;
+# sections named in streamed go to on_data(name, text) piece by piece instead (and are not kept)
+# tags are only looked for outside other sections, a <json> mentioned in the reasoning does not count
+class ResponseScanner:
+    def __init__(self, on_section=None, on_data=None, streamed=()):
+        self.on_section = on_section
+        self.on_data = on_data
+        self.streamed = set(streamed)
+        self.sections = {} # name -> text (None for streamed sections) once closed
+        self.open = None
+        self.parts = []
+        self.pending = "" # unresolved tail, at most a tag long
+
+    def feed(self, text):
+        pending = self.pending + text
+        while pending:
+            if self.open is None:
+                match = _OPEN.search(pending)
+                if match is None:
+                    # keep a possible partial opening tag at the end, drop the rest
+                    start = pending.rfind("<", max(0, len(pending) - _LONGEST_OPEN + 1))
+                    pending = pending[start:] if start >= 0 else ""
+                    break
+                self.open = match.group(1)
+                pending = pending[match.end():]
+                continue
+
+            close = f"</{self.open}>"
+            end = pending.find(close)
+            if end < 0:
+                # everything but a possible partial closing tag is section content
+                safe = len(pending) - len(close) + 1
+                start = pending.find("<", max(0, safe))
+                safe = start if start >= 0 else len(pending)
+                if safe > 0:
+                    self._content(pending[:safe])
+                    pending = pending[safe:]
+                break
+            self._content(pending[:end])
+            self._close()
+            pending = pending[end + len(close):]
+        self.pending = pending
+
+    def _content(self, text):
+        if self.open in self.sections:
+            return # a repeated section, the first one counts
+        if self.open in self.streamed:
+            if self.on_data:
+                self.on_data(self.open, text)
+        else:
+            self.parts.append(text)
+
+    def _close(self):
+        name, self.open = self.open, None
+        text, self.parts = None if name in self.streamed else "".join(self.parts), []
+        if name in self.sections:
+            return
+        self.sections[name] = text
+        if self.on_section:
+            self.on_section(name, text)
+
+    def has(self, name):
+        return name in self.sections
+
+def scan_response(response):
+    # sections of a complete response, name -> text
+    scanner = ResponseScanner()
+    scanner.feed(response)
+    return scanner.sections
@@ -0,0 +1,228 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from corpus_writer import CorpusWriter
+from inference import PROMPT_PRICE, COMPLETION_PRICE, estimate_tokens
+
+# per-page spans: where a page's time went (fetch, reduce, rules, ttft, generate, parse, lock_wait,
+# write, induce, pagination), its tokens, llm calls and retries. each finished page is one line of the
+# jsonl trace and feeds the live summary and the optional prometheus endpoint
+# stage seconds of a page are summed over its attempts and chunks, parallel chunks can add up past total
+STAGES = ("fetch", "reduce", "rules", "ttft", "generate", "parse", "lock_wait", "write", "induce", "pagination", "total")
+SUMMARY_INTERVAL = 30.0 # seconds between live summary lines, 0 = only the final report
+SAMPLE_WINDOW = 10000 # recent pages per stage the percentiles are taken over
+QUANTILES = (0.5, 0.95)
+
+class PageTrace:
+    def __init__(self, url):
+        self.url = url
+        self.started = time.monotonic()
+        self.lock = threading.Lock() # chunks of one page run on several threads
+        self.stages = {}
+        self.counts = {"prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0, "cache_hits": 0,
+                       "retries": 0, "continuations": 0, "replayed": 0, "packed": 0, "duplicates": 0}
+        self.mode = None
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+    def count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.counts[name] += delta
+
+    def record_call(self, cached, prompt, response, requested, first_chunk, busy, usage=None):
+        # one llm call or cache replay; busy is our own time between chunks (stream parsing),
+        # taken out of generation so a slow parser does not look like a slow model
+        # usage: the backend's real token counts, estimated from the text when it reported none
+        ended = time.monotonic()
+        first_chunk = first_chunk or ended
+        self.add("parse", busy)
+        if cached:
+            self.count(cache_hits=1)
+            return
+        self.add("ttft", first_chunk - requested)
+        self.add("generate", max(0.0, ended - first_chunk - busy))
+        if usage:
+            self.count(llm_calls=1, prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"])
+        else:
+            self.count(llm_calls=1, prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(response))
+
+def percentile(values, share):
+    # nearest rank
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(share * len(values)) - 1))]
+
+class Telemetry:
+    def __init__(self, prompt_price=PROMPT_PRICE, completion_price=COMPLETION_PRICE, label=None):
+        self.label = label # crawl name on the live summary lines, several crawls can share a process
+        self.prompt_price = prompt_price # usd per million tokens
+        self.completion_price = completion_price
+        self.lock = threading.Lock()
+        self.samples = {stage: deque(maxlen=SAMPLE_WINDOW) for stage in STAGES}
+        self.stage_totals = dict.fromkeys(STAGES, 0.0)
+        self.totals = {"pages": 0, "failed": 0, "entries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                       "llm_calls": 0, "cache_hits": 0, "retries": 0, "continuations": 0, "replayed": 0,
+                       "packed": 0, "duplicates": 0}
+        self.started = time.monotonic()
+        self.writer = None
+        self.server = None
+        self.stopped = threading.Event()
+
+    def start(self, trace_path=None, interval=SUMMARY_INTERVAL, metrics_port=None):
+        # trace file, live summary thread and /metrics endpoint, each optional
+        self.started = time.monotonic()
+        if trace_path:
+            self.writer = CorpusWriter(trace_path, append=True) # same background jsonl writer as the corpus log
+        if interval:
+            threading.Thread(target=self._report_every, args=(interval,), name="telemetry", daemon=True).start()
+        if metrics_port:
+            self.server = serve_metrics(metrics_port, [self])
+
+    def close(self):
+        self.stopped.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.writer:
+            self.writer.close()
+
+    def page(self, url):
+        return PageTrace(url)
+
+    def finish(self, trace, entries, error=None):
+        trace.add("total", time.monotonic() - trace.started)
+        with self.lock:
+            self.totals["pages" if error is None else "failed"] += 1
+            self.totals["entries"] += entries
+            for name, value in trace.counts.items():
+                self.totals[name] += value
+            for stage, seconds in trace.stages.items():
+                self.samples[stage].append(seconds)
+                self.stage_totals[stage] += seconds
+        if self.writer:
+            self.writer.write({
+                "url": trace.url,
+                "time": time.time(),
+                "status": "done" if error is None else "failed",
+                "error": str(error) if error is not None else None,
+                "mode": trace.mode,
+                "entries": entries,
+                **trace.counts,
+                "stages": {stage: round(seconds, 4) for stage, seconds in trace.stages.items()},
+            })
+
+    def cost(self, totals):
+        return (totals["prompt_tokens"] * self.prompt_price + totals["completion_tokens"] * self.completion_price) / 1e6
+
+    def snapshot(self):
+        with self.lock:
+            totals = dict(self.totals)
+            quantiles = {stage: [percentile(samples, share) for share in QUANTILES]
+                         for stage, samples in self.samples.items() if samples}
+            stage_totals = dict(self.stage_totals)
+            counts = {stage: len(samples) for stage, samples in self.samples.items()}
+        return totals, quantiles, stage_totals, counts
+
+    def report(self):
+        # summary lines: throughput, per-stage p50/p95, tokens per entry and cost so far
+        totals, quantiles, _, _ = self.snapshot()
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        tokens = totals["prompt_tokens"] + totals["completion_tokens"]
+        lines = [
+            f"{totals['pages']} pages ({totals['pages'] / elapsed:.2f}/s, {totals['failed']} failed), "
+            f"{totals['entries']} entries ({totals['entries'] / elapsed:.1f}/s), {totals['llm_calls']} llm calls, "
+            f"{totals['retries']} retries, {totals['continuations']} continuations, {totals['replayed']} pages by rules, "
+            f"{totals['packed']} packed, {totals['duplicates']} duplicate pages, {totals['cache_hits']} cache hits",
+            f"tokens: {totals['prompt_tokens']} prompt, {totals['completion_tokens']} completion"
+            + (f", {tokens / totals['entries']:.0f} per entry" if totals["entries"] else "")
+            + f", ${self.cost(totals):.4f}",
+        ]
+        stages = [f"{stage} {quantiles[stage][0]:.2f}/{quantiles[stage][1]:.2f}s" for stage in STAGES if stage in quantiles]
+        if stages:
+            lines.append("p50/p95 per page: " + ", ".join(stages))
+        return lines
+
+    def _report_every(self, interval):
+        prefix = f"[telemetry {self.label}]" if self.label else "[telemetry]"
+        while not self.stopped.wait(interval):
+            print("\n".join(f"{prefix} {line}" for line in self.report())) # one print, crawls report side by side
+
+    def series(self):
+        # (metric, type, sample, labels, value) per prometheus sample
+        totals, quantiles, stage_totals, counts = self.snapshot()
+        series = [
+            ("scraper_pages_total", "counter", "scraper_pages_total", 'status="done"', totals["pages"]),
+            ("scraper_pages_total", "counter", "scraper_pages_total", 'status="failed"', totals["failed"]),
+        ]
+        for name in ("entries", "llm_calls", "cache_hits", "retries", "continuations", "replayed", "packed", "duplicates"):
+            series.append((f"scraper_{name}_total", "counter", f"scraper_{name}_total", "", totals[name]))
+        for kind in ("prompt", "completion"):
+            series.append(("scraper_tokens_total", "counter", "scraper_tokens_total", f'kind="{kind}"', totals[f"{kind}_tokens"]))
+        series.append(("scraper_cost_usd_total", "counter", "scraper_cost_usd_total", "", f"{self.cost(totals):.6f}"))
+        family = "scraper_stage_seconds"
+        for stage in STAGES:
+            if stage not in quantiles:
+                continue
+            for share, value in zip(QUANTILES, quantiles[stage]):
+                series.append((family, "summary", family, f'stage="{stage}",quantile="{share}"', f"{value:.6f}"))
+            series.append((family, "summary", family + "_sum", f'stage="{stage}"', f"{stage_totals[stage]:.6f}"))
+            series.append((family, "summary", family + "_count", f'stage="{stage}"', counts[stage]))
+        return series
+
+    def prometheus(self):
+        return prometheus([self])
+
+def prometheus(telemetries):
+    # prometheus text exposition format; crawls sharing an endpoint (--jobs) are told apart by a crawl
+    # label, and each metric's samples stay together under its one TYPE line
+    families = {}
+    for telemetry in telemetries:
+        crawl = ""
+        if telemetry.label:
+            crawl = 'crawl="' + telemetry.label.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for family, kind, sample, labels, value in telemetry.series():
+            labels = ",".join(label for label in (crawl, labels) if label)
+            families.setdefault((family, kind), []).append(f"{sample}{{{labels}}} {value}" if labels else f"{sample} {value}")
+    lines = []
+    for (family, kind), samples in families.items():
+        lines += [f"# TYPE {family} {kind}"] + samples
+    return "\n".join(lines) + "\n"
+
+def serve_metrics(port, telemetries):
+    # /metrics on a daemon thread; shut the returned server down when the crawls are done
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus(telemetries).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics at http://localhost:{port}/metrics")
+    return server
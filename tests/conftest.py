@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# the modules live at the repo root (the bench servers in bench/, the eval engine in eval/), not in a package
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+sys.path.insert(0, str(ROOT / "eval"))
@@ -0,0 +1,69 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import inference
+from backends import Backend, create_backend
+
+def completions_server(bodies):
+    # /v1/completions stub: records each request body, answers every prompt with "ok"
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            bodies.append(request)
+            body = json.dumps({
+                "id": "cmpl-test", "object": "text_completion", "created": 0, "model": request["model"],
+                "choices": [{"index": i, "text": "ok", "finish_reason": "stop"} for i in range(len(request["prompt"]))],
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def test_batched_completions_send_max_tokens(monkeypatch):
+    bodies = []
+    httpd = completions_server(bodies)
+    try:
+        monkeypatch.setattr(inference, "LOCAL_BATCH_SIZE", 2)
+        backend = create_backend("local", f"http://127.0.0.1:{httpd.server_address[1]}/v1", "test")
+        assert "".join(backend.stream("page", 0.0)) == "ok"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert bodies[0]["max_tokens"] == inference.LOCAL_MAX_TOKENS
+
+def test_stream_reports_real_usage_to_telemetry():
+    import fixtures
+    from backends import OpenAIBackend
+    from fake_llm import FakeLLMServer, tokens
+    from telemetry import PageTrace
+
+    server = FakeLLMServer(fixtures.build("webonary", 2), "http://127.0.0.1:8900", ttft=0.0, tokens_per_second=1e6).start()
+    try:
+        prompt = "x" * 35 # the fake counts 11 tokens, the chars/3.5 estimate 10
+        usage = {}
+        text = "".join(OpenAIBackend(server.url, "test", "test").stream(prompt, 0.0, usage))
+    finally:
+        server.stop()
+    assert usage == {"prompt_tokens": tokens(prompt), "completion_tokens": tokens(text)}
+    trace = PageTrace("http://example.org/")
+    trace.record_call(False, prompt, text, 0.0, 0.0, 0.0, usage)
+    assert trace.counts["prompt_tokens"] == tokens(prompt) and trace.counts["llm_calls"] == 1
+
+def test_backend_without_both_streams_cannot_be_created():
+    class ThreadsOnly(Backend):
+        def _stream(self, content, temperature, usage=None):
+            yield content
+
+    with pytest.raises(TypeError):
+        ThreadsOnly("model")
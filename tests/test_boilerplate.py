@@ -0,0 +1,30 @@
+from boilerplate import BoilerplateDetector
+from reduce import reduce_html
+
+LETTERS = ["a", "ch", "ng", "дж", "къ"]
+NAV = ("<nav><p>" + "Welcome to the dictionary of the language, browse the entries by letter below " * 3 + "</p>"
+       + "".join(f'<a href="/browse/?letter={letter}">{letter}</a> ' for letter in LETTERS)
+       + '<a href="/about">About this dictionary project</a></nav>')
+
+def page(number):
+    return f"<html><body>{NAV}<main><p>entry{number} means something different</p></main></body></html>"
+
+def reduce(detector, url, html, scope):
+    return reduce_html(html, base_url=url, tree_hook=lambda root: detector.process(url, root, scope))
+
+def test_stripped_navigation_keeps_alphabet_links():
+    detector = BoilerplateDetector(learn_pages=3)
+    for number in range(3):
+        reduce(detector, f"https://www.webonary.org/mixtec/browse/{number}", page(number), "mixtec")
+    reduced = reduce(detector, "https://www.webonary.org/mixtec/browse/9", page(9), "mixtec")
+    assert "Welcome to the dictionary" not in reduced
+    assert "/about" not in reduced
+    for letter in LETTERS:
+        assert f">{letter}</a>" in reduced
+
+def test_scopes_on_one_host_learn_separately():
+    detector = BoilerplateDetector(learn_pages=3)
+    for number in range(3):
+        reduce(detector, f"https://www.webonary.org/mixtec/browse/{number}", page(number), "mixtec")
+    reduced = reduce(detector, "https://www.webonary.org/zapotec/browse/1", page(1), "zapotec")
+    assert "Welcome to the dictionary" in reduced
@@ -0,0 +1,18 @@
+import threading
+
+from corpus import CorpusStore
+
+def test_last_logged_merge_is_the_stored_entry():
+    # what compaction keeps (the last logged line per headword) must be what the store holds
+    store, log = CorpusStore(dict), []
+    def worker(n):
+        for i in range(200):
+            store.merge(("word", {"translations": {"en": f"t{n}-{i}"}, "examples": [f"e{n}-{i}"]}), log.append)
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    last = [value for key, value in log if key == "word"][-1]
+    assert last == store.get("word")
+    assert len(last["examples"]) == 8 * 200
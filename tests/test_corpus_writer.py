@@ -0,0 +1,21 @@
+import json
+
+from corpus_writer import CorpusWriter, compact
+
+def test_raw_entries_that_look_like_pairs_stay_a_list(tmp_path):
+    log, out = str(tmp_path / "corpus.jsonl"), str(tmp_path / "corpus.json")
+    writer = CorpusWriter(log)
+    for entry in (["amen", "amen"], "In the beginning", ["a", "b"]):
+        writer.write(entry)
+    writer.close()
+    assert compact(log, out, kind=list) == [["amen", "amen"], "In the beginning", ["a", "b"]]
+    with open(out, encoding="utf-8") as fh:
+        assert json.load(fh)[0] == ["amen", "amen"]
+
+def test_dictionary_log_keeps_the_latest_merge(tmp_path):
+    log, out = str(tmp_path / "corpus.jsonl"), str(tmp_path / "corpus.json")
+    writer = CorpusWriter(log)
+    writer.write(("ka", {"en": "yes"}))
+    writer.write(("ka", {"en": "yes; indeed"}))
+    writer.close()
+    assert compact(log, out, kind=dict) == {"ka": {"en": "yes; indeed"}}
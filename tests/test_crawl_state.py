@@ -0,0 +1,30 @@
+from crawl_state import CrawlState
+
+def test_interrupted_crawl_resumes_what_was_not_done(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = CrawlState(path)
+    for url in ("https://example.org/a", "https://example.org/b", "https://example.org/c"):
+        assert state.add(url)
+    state.start("https://example.org/a")
+    state.finish("https://example.org/a", [("ka", {"en": "yes"})], "https://example.org/b")
+    state.start("https://example.org/b") # interrupted here: b never finishes, c never starts
+    state.close()
+
+    state = CrawlState(path)
+    try:
+        assert not state.add("https://example.org/a") # already seen, not scheduled again
+        assert sorted(state.pending()) == ["https://example.org/b", "https://example.org/c"]
+        assert list(state.entries()) == [("ka", {"en": "yes"})]
+        assert state.counts() == {"done": 1, "in_progress": 1, "queued": 1}
+    finally:
+        state.close()
+
+def test_entries_of_a_retried_page_are_replaced(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    try:
+        state.add("https://example.org/a")
+        state.finish("https://example.org/a", ["first", "second"])
+        state.finish("https://example.org/a", ["first"])
+        assert list(state.entries()) == ["first"]
+    finally:
+        state.close()
@@ -0,0 +1,31 @@
+from dedup import SKETCH, SentenceDeduplicator
+
+# verses from eval/llm/LLM_BibleIS_HUNK90_GEN.json that share an lsh band but are distinct
+# (shingle jaccard 0.58 and 0.88, under the 0.9 threshold)
+DISTINCT = [
+    ("És lõn este és lõn reggel, harmadik nap.", "És lõn este és lõn reggel, ötödik nap."),
+    ("Hogy tudjon kigondolni mindent, a mit aranyból, ezüstbõl, rézbõl kell csinálni.",
+     "Hogy tudjon kigondolni mindent a mit aranyból, ezüstbõl és rézbõl kell csinálni;"),
+]
+
+def test_band_collision_below_threshold_is_kept():
+    for first, second in DISTINCT:
+        deduplicator = SentenceDeduplicator()
+        assert deduplicator.add(first)
+        assert deduplicator.add(second)
+        assert deduplicator.stats["near"] == 0
+
+def test_near_duplicate_is_dropped():
+    sentence = ("Und Gott sprach: Es werde Licht! und es ward Licht. Und Gott sah das Licht, dass es gut war. "
+                "Da schied Gott das Licht von der Finsternis und nannte das Licht Tag und die Finsternis Nacht.")
+    deduplicator = SentenceDeduplicator()
+    assert deduplicator.add(sentence)
+    assert not deduplicator.add(sentence.replace("nannte", "nennte"))
+    assert deduplicator.stats["near"] == 1
+
+def test_index_keeps_a_bounded_sketch_per_sentence():
+    chapter = " ".join(f"verse {number} of the long chapter that never seems to end" for number in range(100))
+    deduplicator = SentenceDeduplicator()
+    assert deduplicator.add(chapter)
+    assert not deduplicator.add(chapter.replace("verse 7 ", "verse seven "))
+    assert all(len(kept) <= 4 * SKETCH for bucket in deduplicator.buckets.values() for kept in bucket)
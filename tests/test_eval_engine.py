@@ -0,0 +1,20 @@
+from rapidfuzz import fuzz
+
+import engine
+
+REFERENCE = ["In the beginning God created the heaven and the earth.", "And God said, Let there be light",
+             "amen", "completely unrelated sentence about something else"]
+LLM = ["In the beginning God created the heaven and the earth.", "And God said: Let there be light.", "amen."]
+
+def test_best_matches_agree_with_scoring_every_pair(monkeypatch):
+    monkeypatch.setattr(engine, "BLOCK_ROWS", 2) # queries spread over several cdist blocks
+    for query, (match, score) in zip(REFERENCE, engine.best_matches(REFERENCE, LLM, workers=1)):
+        expected = max(LLM, key=lambda choice: fuzz.ratio(query, choice))
+        assert match == expected
+        assert round(score, 3) == round(fuzz.ratio(query, expected), 3)
+    assert engine.best_matches(REFERENCE, [], workers=1) == [(None, 0.0)] * len(REFERENCE)
+
+def test_matched_applies_the_threshold_in_both_directions():
+    assert engine.matched(REFERENCE, LLM, 85, workers=1) == [True, True, True, False]
+    assert engine.matched(REFERENCE, LLM, 100, workers=1) == [True, False, False, False]
+    assert engine.matched(LLM, REFERENCE, 85, workers=1) == [True, True, True]
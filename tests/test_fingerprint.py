@@ -0,0 +1,76 @@
+from corpus import CorpusStore
+from crawl_state import CrawlState
+from fingerprint import PageFingerprints
+from pipeline import PagePipeline
+
+# one site template (navigation, sidebar, footer) around a few words of content per page
+TEMPLATE = " ".join(f"menu{i % 97} link{i % 31} item{i}" for i in range(140))
+
+def small_page(number):
+    entry = " ".join(f"word{number}x{i}" for i in range(15))
+    return f"<html><body><nav>{TEMPLATE}</nav><main><p>{entry}</p></main><footer>about us</footer></body></html>"
+
+def test_small_pages_sharing_a_template_are_distinct():
+    fingerprints = PageFingerprints()
+    for number in range(50):
+        assert fingerprints.claim(f"http://example.org/entry/{number}", small_page(number)) is None
+    assert fingerprints.stats == {"exact": 0, "near": 0}
+
+def test_page_differing_in_a_timestamp_is_a_duplicate():
+    fingerprints = PageFingerprints()
+    body = " ".join(f"verse{i} text{i % 13}" for i in range(300))
+    assert fingerprints.claim("http://example.org/gen/1", f"<p>{body}</p><p>generated 12:01:07</p>") is None
+    owner = fingerprints.claim("http://example.org/gen/1?session=9", f"<p>{body}</p><p>generated 12:01:09</p>")
+    assert owner == "http://example.org/gen/1"
+    assert fingerprints.stats["near"] == 1
+
+class Pipeline(PagePipeline):
+    def __init__(self, state):
+        super().__init__("en", None, CorpusStore(list), None, state, None, fingerprints=PageFingerprints())
+        self.enqueued, self.requeued = [], []
+
+    def enqueue(self, url):
+        self.enqueued.append(url)
+        return True
+
+    def requeue(self, url):
+        self.requeued.append(url)
+
+def test_duplicate_of_a_failed_page_is_extracted_after_all(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    pipeline = Pipeline(state)
+    body = " ".join(f"verse{i} text{i % 13}" for i in range(300))
+    first, mirror = pipeline.page("http://example.org/gen/1"), pipeline.page("http://example.org/print/gen/1")
+    for page in (first, mirror):
+        state.add(page.url)
+        state.start(page.url)
+        page.fetched(f"<p>{body}</p>")
+    assert mirror.skip_duplicate() # parked while the first page is in flight
+    assert not mirror.finish(mirror.record())
+    first.error = ValueError("no parsable corpus")
+    first.finish(first.record())
+    assert pipeline.requeued == [mirror.url]
+    assert state.counts() == {"failed": 1, "in_progress": 1}
+    again = pipeline.page(mirror.url) # the requeued url goes through process_page again
+    again.fetched(f"<p>{body}</p>")
+    assert not again.skip_duplicate()
+    state.close()
+
+def test_duplicate_finishes_with_the_page_it_waited_for(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    pipeline = Pipeline(state)
+    body = " ".join(f"verse{i} text{i % 13}" for i in range(300))
+    first, mirror = pipeline.page("http://example.org/gen/1"), pipeline.page("http://example.org/print/gen/1")
+    for page in (first, mirror):
+        state.add(page.url)
+        state.start(page.url)
+        page.fetched(f"<p>{body}</p>")
+    assert mirror.skip_duplicate()
+    assert not mirror.finish(mirror.record())
+    first.found_next = "http://example.org/gen/2"
+    first.finish(first.record())
+    assert state.counts() == {"done": 2}
+    late = pipeline.page("http://example.org/gen/1?session=2")
+    late.fetched(f"<p>{body}</p>")
+    assert late.skip_duplicate() and pipeline.enqueued == ["http://example.org/gen/2"]
+    state.close()
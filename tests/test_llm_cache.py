@@ -0,0 +1,23 @@
+import os
+
+from llm_cache import CompletionCache
+
+def test_key_covers_model_prompt_version_temperature_and_content(tmp_path):
+    cache = CompletionCache(tmp_path)
+    key = cache.key("model", 3, 0.0, "prompt<html>")
+    assert key == cache.key("model", 3, 0.0, "prompt<html>")
+    assert len({key, cache.key("other", 3, 0.0, "prompt<html>"), cache.key("model", 4, 0.0, "prompt<html>"),
+                cache.key("model", 3, 0.5, "prompt<html>"), cache.key("model", 3, 0.0, "prompt<html2>")}) == 5
+
+def test_least_recently_used_completion_is_evicted(tmp_path):
+    cache = CompletionCache(tmp_path, max_bytes=250)
+    first, second, third = (cache.key("model", 1, 0.0, page) for page in ("a", "b", "c"))
+    cache.put(first, "x" * 100)
+    cache.put(second, "y" * 100)
+    os.utime(cache._path(first), (1000, 1000))
+    os.utime(cache._path(second), (2000, 2000))
+    assert cache.get(first) == "x" * 100 # read last, so the second completion is now the oldest
+    cache.put(third, "z" * 100)
+    assert cache.get(second) is None
+    assert cache.get(first) == "x" * 100 and cache.get(third) == "z" * 100
+    assert cache.hits == 3 and cache.misses == 1
@@ -0,0 +1,23 @@
+from packing import PagePacker, split_response
+
+def block(number, corpus):
+    return f'<page id="{number}"><next_page>null</next_page><json>{{"corpus": {corpus}}}</json></page>'
+
+RESPONSE = block(1, '["first"]') + block(2, '["second", oops]') + block(3, '["third"]')
+
+def test_invalid_block_only_fails_its_own_page():
+    results = split_response(RESPONSE + block(5, '["fifth"]'), 4)
+    assert results[0][:2] == (["first"], None)
+    assert results[1] is None # bad json
+    assert results[2][:2] == (["third"], None)
+    assert results[3] is None # no block for page 4 at all
+
+def test_pages_of_an_invalid_block_are_rerun_alone():
+    learned = []
+    packer = PagePacker(lambda content: RESPONSE, on_response=lambda urls, mode, response, scope: learned.append(urls),
+                        max_pages=3, window=0.5)
+    futures = [packer.submit(f"https://example.org/{i}", "prompt", "<p>small page</p>", scope="scope") for i in (1, 2, 3)]
+    results = [future.result(timeout=5) for future in futures] # the third page fills the pack and sends it
+    assert results[0][0] == ["first"] and results[1] is None and results[2][0] == ["third"]
+    assert learned == [["https://example.org/1", "https://example.org/3"]]
+    assert packer.stats == {"packs": 1, "pages": 2, "rerun": 1}
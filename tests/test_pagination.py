@@ -0,0 +1,24 @@
+from pagination import FAN_OUT, MIN_OBSERVATIONS, PaginationInference
+
+def url(number):
+    return f"https://example.org/list?page={number}"
+
+def follow(inference, first, last):
+    # the llm's hops first -> first + 1 -> ... -> last; the predicted urls of every hop
+    return [inference.observe(url(number), url(number + 1)) for number in range(first, last)]
+
+def test_trusted_pattern_fans_out_then_retires_when_the_llm_disagrees():
+    inference = PaginationInference(lambda candidate, reference: True)
+    predicted = follow(inference, 1, 1 + MIN_OBSERVATIONS)
+    assert predicted[:-1] == [[]] * (MIN_OBSERVATIONS - 1) # not trusted yet
+    assert predicted[-1] == [url(MIN_OBSERVATIONS + 1 + i) for i in range(1, FAN_OUT + 1)]
+    inference.observe(url(MIN_OBSERVATIONS + 1), "https://example.org/list?page=1&sort=new")
+    assert all(pattern.retired for pattern in inference.patterns.values())
+    assert follow(inference, MIN_OBSERVATIONS + 1, MIN_OBSERVATIONS + 10) == [[]] * 9
+
+def test_pattern_retires_when_no_predicted_page_exists():
+    probed = []
+    inference = PaginationInference(lambda candidate, reference: probed.append(candidate) and False)
+    assert follow(inference, 1, 1 + MIN_OBSERVATIONS)[-1] == []
+    assert all(pattern.retired for pattern in inference.patterns.values())
+    assert len(probed) < FAN_OUT # a binary search, not one probe per candidate
@@ -0,0 +1,56 @@
+import asyncio
+
+import inference
+from async_engine import AsyncCrawler
+from backends import FakeBackend
+from corpus import CorpusStore
+from corpus_writer import CorpusWriter
+from crawl_state import CrawlState
+from llm_cache import CompletionCache
+
+def cut_off_responder(content):
+    # the first response stops mid-corpus, the continuation brings the rest
+    if "was cut off" in content:
+        return '<next_page>null</next_page><json>{"corpus": ["third", "fourth"]}</json>'
+    return '<next_page>https://example.org/2</next_page><json>{"corpus": ["first", "second", "thi'
+
+def test_cut_off_response_is_continued(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference, "_backend", FakeBackend(cut_off_responder))
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    crawler = AsyncCrawler("en", None, CorpusStore(list), None, state, CompletionCache(tmp_path / "cache"),
+                           cache_read=False, cache_write=False)
+    entries, followed = [], []
+    try:
+        count, next_page = asyncio.run(crawler.extract_page(
+            "https://example.org/1", "page", lambda url: followed.append(url) or True, entries.append,
+        ))
+    finally:
+        state.close()
+    assert count == 4
+    assert entries == ["first", "second", "third", "fourth"]
+    assert next_page == followed[0] == "https://example.org/2"
+
+class FlakyCache(CompletionCache):
+    # the completion cannot be cached, after its entries were merged
+    def put(self, key, text):
+        raise ConnectionError("cache disk went away")
+
+def test_attempt_failing_after_its_entries_merged_is_not_retried(tmp_path, monkeypatch):
+    backend = FakeBackend(lambda content: '<next_page>null</next_page><json>{"corpus": ["first", "second"]}</json>')
+    monkeypatch.setattr(inference, "_backend", backend)
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    crawler = AsyncCrawler("en", None, CorpusStore(list), CorpusWriter(str(tmp_path / "corpus.jsonl")), state,
+                           FlakyCache(tmp_path / "cache"), cache_read=False)
+    url = "https://example.org/1"
+    page = crawler.page(url)
+    page.html = "page"
+    try:
+        state.add(url)
+        asyncio.run(crawler.extract_with_retries(page))
+        page.finish(page.record())
+        assert backend.calls == 1
+        assert list(crawler.dictionary) == ["first", "second"]
+        assert list(state.entries()) == ["first", "second"]
+    finally:
+        crawler.writer.close()
+        state.close()
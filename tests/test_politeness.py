@@ -0,0 +1,44 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from politeness import PolitenessScheduler, parse_retry_after
+
+def test_async_waiter_starts_as_soon_as_the_slot_is_released():
+    scheduler = PolitenessScheduler()
+    url = "https://example.org/page"
+
+    async def crawl():
+        netloc = await scheduler.acquire_async(url)
+        scheduler.hosts[netloc].limit = 1.0
+        second = asyncio.ensure_future(scheduler.acquire_async(url))
+        await asyncio.sleep(0.05)
+        assert not second.done() # the host's only slot is taken
+        released = time.monotonic()
+        scheduler.release(netloc, 200, 0.01)
+        await asyncio.wait_for(second, 1)
+        return time.monotonic() - released
+
+    assert asyncio.run(crawl()) < 0.05
+
+def test_throttled_host_halves_its_limit_once_per_round_trip():
+    scheduler = PolitenessScheduler()
+    url = "https://example.org/page"
+    netloc = scheduler.acquire(url)
+    scheduler.hosts[netloc].limit = 8.0
+    scheduler.release(netloc, 503, 0.1, retry_after="0")
+    assert scheduler.limits()[netloc] == 4
+    scheduler.release(scheduler.acquire(url), 503, 0.1, retry_after="0") # same burst, not halved again
+    assert scheduler.limits()[netloc] == 4
+    for _ in range(4): # one healthy round trip per slot adds a slot
+        scheduler.release(scheduler.acquire(url), 200, 0.1)
+    assert scheduler.limits()[netloc] == 5
+
+def test_retry_after_pauses_the_host():
+    scheduler = PolitenessScheduler()
+    url = "https://example.org/page"
+    scheduler.release(scheduler.acquire(url), 429, 0.01, retry_after="0.2")
+    paused = time.monotonic()
+    scheduler.release(scheduler.acquire(url), 200, 0.01)
+    assert time.monotonic() - paused >= 0.15
+    assert 59 <= parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
@@ -0,0 +1,23 @@
+import pytest
+
+from rate_limit import LLMRateLimiter, parse_reset
+
+def test_settle_returns_unused_tokens_and_charges_overruns():
+    limiter = LLMRateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    limiter.acquire(600)
+    assert limiter.tokens.tokens == pytest.approx(400, abs=1)
+    limiter.settle(600, 200) # the response was shorter than estimated
+    assert limiter.tokens.tokens == pytest.approx(800, abs=1)
+    limiter.acquire(500)
+    limiter.settle(500, 1200) # and this one much longer: the bucket goes into debt
+    assert limiter.tokens.tokens == pytest.approx(-400, abs=1)
+    with limiter.lock:
+        assert limiter._try_take(100) == pytest.approx(30, abs=0.1) # 500 tokens at 1000 per minute
+    assert limiter.stats["estimated"] == 1100 and limiter.stats["actual"] == 1400
+
+def test_provider_headers_pull_the_budget_down():
+    limiter = LLMRateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    limiter.update_from_headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1m30s"})
+    with limiter.lock:
+        assert limiter._try_take(10) == pytest.approx(90, abs=0.1)
+    assert parse_reset("200ms") == pytest.approx(0.2)
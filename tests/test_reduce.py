@@ -0,0 +1,34 @@
+from reduce import reduce_html, split_html
+from inference import estimate_tokens
+
+PAGE = """<html><head><link rel="stylesheet" href="/site.css"><link rel="next" href="?pg=2"></head>
+<body><script>track()</script><main><p class="entry">word - meaning</p></main>
+<form><select name="letter"><option value="?letter=a">a</option><option value="?letter=ch">ch</option></select>
+<button>Go</button></form></body></html>"""
+
+def test_pagination_elements_survive_reduction():
+    reduced = reduce_html(PAGE, base_url="https://example.org/browse/")
+    assert '<link rel="next" href="https://example.org/browse/?pg=2">' in reduced
+    assert "site.css" not in reduced and "track()" not in reduced and "Go" not in reduced
+    assert '<option value="?letter=ch">ch</option>' in reduced
+
+def test_step_savings_add_up_to_the_reduction():
+    savings = {}
+    reduced = reduce_html(PAGE, base_url="https://example.org/browse/", savings=savings)
+    assert sum(savings.values()) == estimate_tokens(PAGE) - estimate_tokens(reduced)
+    assert savings["resolve_links"] < 0 # absolute urls are longer
+
+def test_split_html_cuts_between_elements_under_the_budget():
+    entries = [f'<p class="entry">word{i} - meaning number {i} of the word</p>' for i in range(60)]
+    html = '<main><h1>Letter a</h1><div class="entries">' + "".join(entries) + "</div></main>"
+    chunks = split_html(html, 120)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk) <= 120
+        # every piece is re-wrapped in the elements it was cut out of
+        assert chunk.startswith("<main>") and chunk.endswith("</main>")
+    assert "".join(chunks).count('<p class="entry">') == 60
+    assert all(entry in "".join(chunks) for entry in entries) # no entry is cut in two
+
+def test_split_html_keeps_a_page_under_the_budget_whole():
+    assert split_html("<main><p>word - meaning</p></main>", 120) == ["<main><p>word - meaning</p></main>"]
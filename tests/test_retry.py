@@ -0,0 +1,27 @@
+import random
+
+import requests
+
+from retry import BACKOFF, backoff, classify
+from scrape import FetchError
+
+def test_failures_are_classified_by_what_another_attempt_can_fix():
+    url = "https://example.org/page"
+    assert classify(FetchError(url, 404)) is None # the page is gone, retrying cannot help
+    assert classify(FetchError(url, 403)) is None
+    assert classify(FetchError(url, 429)) == "rate_limit"
+    assert classify(FetchError(url, 408)) == "server"
+    assert classify(FetchError(url, 503)) == "server"
+    assert classify(ConnectionResetError()) == "connection"
+    assert classify(requests.Timeout()) == "connection"
+    assert classify(ValueError("no parsable corpus")) == "parse"
+    assert classify(RuntimeError("unexpected")) == "server"
+
+def test_backoff_is_jittered_up_to_the_capped_exponential_step():
+    random.seed(7)
+    first, cap = BACKOFF["server"]
+    for attempt in range(1, 8):
+        delays = [backoff("server", attempt) for _ in range(50)]
+        assert all(0 <= delay <= min(cap, first * 2 ** (attempt - 1)) for delay in delays)
+        assert len(set(delays)) > 1 # pages that failed together do not retry together
+    assert backoff("parse", 3) == 0
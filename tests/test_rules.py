@@ -0,0 +1,30 @@
+from rules import RULE_MAX_FALLBACKS, Rulebook, template_key
+
+RULES = {"entry": "div.entry", "word": "span.word", "translations": {"English": "span.en"},
+         "next_page": "a.next@href", "coverage": 0.6}
+
+def page(layout="entry", next_link=True):
+    entries = "".join(f'<div class="{layout}"><span class="word">word{i}</span><span class="en">meaning {i}</span></div>'
+                      for i in range(5))
+    link = '<a class="next" href="https://example.org/browse/2?letter=a">next</a>' if next_link else ""
+    return f"<main>{entries}{link}</main>"
+
+def rulebook():
+    book = Rulebook(path=None)
+    book.rules[template_key("https://example.org/browse/1?letter=a", "English")] = dict(RULES)
+    return book
+
+def test_rules_replay_on_a_page_of_the_template():
+    entries, next_page = rulebook().replay("https://example.org/browse/7?letter=a", page(), "English")
+    assert entries[0] == ("word0", {"translations": {"English": "meaning 0"}, "example_sentences": []})
+    assert len(entries) == 5 and next_page == "https://example.org/browse/2?letter=a"
+
+def test_rules_that_keep_missing_fall_back_to_the_llm_and_are_dropped():
+    book = rulebook()
+    url = "https://example.org/browse/7?letter=a"
+    # no next page: the llm decides where the crawl goes, but the rules did cover the page
+    assert book.replay(url, page(next_link=False), "English") is None
+    for _ in range(RULE_MAX_FALLBACKS):
+        assert book.replay(url, page(layout="redesigned"), "English") is None
+    assert book.rules == {}
+    assert book.stats["fallbacks"] == RULE_MAX_FALLBACKS + 1 and book.stats["replayed"] == 0
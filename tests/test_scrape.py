@@ -0,0 +1,96 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import boilerplate
+import scrape
+
+NAV = "<nav>" + " ".join(f'<a href="/section/{i}">Section {i} of the dictionary</a>' for i in range(12)) + "</nav>"
+FOOTER = "<footer><p>" + "Copyright the dictionary project, all rights reserved, contact us for licensing. " * 3 + "</p></footer>"
+
+def page(number):
+    entries = "".join(f"<li>word{number}x{i}: translation {number} {i}</li>" for i in range(10))
+    return f"<html><body>{NAV}<main><h1>Page {number}</h1><ul>{entries}</ul></main>{FOOTER}</body></html>"
+
+def site_server():
+    # /p/<n> is a page of its own, /p/<n>/copy serves page n again (an out of range page showing the last one)
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if parts[0] != "p":
+                self.send_error(404)
+                return
+            body = page(int(parts[1])).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def test_probe_rejects_copy_of_boilerplate_stripped_reference(monkeypatch):
+    monkeypatch.setattr(scrape, "PAGE_CACHE", False)
+    monkeypatch.setattr(scrape, "boilerplate", boilerplate.BoilerplateDetector())
+    httpd = site_server()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        for number in range(1, boilerplate.LEARN_PAGES + 1):
+            scrape.scrape_url(f"{base}/p/{number}")
+        reference = scrape.scrape_url(f"{base}/p/9") # reduced with the learned boilerplate stripped
+        assert "Section 3 of the dictionary" not in reference and "Copyright" not in reference
+        assert not scrape.probe_page(f"{base}/p/9/copy", reference)
+        assert scrape.probe_page(f"{base}/p/10", reference)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def etag_server(conditions):
+    # one page with an etag; a request revalidating it gets 304 and no body
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/page":
+                self.send_error(404)
+                return
+            conditions.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = page(1).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def test_cached_page_is_revalidated_and_served_from_disk_on_304(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape, "PAGE_CACHE", True)
+    monkeypatch.setattr(scrape, "PAGE_CACHE_DIR", tmp_path)
+    conditions = []
+    httpd = etag_server(conditions)
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/page"
+    try:
+        text, final_url = scrape.fetch(url)
+        before = scrape.get_fetch_stats()
+        assert scrape.fetch(url) == (text, final_url)
+        after = scrape.get_fetch_stats()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert conditions == [None, '"v1"']
+    assert after["cache_hits"] - before["cache_hits"] == 1
+    assert after["bytes_saved"] - before["bytes_saved"] == len(page(1).encode("utf-8"))
+    assert after["bytes_downloaded"] == before["bytes_downloaded"]
@@ -0,0 +1,23 @@
+from site_summary import SiteSummaries, site_scope
+
+RESPONSE = "<site_summary>entries are in div.entry, next page via ?pg=</site_summary><json>{\"corpus\": {}}</json>"
+
+def test_dictionaries_on_one_host_keep_their_own_summary():
+    sites = SiteSummaries(None, full_pages=1)
+    mixtec = site_scope("https://www.webonary.org/mixtec/browse/?letter=a", "Mixtec", "English")
+    zapotec = site_scope("https://www.webonary.org/zapotec/browse/?letter=a", "Zapotec", "English")
+    sites.learn(mixtec, RESPONSE)
+    assert sites.summary(mixtec)
+    assert sites.summary(zapotec) is None
+    assert sites.summary(site_scope("https://www.webonary.org/mixtec/browse/?letter=a", "Mixtec", "Spanish")) is None
+
+def test_summary_is_dropped_once_fast_prompts_keep_failing():
+    sites = SiteSummaries(None, full_pages=1, fast_failures=2)
+    scope = site_scope("https://live.bible.is/bible/ENGESV/MAT/1", "English")
+    sites.learn(scope, RESPONSE)
+    sites.parsed(scope, False)
+    sites.parsed(scope, True) # a response that parsed ends the streak
+    sites.parsed(scope, False)
+    assert sites.summary(scope)
+    sites.parsed(scope, False)
+    assert sites.summary(scope) is None
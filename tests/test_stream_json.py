@@ -0,0 +1,20 @@
+from stream_json import CorpusStreamParser
+
+def test_entries_are_emitted_as_soon_as_they_close():
+    entries = []
+    parser = CorpusStreamParser(entries.append)
+    first = '{"corpus": {"ka": {"en": "yes, \\"indeed\\" }"}, '
+    parser.feed(first[:20])
+    assert entries == []
+    parser.feed(first[20:]) # braces and quotes inside strings do not close anything
+    assert entries == [("ka", {"en": 'yes, "indeed" }'})]
+    parser.feed('"ba": {"en": "no"}}}')
+    assert entries[1] == ("ba", {"en": "no"})
+    assert parser.corpus_closed and parser.done
+
+def test_cut_off_stream_keeps_the_closed_entries():
+    entries = []
+    parser = CorpusStreamParser(entries.append)
+    parser.feed('{"corpus": ["In the beginning", "And the earth was with')
+    assert entries == ["In the beginning"]
+    assert parser.entries == 1 and not parser.corpus_closed
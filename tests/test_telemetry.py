@@ -0,0 +1,20 @@
+from urllib.request import urlopen
+
+from telemetry import Telemetry, serve_metrics
+
+def test_crawls_share_one_metrics_endpoint():
+    mixtec, zapotec = Telemetry(label="mixtec"), Telemetry(label="zapotec")
+    trace = mixtec.page("https://www.webonary.org/mixtec/browse/1")
+    trace.add("fetch", 0.1)
+    mixtec.finish(trace, 3)
+    server = serve_metrics(0, [mixtec, zapotec])
+    try:
+        with urlopen(f"http://localhost:{server.server_address[1]}/metrics") as response:
+            lines = response.read().decode("utf-8").splitlines()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert lines.count("# TYPE scraper_entries_total counter") == 1
+    assert 'scraper_entries_total{crawl="mixtec"} 3' in lines
+    assert 'scraper_entries_total{crawl="zapotec"} 0' in lines
+    assert 'scraper_stage_seconds_count{crawl="mixtec",stage="fetch"} 1' in lines